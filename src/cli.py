@@ -1,7 +1,8 @@
 import argparse
 import sys
 import os
-from src.converter import convert_pgn_to_parquet, convert_lichess_puzzles
+from src.converter import convert_pgn_to_parquet, convert_lichess_puzzles, build_polyglot_book
+from src.config import APP_DB_FILE
 
 def main():
     parser = argparse.ArgumentParser(description="Convierte ficheros PGN o Puzzles a formato Parquet.")
@@ -10,6 +11,17 @@ def main():
     parser.add_argument("--max", type=int, default=None, help="Máximo de partidas")
     parser.add_argument("--workers", type=int, default=None, help="Número de núcleos")
     parser.add_argument("--puzzles", action="store_true", help="Importar CSV de Puzzles de Lichess")
+    parser.add_argument("--book", action="store_true", help="Generar un libro Polyglot (.bin) a partir de una base Parquet (entrada)")
+    parser.add_argument("--book-ply", type=int, default=20, help="Profundidad máxima del libro en medias jugadas")
+    parser.add_argument("--book-min", type=int, default=5, help="Mínimo de partidas para incluir una jugada en el libro")
+    parser.add_argument("--annotate", action="store_true", help="Analizar con el motor todas las partidas de una base Parquet (entrada) y guardar las evaluaciones (salida)")
+    parser.add_argument("--engine", default=None, help="Ruta del motor UCI para --annotate y --verify-puzzles (por defecto, stockfish del PATH)")
+    parser.add_argument("--depth", type=int, default=12, help="Profundidad de análisis para --annotate y --verify-puzzles")
+    parser.add_argument("--generate-puzzles", action="store_true", help="Generar puzzles (salida) a partir de las partidas de una base Parquet (entrada)")
+    parser.add_argument("--verify-puzzles", action="store_true", help="Verificar con el motor los puzzles candidatos (entrada) y guardar los aceptados con rating estimado (salida); reanudable")
+    parser.add_argument("--export-cache", action="store_true", help="Exportar la caché de aperturas de la base (entrada) a un bundle Parquet (salida)")
+    parser.add_argument("--import-cache", action="store_true", help="Importar un bundle de caché (entrada) sobre la base local (salida)")
+    parser.add_argument("--app-db", default=APP_DB_FILE, help="Base de datos de la aplicación (fa-chess.db)")
 
     args = parser.parse_args()
 
@@ -20,6 +32,34 @@ def main():
     try:
         if args.puzzles:
             convert_lichess_puzzles(args.input, args.output)
+        elif args.book:
+            n = build_polyglot_book(args.input, args.output, max_ply=args.book_ply, min_count=args.book_min)
+            print(f"Libro generado: {n} entradas en {args.output}")
+        elif args.annotate:
+            import shutil
+            from src.core.batch import annotate_database
+            engine = args.engine or shutil.which("stockfish") or "/usr/bin/stockfish"
+            n = annotate_database(args.input, args.output, engine, depth=args.depth, workers=args.workers, max_games=args.max)
+            print(f"Anotadas {n} partidas en {args.output}")
+        elif args.generate_puzzles:
+            from src.core.puzzle_generator import generate_puzzles
+            n = generate_puzzles(args.input, args.output, workers=args.workers, max_games=args.max)
+            print(f"Generados {n} puzzles en {args.output}")
+        elif args.verify_puzzles:
+            import shutil
+            from src.core.batch import verify_puzzles
+            engine = args.engine or shutil.which("stockfish") or "/usr/bin/stockfish"
+            n = verify_puzzles(args.input, args.output, engine, depth=args.depth, workers=args.workers, max_puzzles=args.max)
+            print(f"Verificados {n} puzzles en {args.output}")
+        elif args.export_cache or args.import_cache:
+            from src.core.app_db import AppDBManager
+            app_db = AppDBManager(args.app_db)
+            if args.export_cache:
+                n = app_db.export_opening_cache(os.path.abspath(args.input), args.output)
+                print(f"Exportadas {n} posiciones a {args.output}")
+            else:
+                n = app_db.import_opening_cache(args.input, os.path.abspath(args.output))
+                print(f"Importadas {n} posiciones en {args.output}")
         else:
             max_val = args.max if args.max is not None else 999999999
             convert_pgn_to_parquet(args.input, args.output, max_games=max_val, workers=args.workers)
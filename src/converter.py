@@ -2,6 +2,7 @@ import chess.pgn
 import chess.polyglot
 import polars as pl
 import os
+import json
 import time
 import io
 import tempfile
@@ -170,9 +171,45 @@ def convert_pgn_to_parquet(pgn_path, output_path, max_games=100000000, chunk_siz
 
 from src.config import GAME_SCHEMA, logger
 
-def convert_lichess_puzzles(csv_path, output_path):
+def theme_mask_columns(n_themes):
+    """Nombres de las columnas de máscara: 64 temas por columna UInt64"""
+    return [f"ThemeMask{w}" for w in range(max(1, -(-n_themes // 64)))]
+
+def theme_mask_exprs(vocab):
+    """El tema i del vocabulario es el bit i % 64 de la columna ThemeMask{i // 64}"""
+    exprs = []
+    for w, name in enumerate(theme_mask_columns(len(vocab))):
+        bits = {t: 1 << (i % 64) for i, t in enumerate(vocab) if i // 64 == w}
+        # Cada tema aparece una vez por puzzle: la suma de sus bits es su OR
+        exprs.append(pl.col("Themes").str.split(" ").list.eval(pl.element().replace_strict(bits, default=0, return_dtype=pl.UInt64)).list.sum().cast(pl.UInt64).fill_null(0).alias(name))
+    return exprs
+
+def write_puzzle_parquet(lf, output_path, row_group_size=100_000):
+    """
+    Escribe un LazyFrame de puzzles (PuzzleId, FEN, Moves, Rating, Popularity, Themes, OpeningTags) con el
+    formato que lee PuzzleManager: ordenado por 'Rating', con estadísticas por row group y máscara de temas.
+    La familia de apertura (primera etiqueta de 'OpeningTags') va en 'OpeningFamily', categórica (columna
+    con diccionario en el Parquet), y su recuento en los metadatos para poblar el filtro sin leer el fichero.
+    """
+    vocab = sorted(lf.select(pl.col("Themes").str.split(" ").explode().drop_nulls().unique()).collect()["Themes"].to_list())
+    vocab = [t for t in vocab if t]
+    logger.info(f"Conversor: {len(vocab)} temas distintos -> {len(theme_mask_columns(len(vocab)))} columnas de máscara")
+    family = pl.col("OpeningTags").fill_null("").str.split(" ").list.first().fill_null("")
+    openings = lf.select(family.alias("f")).filter(pl.col("f") != "").group_by("f").len().collect()
+    logger.info(f"Conversor: {openings.height} familias de apertura")
+    lf = lf.with_columns(theme_mask_exprs(vocab) + [family.cast(pl.Categorical).alias("OpeningFamily")])
+
+    logger.info("Conversor: Escribiendo archivo Parquet ordenado por Rating (Streaming)...")
+    metadata = {"fa_chess.sorted_by": "Rating", "fa_chess.themes": json.dumps(vocab),
+                "fa_chess.openings": json.dumps(dict(sorted(openings.iter_rows(), key=lambda fc: -fc[1])))}
+    lf.sort("Rating", maintain_order=True).sink_parquet(output_path, row_group_size=row_group_size, statistics=True, metadata=metadata)
+
+def convert_lichess_puzzles(csv_path, output_path, row_group_size=100_000):
     """
     Convierte los 5.7M de puzzles de Lichess a Parquet conservando toda la metadata.
+    El fichero se escribe ordenado por 'Rating' en row groups con estadísticas, de modo que
+    PuzzleManager solo lee los grupos del rango de dificultad pedido. Los temas se codifican además
+    como máscara de bits (columnas UInt64 'ThemeMask0', 'ThemeMask1'...) con el vocabulario en los metadatos.
     """
     logger.info(f"Conversor: Leyendo CSV masivo de Lichess: {csv_path}")
     start_time = time.time()
@@ -189,14 +226,72 @@ def convert_lichess_puzzles(csv_path, output_path):
             pl.col("OpeningTags").fill_null("")
         ])
 
-        logger.info("Conversor: Escribiendo archivo Parquet de alta velocidad (Streaming)...")
-        df.collect(streaming=True).write_parquet(output_path)
-        
+        write_puzzle_parquet(df, output_path, row_group_size=row_group_size)
         logger.info(f"Conversor: Éxito! {output_path} generado en {time.time() - start_time:.1f}s")
     except Exception as e:
         logger.error(f"Conversor: Fallo crítico en la conversión: {e}")
         raise e
 
+def _book_batch_stats(batch, max_ply):
+    """(clave, jugada) -> partidas, victorias y tablas del bando al que le toca mover"""
+    df = pl.from_arrow(batch).select([pl.col("fens").list.head(max_ply + 1).alias("_f"), pl.col("full_line").str.split(" ").list.head(max_ply).alias("_m"), "result"])
+    df = df.with_columns(pl.min_horizontal(pl.col("_m").list.len(), pl.col("_f").list.len() - 1).clip(lower_bound=0).alias("_n"))
+    df = df.select([pl.col("_f").list.slice(0, pl.col("_n")).alias("key"), pl.col("_f").list.slice(1, pl.col("_n")).alias("child"), pl.col("_m").list.slice(0, pl.col("_n")).alias("uci"), pl.int_ranges(0, pl.col("_n")).alias("ply"), "result"]).explode(["key", "child", "uci", "ply"])
+    win = pl.when(pl.col("ply") % 2 == 0).then(pl.col("result") == "1-0").otherwise(pl.col("result") == "0-1")
+    return (df.filter(pl.col("uci").str.len_chars().is_between(4, 5))
+            .group_by(["key", "uci"]).agg([pl.len().cast(pl.UInt32).alias("n"), win.sum().cast(pl.UInt32).alias("win"), (pl.col("result") == "1/2-1/2").sum().cast(pl.UInt32).alias("draw"), pl.col("child").first()]))
+
+def _merge_book_stats(frames):
+    return pl.concat(frames).group_by(["key", "uci"]).agg([pl.col("n").sum(), pl.col("win").sum(), pl.col("draw").sum(), pl.col("child").first()]).sort("key")
+
+def build_polyglot_book(parquet_path, output_path, max_ply=20, min_count=5, batch_size=20000, run_rows=2_000_000, progress_callback=None):
+    """
+    Genera un libro Polyglot (.bin) a partir de una base Parquet en una sola pasada en streaming.
+    Reutiliza los hashes Zobrist de 'fens' como claves. Los agregados parciales se vuelcan a disco
+    en tramos ordenados por clave y se fusionan por rangos de clave, de modo que la memoria queda
+    acotada por run_rows y no por el tamaño de la base.
+    Peso de cada jugada: 2*victorias + tablas del bando que mueve, escalado a u16 por posición.
+    """
+    import pyarrow.parquet as pq
+    from src.core.polyglot_book import scale_weights, write_entries
+    start_time = time.time()
+    temp_work_dir = tempfile.mkdtemp(prefix="fa_chess_book_")
+    try:
+        pf = pq.ParquetFile(parquet_path); total = pf.metadata.num_rows
+        runs, pending, pending_rows, done = [], [], 0, 0
+        def flush():
+            nonlocal pending, pending_rows
+            if not pending: return
+            run_path = os.path.join(temp_work_dir, f"run_{len(runs):05d}.parquet")
+            _merge_book_stats(pending).write_parquet(run_path, row_group_size=100_000, statistics=True)
+            runs.append(run_path); pending, pending_rows = [], 0
+        for batch in pf.iter_batches(batch_size=batch_size, columns=["fens", "full_line", "result"]):
+            stats = _book_batch_stats(batch, max_ply); pending.append(stats); pending_rows += stats.height
+            if pending_rows >= run_rows: flush()
+            done += batch.num_rows
+            if progress_callback: progress_callback(min(99, int(done / max(1, total) * 100)))
+        flush()
+        if not runs:
+            open(output_path, "wb").close(); return 0
+        # Fusión por rangos de clave: los tramos están ordenados, así que cada rango solo lee sus row groups
+        run_total = sum(pq.ParquetFile(r).metadata.num_rows for r in runs)
+        buckets = max(1, run_total // run_rows + (1 if run_total % run_rows else 0))
+        step = (1 << 64) // buckets; written = 0
+        with open(output_path, "wb") as f:
+            for i in range(buckets):
+                lo = i * step; hi = (i + 1) * step if i < buckets - 1 else None
+                q = pl.scan_parquet(os.path.join(temp_work_dir, "run_*.parquet")).filter(pl.col("key") >= pl.lit(lo, dtype=pl.UInt64))
+                if hi is not None: q = q.filter(pl.col("key") < pl.lit(hi, dtype=pl.UInt64))
+                part = (q.group_by(["key", "uci"]).agg([pl.col("n").sum(), pl.col("win").sum(), pl.col("draw").sum(), pl.col("child").first()])
+                        .filter(pl.col("n") >= min_count).with_columns((2 * pl.col("win").cast(pl.UInt64) + pl.col("draw")).alias("weight")).collect())
+                part = scale_weights(part).sort(["key", "weight", "uci"], descending=[False, True, False])
+                written += write_entries(f, part)
+        if progress_callback: progress_callback(100)
+        logger.info(f"Libro Polyglot: {written} entradas en {output_path} ({len(runs)} tramos, {time.time() - start_time:.1f}s)")
+        return written
+    finally:
+        shutil.rmtree(temp_work_dir, ignore_errors=True)
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
@@ -2,13 +2,44 @@ import sqlite3
 import os
 import io
 import json
+import hashlib
+import time
+import threading
 import polars as pl
+import chess
+import chess.engine
+import chess.polyglot
 from src.config import logger
 from yoyo import read_migrations, get_backend
 
+PUZZLE_PROGRESS_SCHEMA = {"PuzzleId": pl.String, "status": pl.String}
+
+def compute_db_fingerprint(path):
+    """
+    Huella de contenido de una base Parquet: tamaño del fichero + pie de metadatos
+    (filas, row groups, estadísticas). Es estable al copiar el fichero entre máquinas
+    y cambia en cuanto se reescribe su contenido.
+    """
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(-8, os.SEEK_END); tail = f.read(8)
+            footer_len = int.from_bytes(tail[:4], "little")
+            if tail[4:] != b"PAR1" or footer_len + 8 > size: return None
+            f.seek(-(footer_len + 8), os.SEEK_END); footer = f.read(footer_len)
+        return hashlib.sha1(size.to_bytes(8, "little") + footer).hexdigest()[:16]
+    except (OSError, ValueError):
+        return None
+
 class AppDBManager:
     def __init__(self, db_path):
         self.db_path = db_path
+        self._fingerprints = {} # path -> ((size, mtime), huella)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._counter_lock = threading.Lock() # StatsWorker y el calentador consultan la caché desde varios hilos
+        self._progress_frame = None # progreso de puzzles en memoria; se invalida al guardar un resultado
+        self._progress_version = 0
         logger.info(f"AppDB: Gestionando base de datos en {db_path}")
         self.run_migrations()
 
@@ -62,6 +93,7 @@ class AppDBManager:
         with self.get_connection() as conn:
             conn.execute("INSERT OR REPLACE INTO puzzle_stats (puzzle_id, status) VALUES (?, ?)", 
                          (str(puzzle_id), status))
+        self._progress_version += 1; self._progress_frame = None
 
     def get_all_puzzle_stats(self):
         try:
@@ -70,6 +102,29 @@ class AppDBManager:
                 return {row[0]: row[1] for row in cursor.fetchall()}
         except: return {}
 
+    def get_puzzle_stats_frame(self):
+        """
+        Progreso de puzzles como DataFrame (PuzzleId, status) para unirlo a las consultas de PuzzleManager.
+        Se lee una vez y se reutiliza en cada cambio de filtro hasta que save_puzzle_status() lo invalida
+        (si un guardado llega durante la lectura, el resultado no se cachea)
+        """
+        if self._progress_frame is not None: return self._progress_frame
+        version = self._progress_version
+        try:
+            with self.get_connection() as conn:
+                frame = pl.read_database("SELECT puzzle_id AS PuzzleId, status FROM puzzle_stats", conn, schema_overrides=PUZZLE_PROGRESS_SCHEMA)
+        except: return pl.DataFrame(schema=PUZZLE_PROGRESS_SCHEMA)
+        if version == self._progress_version: self._progress_frame = frame
+        return frame
+
+    def get_puzzle_summary(self):
+        """Totales del panel (intentados, resueltos, fallados) en una sola agregación SQL"""
+        try:
+            with self.get_connection() as conn:
+                total, success, fail = conn.execute("SELECT COUNT(*), COALESCE(SUM(status = 'success'), 0), COALESCE(SUM(status = 'fail'), 0) FROM puzzle_stats").fetchone()
+                return {"total": total, "success": success, "fail": fail}
+        except: return {"total": 0, "success": 0, "fail": 0}
+
     def get_tactical_elo(self):
         """Recupera el Elo táctico guardado o 1200 por defecto"""
         return self.get_config("tactical_elo", 1200)
@@ -78,40 +133,257 @@ class AppDBManager:
         """Guarda el nuevo Elo táctico"""
         self.set_config("tactical_elo", elo)
 
+    # --- ENTRENAMIENTO DE PUZZLES (repaso espaciado) ---
+    def get_puzzle_review(self, puzzle_id):
+        """Estado de repaso de un puzzle (intervalo en días, facilidad, repeticiones...) o None si nunca se intentó"""
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT due, interval, ease, reps, lapses, last FROM puzzle_reviews WHERE puzzle_id = ?", (str(puzzle_id),)).fetchone()
+        except Exception as e:
+            logger.error(f"AppDB: Error al leer repaso: {e}")
+            return None
+        return dict(zip(("due", "interval", "ease", "reps", "lapses", "last"), row)) if row else None
+
+    def save_puzzle_review(self, puzzle, review):
+        """Guarda el estado de repaso junto con los datos del puzzle, para servirlo sin volver al Parquet"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO puzzle_reviews (puzzle_id, data, due, interval, ease, reps, lapses, last)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (str(puzzle["id"]), json.dumps(puzzle), review["due"], review["interval"], review["ease"], review["reps"], review["lapses"], review["last"]))
+        except Exception as e:
+            logger.error(f"AppDB: Error al guardar repaso: {e}")
+
+    def get_due_reviews(self, now, limit=10):
+        """Puzzles con repaso vencido (due <= now), los más atrasados primero"""
+        try:
+            with self.get_connection() as conn:
+                return [json.loads(r[0]) for r in conn.execute("SELECT data FROM puzzle_reviews WHERE due <= ? ORDER BY due LIMIT ?", (now, limit))]
+        except Exception as e:
+            logger.error(f"AppDB: Error al leer repasos: {e}")
+            return []
+
+    def get_theme_stats(self):
+        """{tema: (intentos, fallos)} de los puzzles jugados"""
+        try:
+            with self.get_connection() as conn:
+                return {t: (a, f) for t, a, f in conn.execute("SELECT theme, attempts, fails FROM puzzle_theme_stats")}
+        except: return {}
+
+    def update_theme_stats(self, themes, failed):
+        try:
+            with self.get_connection() as conn:
+                conn.executemany("""
+                    INSERT INTO puzzle_theme_stats (theme, attempts, fails) VALUES (?, 1, ?)
+                    ON CONFLICT(theme) DO UPDATE SET attempts = attempts + 1, fails = fails + excluded.fails
+                """, [(t, int(failed)) for t in set(themes)])
+        except Exception as e:
+            logger.error(f"AppDB: Error al guardar temas: {e}")
+
+    def get_puzzle_queue(self):
+        """Cola precalculada de próximos puzzles, en orden"""
+        try:
+            with self.get_connection() as conn:
+                return [json.loads(r[0]) for r in conn.execute("SELECT data FROM puzzle_queue ORDER BY pos")]
+        except: return []
+
+    def set_puzzle_queue(self, puzzles):
+        """Sustituye la cola entera en una sola transacción"""
+        try:
+            with self.get_connection() as conn:
+                conn.execute("DELETE FROM puzzle_queue")
+                conn.executemany("INSERT INTO puzzle_queue (pos, puzzle_id, data) VALUES (?, ?, ?)",
+                                 [(i, str(p["id"]), json.dumps(p)) for i, p in enumerate(puzzles)])
+        except Exception as e:
+            logger.error(f"AppDB: Error al guardar la cola de puzzles: {e}")
+
+    def remove_from_puzzle_queue(self, puzzle_id):
+        try:
+            with self.get_connection() as conn: conn.execute("DELETE FROM puzzle_queue WHERE puzzle_id = ?", (str(puzzle_id),))
+        except: pass
+
     # --- MÉTODOS PARA ÁRBOL DE APERTURA ---
+    def get_db_fingerprint(self, db_path):
+        """Huella de contenido de la base, recalculada solo si cambia tamaño o mtime"""
+        try: st = os.stat(db_path)
+        except OSError: return None
+        key = (st.st_size, st.st_mtime_ns)
+        memo = self._fingerprints.get(db_path)
+        if memo and memo[0] == key: return memo[1]
+        fingerprint = compute_db_fingerprint(db_path)
+        self._fingerprints[db_path] = (key, fingerprint)
+        return fingerprint
+
+    # --- MÉTODOS PARA EVALUACIONES DEL MOTOR ---
+    def get_engine_eval(self, board, min_depth=0):
+        """
+        Evaluación guardada de la posición con profundidad >= min_depth, o None.
+        Se devuelve con la forma de un info de python-chess (score, depth, pv, nodes) y la clave
+        Zobrist se confirma con el EPD para descartar colisiones.
+        """
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute("SELECT epd, depth, score_cp, mate, pv, nodes FROM engine_evals WHERE pos_hash = ?",
+                                   (str(chess.polyglot.zobrist_hash(board)),)).fetchone()
+        except Exception as e:
+            logger.error(f"AppDB: Error al leer evaluación: {e}")
+            return None
+        if not row or row[0] != board.epd() or row[1] < min_depth: return None
+        score = chess.engine.Mate(row[3]) if row[3] is not None else chess.engine.Cp(row[2])
+        try: pv = [chess.Move.from_uci(u) for u in row[4].split()] if row[4] else []
+        except ValueError: pv = []
+        return {"score": chess.engine.PovScore(score, chess.WHITE), "depth": row[1], "pv": pv, "nodes": row[5]}
+
+    def save_engine_eval(self, board, info):
+        self.save_engine_evals_many([(board, info)])
+
+    def save_engine_evals_many(self, items):
+        """Guarda una lista de (board, info). Una evaluación solo sustituye a otra de igual o menor profundidad."""
+        rows = []; now = time.time()
+        for board, info in items:
+            score, depth = info.get("score"), info.get("depth")
+            if score is None or not depth: continue
+            white = score.white()
+            rows.append((str(chess.polyglot.zobrist_hash(board)), board.epd(), depth, white.score(), white.mate(),
+                         " ".join(m.uci() for m in info.get("pv") or []), info.get("nodes"), now))
+        if not rows: return
+        try:
+            with self.get_connection() as conn:
+                conn.executemany("""
+                    INSERT INTO engine_evals (pos_hash, epd, depth, score_cp, mate, pv, nodes, updated)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(pos_hash) DO UPDATE SET
+                        epd = excluded.epd, depth = excluded.depth, score_cp = excluded.score_cp, mate = excluded.mate,
+                        pv = excluded.pv, nodes = excluded.nodes, updated = excluded.updated
+                    WHERE excluded.depth >= engine_evals.depth OR excluded.epd != engine_evals.epd
+                """, rows)
+        except Exception as e:
+            logger.error(f"AppDB: Error al guardar evaluaciones: {e}")
+
     def save_opening_stats(self, db_path, pos_hash, stats_df, engine_eval=None):
+        self.save_opening_stats_many(db_path, [(pos_hash, stats_df, engine_eval)])
+
+    def save_opening_stats_many(self, db_path, items):
+        """Guarda en una sola transacción una lista de (pos_hash, stats_df, engine_eval)"""
         try:
-            stats_json = stats_df.write_json()
+            fingerprint = self.get_db_fingerprint(db_path); now = time.time()
+            rows = [(db_path, str(h), df.write_json(), ev, fingerprint, now) for h, df, ev in items]
             with self.get_connection() as conn:
-                conn.execute("""
-                    INSERT INTO opening_cache (db_path, pos_hash, stats_json, engine_eval) 
-                    VALUES (?, ?, ?, ?)
+                conn.executemany("""
+                    INSERT INTO opening_cache (db_path, pos_hash, stats_json, engine_eval, db_fingerprint, last_access) 
+                    VALUES (?, ?, ?, ?, ?, ?)
                     ON CONFLICT(db_path, pos_hash) DO UPDATE SET 
                         stats_json = excluded.stats_json,
-                        engine_eval = COALESCE(excluded.engine_eval, opening_cache.engine_eval)
-                """, (db_path, str(pos_hash), stats_json, engine_eval))
+                        engine_eval = CASE WHEN opening_cache.db_fingerprint IS excluded.db_fingerprint
+                                           THEN COALESCE(excluded.engine_eval, opening_cache.engine_eval)
+                                           ELSE excluded.engine_eval END,
+                        db_fingerprint = excluded.db_fingerprint,
+                        last_access = excluded.last_access
+                """, rows)
         except Exception as e:
             logger.error(f"AppDB: Error al guardar caché: {e}")
 
+    def get_cached_positions(self, db_path):
+        """Conjunto de pos_hash con entrada vigente para la versión actual de la base"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("SELECT pos_hash FROM opening_cache WHERE db_path = ? AND (db_fingerprint IS NULL OR db_fingerprint IS ?)",
+                                      (db_path, self.get_db_fingerprint(db_path)))
+                return {int(r[0]) for r in cursor}
+        except Exception as e:
+            logger.error(f"AppDB: Error al listar caché: {e}")
+            return set()
+
     def update_opening_eval(self, db_path, pos_hash, engine_eval):
         """Actualiza solo la evaluación del motor para una posición ya existente"""
         try:
             with self.get_connection() as conn:
-                conn.execute("UPDATE opening_cache SET engine_eval = ? WHERE db_path = ? AND pos_hash = ?",
-                             (engine_eval, db_path, str(pos_hash)))
+                conn.execute("UPDATE opening_cache SET engine_eval = ? WHERE db_path = ? AND pos_hash = ? AND db_fingerprint IS ?",
+                             (engine_eval, db_path, str(pos_hash), self.get_db_fingerprint(db_path)))
         except Exception as e:
             logger.error(f"AppDB: Error al actualizar eval: {e}")
 
     def get_opening_stats(self, db_path, pos_hash):
-        """Devuelve (stats_df, engine_eval)"""
+        """Devuelve (stats_df, engine_eval). Las entradas de otra versión de la base se invalidan aquí."""
         try:
             with self.get_connection() as conn:
-                cursor = conn.execute("SELECT stats_json, engine_eval FROM opening_cache WHERE db_path = ? AND pos_hash = ?", 
+                cursor = conn.execute("SELECT stats_json, engine_eval, db_fingerprint FROM opening_cache WHERE db_path = ? AND pos_hash = ?", 
                                      (db_path, str(pos_hash)))
                 row = cursor.fetchone()
                 if row:
+                    current = self.get_db_fingerprint(db_path)
+                    if row[2] is not None and row[2] != current:
+                        conn.execute("DELETE FROM opening_cache WHERE db_path = ? AND pos_hash = ?", (db_path, str(pos_hash)))
+                        self._count_cache(False)
+                        return None, None
+                    # Las entradas anteriores a las huellas se adoptan con la versión actual
+                    conn.execute("UPDATE opening_cache SET last_access = ?, db_fingerprint = COALESCE(db_fingerprint, ?) WHERE db_path = ? AND pos_hash = ?",
+                                 (time.time(), current, db_path, str(pos_hash)))
                     df = pl.read_json(io.BytesIO(row[0].encode()))
+                    self._count_cache(True)
                     return df, row[1]
         except Exception as e:
             logger.error(f"AppDB: Error al leer caché: {e}")
+        self._count_cache(False)
         return None, None
+
+    def _count_cache(self, hit):
+        with self._counter_lock:
+            if hit: self.cache_hits += 1
+            else: self.cache_misses += 1
+
+    def get_cache_counters(self):
+        """(aciertos, fallos) de la sesión, leídos a la vez"""
+        with self._counter_lock: return self.cache_hits, self.cache_misses
+
+    def purge_stale_opening_stats(self, db_path):
+        """Borra de golpe las entradas de una base cuyo contenido ya no coincide con la huella guardada"""
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.execute("DELETE FROM opening_cache WHERE db_path = ? AND db_fingerprint IS NOT NULL AND db_fingerprint IS NOT ?",
+                                      (db_path, self.get_db_fingerprint(db_path)))
+                if cursor.rowcount: logger.info(f"AppDB: {cursor.rowcount} entradas obsoletas eliminadas para {db_path}")
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"AppDB: Error al purgar caché: {e}")
+        return 0
+
+    def export_opening_cache(self, db_path, bundle_path):
+        """
+        Vuelca las entradas vigentes de una base a un bundle Parquet portable, identificado por huella y no por ruta.
+        Solo las que llevan la huella actual: las antiguas sin huella no se sabe de qué contenido salieron
+        y el bundle las haría pasar por válidas en la otra máquina
+        """
+        fingerprint = self.get_db_fingerprint(db_path)
+        if fingerprint is None: raise ValueError(f"No se puede calcular la huella de {db_path}")
+        with self.get_connection() as conn:
+            rows = conn.execute("SELECT pos_hash, stats_json, engine_eval FROM opening_cache WHERE db_path = ? AND db_fingerprint = ?",
+                                (db_path, fingerprint)).fetchall()
+        bundle = pl.DataFrame(rows, schema={"pos_hash": pl.String, "stats_json": pl.String, "engine_eval": pl.Float64}, orient="row")
+        bundle = bundle.with_columns(pl.col("pos_hash").cast(pl.UInt64), pl.lit(fingerprint).alias("db_fingerprint"))
+        bundle.write_parquet(bundle_path, compression="zstd", compression_level=10)
+        logger.info(f"AppDB: Exportadas {bundle.height} posiciones de {db_path} a {bundle_path}")
+        return bundle.height
+
+    def import_opening_cache(self, bundle_path, db_path):
+        """Importa un bundle sobre la base local cuyo contenido coincida con la huella de las entradas"""
+        fingerprint = self.get_db_fingerprint(db_path)
+        bundle = pl.read_parquet(bundle_path).filter(pl.col("db_fingerprint") == fingerprint)
+        if bundle.is_empty():
+            logger.warning(f"AppDB: El bundle {bundle_path} no corresponde al contenido de {db_path}")
+            return 0
+        now = time.time()
+        rows = [(db_path, str(h), js, ev, fingerprint, now) for h, js, ev in bundle.select(["pos_hash", "stats_json", "engine_eval"]).iter_rows()]
+        with self.get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO opening_cache (db_path, pos_hash, stats_json, engine_eval, db_fingerprint, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(db_path, pos_hash) DO UPDATE SET
+                    stats_json = excluded.stats_json,
+                    engine_eval = COALESCE(excluded.engine_eval, opening_cache.engine_eval),
+                    db_fingerprint = excluded.db_fingerprint,
+                    last_access = excluded.last_access
+            """, rows)
+        logger.info(f"AppDB: Importadas {len(rows)} posiciones en {db_path}")
+        return len(rows)
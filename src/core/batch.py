@@ -0,0 +1,224 @@
+import os
+import json
+import glob
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import chess
+import chess.engine
+import polars as pl
+from src.config import logger
+from src.core.engine_pool import EnginePool
+from src.core.utils import compute_game_stats
+
+EVAL_CLIP = 2000 # mate = +/-20.00, mismo convenio que el análisis completo de la GUI
+
+ANNOTATION_SCHEMA = {
+    "id": pl.Int64, "evals": pl.List(pl.Int16),
+    "w_accuracy": pl.Float32, "b_accuracy": pl.Float32, "w_acpl": pl.Float32, "b_acpl": pl.Float32,
+    "w_blunders": pl.UInt16, "b_blunders": pl.UInt16, "w_mistakes": pl.UInt16, "b_mistakes": pl.UInt16,
+    "w_inaccuracies": pl.UInt16, "b_inaccuracies": pl.UInt16
+}
+
+def score_to_cp(score_obj):
+    score = score_obj.white()
+    if score.is_mate(): return EVAL_CLIP if score.mate() > 0 else -EVAL_CLIP
+    return max(-EVAL_CLIP, min(EVAL_CLIP, score.score()))
+
+class GameAnnotator:
+    """Analiza partidas completas con motores del pool y calcula sus estadísticas de precisión"""
+    def __init__(self, engine_path, depth=12, pool=None, app_db=None, threads=1, hash_mb=16):
+        self.engine_path = engine_path
+        self.depth = depth
+        self.pool = pool or EnginePool(max_idle=os.cpu_count() or 1)
+        self.app_db = app_db
+        self.options = {"Threads": threads, "Hash": hash_mb}
+
+    def annotate(self, game_id, full_line):
+        moves = full_line.split() if full_line else []
+        board = chess.Board(); evals = []
+        with self.pool.lease(self.engine_path, self.options) as engine:
+            evals.append(self._evaluate(engine, board))
+            for uci in moves:
+                try: board.push_uci(uci)
+                except ValueError: break
+                evals.append(self._evaluate(engine, board))
+        stats = compute_game_stats(evals, len(evals) - 1)
+        row = {"id": game_id, "evals": evals}
+        for color, p in (("white", "w"), ("black", "b")):
+            s = stats[color]
+            row.update({f"{p}_accuracy": s["accuracy"], f"{p}_acpl": s["acpl"], f"{p}_blunders": s["blunders"], f"{p}_mistakes": s["mistakes"], f"{p}_inaccuracies": s["inaccuracies"]})
+        return row
+
+    def _evaluate(self, engine, board):
+        if board.is_game_over():
+            outcome = board.outcome()
+            return 0 if outcome.winner is None else (EVAL_CLIP if outcome.winner == chess.WHITE else -EVAL_CLIP)
+        cached = self.app_db.get_engine_eval(board, self.depth) if self.app_db else None
+        if cached: return score_to_cp(cached["score"])
+        info = engine.analyse(board, chess.engine.Limit(depth=self.depth))
+        if self.app_db: self.app_db.save_engine_eval(board, info)
+        return score_to_cp(info["score"]) if info.get("score") else 0
+
+def _open_parts(output_path, manifest):
+    """Carpeta '<salida>.parts/' de un trabajo reanudable; falla si sus partes son de otra ejecución"""
+    parts_dir = output_path + ".parts"; os.makedirs(parts_dir, exist_ok=True)
+    manifest_path = os.path.join(parts_dir, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f: previous = json.load(f)
+        if previous != manifest: raise ValueError(f"Las partes de {parts_dir} son de otra ejecución ({previous}); bórralas o usa los mismos parámetros")
+    else:
+        with open(manifest_path, "w") as f: json.dump(manifest, f)
+    return parts_dir
+
+def annotate_database(parquet_path, output_path, engine_path, depth=12, workers=None, batch_size=64, max_games=None, app_db=None, pool=None, progress_callback=None):
+    """
+    Anota con el motor todas las partidas de una base Parquet: evaluación por ply (List(Int16))
+    y precisión, ACPL y errores por bando, en un Parquet complementario unido por 'id'.
+    Cada lote de partidas se guarda como una parte en '<salida>.parts/'; si el proceso se corta,
+    al relanzarlo con los mismos parámetros se saltan las partes ya escritas.
+    """
+    import pyarrow.parquet as pq
+    workers = workers or os.cpu_count() or 1
+    parts_dir = _open_parts(output_path, {"source": os.path.abspath(parquet_path), "depth": depth, "batch_size": batch_size})
+
+    pf = pq.ParquetFile(parquet_path)
+    total = min(pf.metadata.num_rows, max_games) if max_games else pf.metadata.num_rows
+    own_pool = pool is None
+    annotator = GameAnnotator(engine_path, depth=depth, pool=pool or EnginePool(max_idle=workers), app_db=app_db)
+    start_time = time.time(); done = 0; resumed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for index, batch in enumerate(pf.iter_batches(batch_size=batch_size, columns=["id", "full_line"])):
+                if done >= total: break
+                rows = batch.to_pylist()[:total - done]
+                part_path = os.path.join(parts_dir, f"part_{index:06d}.parquet")
+                if os.path.exists(part_path):
+                    done += len(rows); resumed += len(rows); continue
+                results = list(executor.map(lambda r: annotator.annotate(r["id"], r["full_line"]), rows))
+                # Escritura atómica: una parte existe completa o no existe
+                pl.DataFrame(results, schema=ANNOTATION_SCHEMA).write_parquet(part_path + ".tmp")
+                os.replace(part_path + ".tmp", part_path)
+                done += len(rows)
+                if progress_callback: progress_callback(done, total)
+                elapsed = time.time() - start_time
+                logger.info(f"Anotación: {done}/{total} partidas ({(done - resumed) / max(elapsed, 1e-6):.2f} p/s)")
+    finally:
+        if own_pool: annotator.pool.shutdown()
+
+    parts = sorted(glob.glob(os.path.join(parts_dir, "part_*.parquet")))
+    if parts: pl.scan_parquet(parts).sink_parquet(output_path)
+    else: pl.DataFrame(schema=ANNOTATION_SCHEMA).write_parquet(output_path)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    logger.info(f"Anotación: {done} partidas escritas en {output_path} ({resumed} reanudadas) en {time.time() - start_time:.1f}s")
+    return done
+
+PUZZLE_MATE = 100000 # cp con que se comparan los mates en la comprobación de unicidad
+LENGTH_THEMES = {1: "oneMove", 2: "short", 3: "long"} # convenio de Lichess; más largo: 'veryLong'
+
+class PuzzleVerifier:
+    """
+    Segunda etapa del generador de puzzles: cada candidato (FEN antes de la jugada del rival y
+    'jugada_rival jugada_táctica') se analiza con MultiPV 2. Se acepta si la jugada de la partida es la
+    del motor, deja ventaja decisiva (min_win) y la segunda mejor queda al menos min_gap cp por debajo.
+    La solución se alarga con la mejor respuesta del rival mientras la siguiente jugada siga siendo única.
+    """
+    def __init__(self, engine_path, depth=14, pool=None, min_gap=200, min_win=200, max_moves=4, threads=1, hash_mb=16):
+        self.engine_path = engine_path
+        self.depth = depth
+        self.pool = pool or EnginePool(max_idle=os.cpu_count() or 1)
+        self.min_gap = min_gap; self.min_win = min_win; self.max_moves = max_moves
+        self.options = {"Threads": threads, "Hash": hash_mb}
+
+    def verify(self, puzzle):
+        """El puzzle con solución, rating y temas del motor, o None si no supera la comprobación"""
+        board = chess.Board(puzzle["FEN"]); moves = puzzle["Moves"].split()
+        try: board.push_uci(moves[0]); expected = chess.Move.from_uci(moves[1])
+        except (ValueError, IndexError): return None
+        line = [moves[0]]; solution = []; found_at = []; first_cp = 0
+        with self.pool.lease(self.engine_path, self.options) as engine:
+            while True:
+                found = self._unique_best(engine, board)
+                if found is None:
+                    if len(line) > len(solution) + 1: line.pop() # la línea acaba en una jugada del que resuelve
+                    break
+                move, cp, depth = found
+                if not solution:
+                    if move != expected: return None
+                    first_cp = cp
+                solution.append(move); found_at.append(depth); line.append(move.uci()); board.push(move)
+                if len(solution) >= self.max_moves or board.is_game_over(): break
+                info = engine.analyse(board, chess.engine.Limit(depth=self.depth))
+                if not info.get("pv"): break
+                board.push(info["pv"][0]); line.append(info["pv"][0].uci())
+        if not solution: return None
+
+        n = len(solution); mate = board.is_checkmate()
+        themes = [t for t in (puzzle.get("Themes") or "").split() if t != "mate" and not t.startswith("mateIn") and t not in LENGTH_THEMES.values() and t != "veryLong"]
+        themes += ["mate", f"mateIn{n}"] if mate else ["crushing" if first_cp >= 500 else "advantage"]
+        themes.append(LENGTH_THEMES.get(n, "veryLong"))
+        return {**puzzle, "Moves": " ".join(line), "Rating": estimate_puzzle_rating(n, max(found_at)), "Themes": " ".join(sorted(set(themes)))}
+
+    def _unique_best(self, engine, board):
+        """(jugada, cp, profundidad a la que el motor la encontró) si la mejor jugada gana y es única, o None"""
+        if board.is_game_over(): return None
+        history = []
+        with engine.analysis(board, chess.engine.Limit(depth=self.depth), multipv=2) as analysis:
+            for info in analysis:
+                if info.get("multipv", 1) == 1 and info.get("pv"): history.append((info.get("depth", 0), info["pv"][0]))
+            lines = analysis.multipv
+        if not lines or not lines[0].get("pv") or "score" not in lines[0]: return None
+        move = lines[0]["pv"][0]
+        cp = lines[0]["score"].pov(board.turn).score(mate_score=PUZZLE_MATE)
+        if cp < self.min_win: return None
+        if len(lines) > 1 and "score" in lines[1] and cp - lines[1]["score"].pov(board.turn).score(mate_score=PUZZLE_MATE) < self.min_gap: return None
+        # Profundidad desde la que la jugada ya no cambia: cuanto más tarde la ve el motor, más difícil
+        depth = self.depth
+        for d, m in reversed(history):
+            if m != move: break
+            depth = d
+        return move, cp, depth
+
+def estimate_puzzle_rating(n_moves, depth):
+    """Rating aproximado: cada jugada más de solución y cada ply que tarda el motor en verla suben la dificultad"""
+    return max(400, min(3000, 600 + 250 * (n_moves - 1) + 60 * depth))
+
+def verify_puzzles(candidates_path, output_path, engine_path, depth=14, workers=None, batch_size=64, max_puzzles=None, min_gap=200, max_moves=4, pool=None, progress_callback=None):
+    """
+    Verifica con el motor los candidatos de generate_puzzles() y escribe los aceptados con el mismo
+    formato que convert_lichess_puzzles (ordenado por 'Rating', máscara de temas). Reanudable como
+    annotate_database: cada lote se guarda como una parte en '<salida>.parts/'.
+    """
+    import pyarrow.parquet as pq
+    from src.converter import write_puzzle_parquet
+    from src.core.puzzle_generator import PUZZLE_SCHEMA
+    workers = workers or os.cpu_count() or 1
+    parts_dir = _open_parts(output_path, {"source": os.path.abspath(candidates_path), "depth": depth, "batch_size": batch_size, "min_gap": min_gap, "max_moves": max_moves})
+    pf = pq.ParquetFile(candidates_path)
+    total = min(pf.metadata.num_rows, max_puzzles) if max_puzzles else pf.metadata.num_rows
+    own_pool = pool is None
+    verifier = PuzzleVerifier(engine_path, depth=depth, pool=pool or EnginePool(max_idle=workers), min_gap=min_gap, max_moves=max_moves)
+    start_time = time.time(); done = 0; resumed = 0; accepted = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for index, batch in enumerate(pf.iter_batches(batch_size=batch_size, columns=list(PUZZLE_SCHEMA))):
+                if done >= total: break
+                rows = batch.to_pylist()[:total - done]
+                part_path = os.path.join(parts_dir, f"part_{index:06d}.parquet")
+                if os.path.exists(part_path):
+                    done += len(rows); resumed += len(rows); continue
+                results = [r for r in executor.map(verifier.verify, rows) if r]
+                pl.DataFrame(results, schema=PUZZLE_SCHEMA).write_parquet(part_path + ".tmp")
+                os.replace(part_path + ".tmp", part_path)
+                done += len(rows); accepted += len(results)
+                if progress_callback: progress_callback(done, total)
+                logger.info(f"Verificación: {done}/{total} candidatos, {accepted} aceptados ({(done - resumed) / max(time.time() - start_time, 1e-6):.2f} c/s)")
+    finally:
+        if own_pool: verifier.pool.shutdown()
+
+    parts = sorted(glob.glob(os.path.join(parts_dir, "part_*.parquet")))
+    write_puzzle_parquet(pl.scan_parquet(parts) if parts else pl.LazyFrame(schema=PUZZLE_SCHEMA), output_path, row_group_size=100_000)
+    n = pl.scan_parquet(output_path).select(pl.len()).collect().item()
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    logger.info(f"Verificación: {n} puzzles de {done} candidatos en {output_path} ({resumed} reanudados) en {time.time() - start_time:.1f}s")
+    return n
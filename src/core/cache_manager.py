@@ -0,0 +1,79 @@
+import os
+import threading
+from src.config import logger
+
+# Sobrecoste aproximado por fila (claves, índices y cabeceras de página de SQLite)
+ROW_OVERHEAD_BYTES = 96
+
+class CacheManager:
+    """
+    Mantiene acotada la caché de aperturas de fa-chess.db: elimina entradas de bases
+    que ya no existen, expulsa por LRU hasta cumplir el presupuesto de disco y compacta el fichero.
+    """
+    def __init__(self, app_db, budget_mb=512):
+        self.app_db = app_db
+        self.budget_mb = budget_mb
+        self._lock = threading.Lock() # el mantenimiento periódico y el de Opciones no se pisan
+
+    def get_stats(self):
+        """Tamaño del fichero, entradas y tasa de aciertos de la sesión"""
+        with self.app_db.get_connection() as conn:
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            entries, payload, bases = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(stats_json)), 0), COUNT(DISTINCT db_path) FROM opening_cache").fetchone()
+        hits, misses = self.app_db.get_cache_counters()
+        return {
+            "file_bytes": page_size * page_count, "free_bytes": page_size * free_pages,
+            "cache_bytes": payload + entries * ROW_OVERHEAD_BYTES, "entries": entries, "databases": bases,
+            "hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
+
+    def remove_orphans(self):
+        """Borra las entradas de rutas que ya no existen en disco (bases borradas o movidas)"""
+        with self.app_db.get_connection() as conn:
+            paths = [r[0] for r in conn.execute("SELECT DISTINCT db_path FROM opening_cache")]
+            orphans = [p for p in paths if not p or not os.path.exists(p)]
+            removed = 0
+            for path in orphans:
+                removed += conn.execute("DELETE FROM opening_cache WHERE db_path IS ?", (path,)).rowcount
+        if removed: logger.info(f"CacheManager: {removed} entradas huérfanas eliminadas ({len(orphans)} bases)")
+        return removed
+
+    def enforce_budget(self, budget_mb=None):
+        """Expulsa las entradas menos usadas recientemente hasta dejar la caché al 90% del presupuesto (el configurado si no se indica)"""
+        budget_mb = budget_mb or self.budget_mb; budget = budget_mb * 1024 * 1024
+        with self.app_db.get_connection() as conn:
+            used = conn.execute(f"SELECT COALESCE(SUM(LENGTH(stats_json) + {ROW_OVERHEAD_BYTES}), 0) FROM opening_cache").fetchone()[0]
+            if used <= budget: return 0
+            to_free = used - int(budget * 0.9)
+            removed = conn.execute(f"""
+                DELETE FROM opening_cache WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, LENGTH(stats_json) + {ROW_OVERHEAD_BYTES} AS size,
+                               SUM(LENGTH(stats_json) + {ROW_OVERHEAD_BYTES}) OVER (ORDER BY COALESCE(last_access, 0), rowid) AS acc
+                        FROM opening_cache
+                    ) WHERE acc - size < ?
+                )""", (to_free,)).rowcount
+        logger.info(f"CacheManager: {removed} entradas expulsadas por LRU (presupuesto {budget_mb} MB)")
+        return removed
+
+    def compact(self):
+        """Devuelve al sistema las páginas libres. La primera vez activa auto_vacuum incremental con un VACUUM completo."""
+        conn = self.app_db.get_connection()
+        try:
+            conn.isolation_level = None
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            else:
+                conn.execute("PRAGMA incremental_vacuum").fetchall()
+        finally:
+            conn.close()
+
+    def run_maintenance(self, budget_mb=None):
+        with self._lock:
+            removed = self.remove_orphans() + self.enforce_budget(budget_mb)
+            self.compact()
+        return removed
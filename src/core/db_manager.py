@@ -14,6 +14,10 @@ class DBManager(QObject):
     def __init__(self):
         super().__init__()
         self.dbs = {} 
+        # Ediciones sin persistir: partidas añadidas, ids borrados y orden, aplicados al consultar
+        self.appended = {}
+        self.deleted = {}
+        self.sort_order = {}
         self.db_metadata = {}
         self.active_db_name = None
         self.current_filter_query = None
@@ -33,7 +37,7 @@ class DBManager(QObject):
         if path:
             temp_path = path + ".tmp_save"
             try:
-                self.dbs[name].collect().write_parquet(temp_path)
+                self.get_db_view(name).collect().write_parquet(temp_path)
                 if os.path.exists(path): os.remove(path)
                 os.rename(temp_path, path)
                 self.set_dirty(name, False)
@@ -65,7 +69,7 @@ class DBManager(QObject):
         try:
             test_scan = pl.scan_parquet(path)
             test_scan.head(1).collect() 
-            self.dbs[name] = test_scan.cast(GAME_SCHEMA)
+            self.dbs[name] = test_scan.cast(GAME_SCHEMA); self.discard_edits(name)
             self.db_metadata[name] = {"read_only": True, "path": path, "dirty": False}
             self.set_active_db(name)
             self.database_loaded.emit(name)
@@ -79,13 +83,32 @@ class DBManager(QObject):
             path = self.db_metadata[name]["path"]
             if path and os.path.exists(path):
                 if name in self.dbs: del self.dbs[name]
-                self.dbs[name] = pl.scan_parquet(path).cast(GAME_SCHEMA)
+                self.dbs[name] = pl.scan_parquet(path).cast(GAME_SCHEMA); self.discard_edits(name)
                 if self.active_db_name == name:
                     self.reset_to_full_base()
                     self.filter_updated.emit(None)
                 return True
         return False
 
+    def get_db_view(self, name):
+        """
+        Base en disco + ediciones en memoria. El plan tiene siempre la misma forma (scan filtrado por los ids
+        borrados, concat con el búfer de añadidas y el orden), por muchas ediciones que haya. Los borrados
+        solo filtran la base: una partida añadida después con el mismo id sustituye a la del disco.
+        """
+        q = self.dbs.get(name)
+        if q is None: return None
+        deleted = self.deleted.get(name)
+        if deleted: q = q.filter(~pl.col("id").is_in(pl.Series(list(deleted), dtype=pl.Int64)))
+        appended = self.appended.get(name)
+        if appended is not None: q = pl.concat([q, appended.lazy()])
+        order = self.sort_order.get(name)
+        if order: q = q.sort(order[0], descending=order[1])
+        return q
+
+    def discard_edits(self, name):
+        self.appended.pop(name, None); self.deleted.pop(name, None); self.sort_order.pop(name, None)
+
     def reset_to_full_base(self):
         self.current_filter_query = None
         self.current_filter_df = None
@@ -114,14 +137,14 @@ class DBManager(QObject):
         if not target: return None
         if target == self.active_db_name and self.current_filter_query is not None:
             return self.current_filter_query
-        return self.dbs.get(target)
+        return self.get_db_view(target)
 
     def get_current_view(self):
         if self.current_filter_query is not None: return self.current_filter_query
-        return self.dbs.get(self.active_db_name)
+        return self.get_db_view(self.active_db_name)
 
     def filter_db(self, criteria):
-        lazy_df = self.dbs.get(self.active_db_name)
+        lazy_df = self.get_db_view(self.active_db_name)
         if lazy_df is None: return
         q = lazy_df
         if criteria.get("white"): q = q.filter(pl.col("white").str.contains(criteria["white"]))
@@ -154,9 +177,10 @@ class DBManager(QObject):
         q = self.get_current_view()
         if q is None: return
         try:
-            q = q.sort(col_name, descending=descending)
-            if self.current_filter_query is not None: self.current_filter_query = q
-            else: self.dbs[self.active_db_name] = q
+            if self.current_filter_query is not None: q = self.current_filter_query = q.sort(col_name, descending=descending)
+            else:
+                self.sort_order[self.active_db_name] = (col_name, descending)
+                q = self.get_db_view(self.active_db_name)
             self.current_filter_df = q.head(1000).collect(streaming=True)
             self.filter_updated.emit(self.current_filter_df)
         except Exception as e:
@@ -173,15 +197,16 @@ class DBManager(QObject):
         self.stats_cache[key] = (stats_df, engine_eval)
 
     def get_active_df(self):
-        lazy = self.dbs.get(self.active_db_name)
+        lazy = self.get_db_view(self.active_db_name)
         return lazy.head(1000).collect() if lazy is not None else None
     
     def add_game(self, db_name, game_data):
         if db_name in self.dbs:
             if "id" not in game_data or game_data["id"] is None:
                 game_data["id"] = int(time.time() * 1000)
-            new_row = pl.DataFrame([game_data], schema=GAME_SCHEMA).lazy()
-            self.dbs[db_name] = pl.concat([self.dbs[db_name], new_row])
+            new_row = pl.DataFrame([game_data], schema=GAME_SCHEMA)
+            appended = self.appended.get(db_name)
+            self.appended[db_name] = new_row if appended is None else appended.vstack(new_row)
             self.set_dirty(db_name, True)
             if self.active_db_name == db_name: self.reset_to_full_base()
             return True
@@ -190,7 +215,7 @@ class DBManager(QObject):
     def delete_filtered_games(self):
         name = self.active_db_name
         if self.current_filter_query is None or name not in self.dbs: return False
-        self.dbs[name] = self.dbs[name].join(self.current_filter_query.select("id"), on="id", how="anti")
+        self._mark_deleted(name, self.current_filter_query.select("id").collect()["id"].to_list())
         self.set_dirty(name)
         self.reset_to_full_base()
         self.filter_updated.emit(None)
@@ -198,21 +223,26 @@ class DBManager(QObject):
         
     def delete_game(self, db_name, game_id):
         if db_name in self.dbs: 
-            self.dbs[db_name] = self.dbs[db_name].filter(pl.col("id") != game_id)
+            self._mark_deleted(db_name, [game_id])
             self.set_dirty(db_name)
             if self.active_db_name == db_name: self.reset_to_full_base()
             return True
         return False
         
+    def _mark_deleted(self, name, ids):
+        appended = self.appended.get(name)
+        if appended is not None: self.appended[name] = appended.filter(~pl.col("id").is_in(ids))
+        self.deleted.setdefault(name, set()).update(ids)
+
     def get_game_by_id(self, db_name, game_id):
-        lazy = self.dbs.get(db_name)
+        lazy = self.get_db_view(db_name)
         if lazy is not None:
             res = lazy.filter(pl.col("id") == game_id).collect()
             if not res.is_empty(): return res.row(0, named=True)
         return None
 
     def get_active_count(self):
-        lazy = self.dbs.get(self.active_db_name)
+        lazy = self.get_db_view(self.active_db_name)
         return lazy.select(pl.len()).collect().item() if lazy is not None else 0
 
     def get_view_count(self):
@@ -265,7 +295,7 @@ class DBManager(QObject):
             path = self.db_metadata[name]["path"]
             try:
                 if os.path.exists(path): os.remove(path)
-                del self.dbs[name]; del self.db_metadata[name]
+                del self.dbs[name]; del self.db_metadata[name]; self.discard_edits(name)
                 if self.active_db_name == name: 
                     self.active_db_name = list(self.dbs.keys())[0] if self.dbs else None
                 return True
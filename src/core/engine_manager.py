@@ -0,0 +1,90 @@
+import asyncio
+import atexit
+import threading
+from contextlib import asynccontextmanager
+import chess.engine
+from src.config import logger
+from src.core.engine_pool import EnginePool
+from src.core.engine_scheduler import get_engine_scheduler
+
+class EngineManager:
+    """
+    Un único hilo con un bucle asyncio por el que pasa la E/S UCI de todos los motores. Los trabajos en
+    vivo son corrutinas que comparten el bucle (no hay un QThread por motor ni esperas activas) y entregan
+    sus resultados a Qt con señales. Los procesos son los de su EnginePool, lanzados sobre este bucle:
+    lease() presta el protocolo asíncrono del mismo motor que los workers bloqueantes usan como
+    SimpleEngine, con la misma afinidad de opciones y el mismo tope de motores libres.
+    """
+    def __init__(self, max_idle=None, timeout=10.0):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="EngineManager", daemon=True)
+        self._thread.start()
+        self.pool = EnginePool(max_idle=max_idle or get_engine_scheduler().budget, timeout=timeout, manager=self)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Programa una corrutina en el hilo de motores; devuelve un concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        """Ejecuta un callback en el hilo de motores (p. ej. para interrumpir una búsqueda)"""
+        if self.loop.is_running(): self.loop.call_soon_threadsafe(callback, *args)
+
+    def popen_uci(self, path, timeout=None):
+        """Lanza un motor sobre el bucle compartido y lo devuelve como SimpleEngine (bloquea: no llamar desde el bucle)"""
+        return self.submit(self._popen_uci(path, timeout or self.timeout)).result()
+
+    async def _popen_uci(self, path, timeout):
+        transport, protocol = await asyncio.wait_for(chess.engine.popen_uci(path), timeout)
+        engine = chess.engine.SimpleEngine(transport, protocol, timeout=timeout)
+        # Lo que haría el hilo propio de SimpleEngine.popen_uci: anotar la salida del proceso y cerrar el transporte
+        def exited(future):
+            engine.returncode.set_result(None if future.cancelled() or future.exception() else future.result()); engine.close()
+        protocol.returncode.add_done_callback(exited)
+        return engine
+
+    @asynccontextmanager
+    async def lease(self, path, options=None):
+        """Presta un motor configurado del pool. Uso (dentro del bucle): async with manager.lease(ruta, {...}) as engine:"""
+        # El préstamo y la devolución bloquean (cerrojo del pool, arranque, 'ucinewgame'): fuera del bucle
+        loop = asyncio.get_running_loop()
+        engine, current = await loop.run_in_executor(None, self.pool._acquire, path, options or {})
+        healthy = True
+        try:
+            changed = {k: v for k, v in (options or {}).items() if current.get(k) != v}
+            if changed: await engine.protocol.configure(changed); current.update(changed)
+            yield engine.protocol
+        except chess.engine.EngineError:
+            healthy = False; raise
+        finally:
+            await loop.run_in_executor(None, self.pool._release, path, engine, current, healthy)
+
+    @property
+    def spawned(self):
+        return self.pool.spawned
+
+    def idle_count(self, path=None):
+        return self.pool.idle_count(path)
+
+    def shutdown(self):
+        """Cierra los motores libres y detiene el hilo del bucle"""
+        if not self.loop.is_running(): return
+        try: self.pool.shutdown()
+        except Exception as e: logger.warning(f"EngineManager: cierre incompleto ({e})")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(self.timeout)
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+def get_engine_manager():
+    """Gestor compartido por toda la aplicación, con el pool de motores compartido (se cierra al salir)"""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = EngineManager(); atexit.register(_shared_manager.shutdown)
+        return _shared_manager
@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from contextlib import contextmanager
+import chess.engine
+from src.config import logger
+
+class EnginePool:
+    """
+    Procesos UCI de larga vida compartidos por todos los workers de motor.
+    Cada trabajo toma un motor en préstamo con lease(), que al devolverse se reinicia con
+    'ucinewgame' y vuelve a quedar libre. Los procesos caídos se descartan y se relanzan
+    en el siguiente préstamo, así que un análisis corto no paga el arranque ni la carga de la red.
+    Los procesos se lanzan sobre el bucle del EngineManager: los workers bloqueantes los usan como
+    SimpleEngine y el análisis en vivo, con manager.lease(), como protocolo asíncrono del mismo motor.
+    """
+    def __init__(self, max_idle=4, timeout=10.0, manager=None):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._idle = {} # ruta (o comando) -> [(motor, opciones)]
+        self._leased = 0
+        self.spawned = 0
+
+    @contextmanager
+    def lease(self, path, options=None):
+        """Presta un motor configurado con las opciones dadas. Uso: with pool.lease(ruta, {...}) as engine:"""
+        engine, current = self._acquire(path, options or {})
+        healthy = True
+        try:
+            changed = {k: v for k, v in (options or {}).items() if current.get(k) != v}
+            if changed: engine.configure(changed); current.update(changed)
+            yield engine
+        except chess.engine.EngineError:
+            healthy = False; raise
+        finally:
+            self._release(path, engine, current, healthy)
+
+    def _acquire(self, path, wanted):
+        with self._lock:
+            idle = self._idle.get(_key(path), [])
+            while idle:
+                # Afinidad: primero un motor que ya tenga esas opciones. Cambiar 'Hash' redimensiona
+                # (y vacía) la tabla de transposición, así que los trabajos con distinto Hash no se alternan un mismo motor
+                engine, options = idle.pop(self._best_match(idle, wanted))
+                if self._is_alive(engine): self._leased += 1; return engine, options
+                logger.warning("EnginePool: motor caído descartado, se relanzará")
+                self._close(engine)
+            self._leased += 1
+        try:
+            engine = self._spawn(path); self.spawned += 1
+        except Exception:
+            with self._lock: self._leased -= 1
+            raise
+        return engine, {}
+
+    def _spawn(self, path):
+        if self.manager is None:
+            from src.core.engine_manager import get_engine_manager
+            self.manager = get_engine_manager()
+        return self.manager.popen_uci(path, self.timeout)
+
+    def _best_match(self, idle, wanted):
+        """Índice del motor libre con más opciones ya aplicadas ('Hash' pesa más); a igualdad, el último devuelto"""
+        def score(i):
+            current = idle[i][1]
+            return (current.get("Hash") == wanted.get("Hash") if "Hash" in wanted else True, sum(current.get(k) == v for k, v in wanted.items()), i)
+        return max(range(len(idle)), key=score)
+
+    def _release(self, path, engine, options, healthy):
+        keep = healthy and self._is_alive(engine) and self._reset(engine)
+        with self._lock:
+            self._leased -= 1
+            idle = self._idle.setdefault(_key(path), [])
+            if keep and len(idle) < self.max_idle: idle.append((engine, options)); return
+        self._close(engine)
+
+    def _reset(self, engine):
+        """Nueva partida: limpia la tabla hash y el historial del motor antes de reutilizarlo"""
+        async def ucinewgame(protocol):
+            protocol.send_line("ucinewgame"); await protocol.ping()
+        try:
+            asyncio.run_coroutine_threadsafe(ucinewgame(engine.protocol), engine.protocol.loop).result(self.timeout)
+            return True
+        except Exception:
+            return False
+
+    def _is_alive(self, engine):
+        try: return not engine.returncode.done()
+        except Exception: return False
+
+    def _close(self, engine):
+        try: engine.quit()
+        except Exception:
+            try: engine.close()
+            except Exception: pass
+
+    def set_max_idle(self, max_idle):
+        """Motores libres que se conservan por ruta; los que sobran al reducirlo se cierran"""
+        with self._lock:
+            self.max_idle = max(1, max_idle); extra = []
+            for idle in self._idle.values():
+                while len(idle) > self.max_idle: extra.append(idle.pop(0)[0])
+        for engine in extra: self._close(engine)
+
+    def idle_count(self, path=None):
+        with self._lock: return sum(len(v) for k, v in self._idle.items() if path is None or k == _key(path))
+
+    def shutdown(self):
+        with self._lock: engines = [e for v in self._idle.values() for e, _ in v]; self._idle.clear()
+        for engine in engines: self._close(engine)
+
+def _key(path): return tuple(path) if isinstance(path, (list, tuple)) else path
+
+def get_engine_pool():
+    """
+    Pool compartido por toda la aplicación: el del EngineManager compartido, que lo cierra al salir.
+    Conserva tantos motores libres como hilos tiene el planificador: nunca hay más motores trabajando
+    a la vez, así que entre tramos de un análisis en paralelo no se cierra y relanza ninguno
+    (set_max_idle al cambiar el presupuesto).
+    """
+    from src.core.engine_manager import get_engine_manager
+    return get_engine_manager().pool
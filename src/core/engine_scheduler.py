@@ -0,0 +1,128 @@
+import os
+import itertools
+import threading
+from contextlib import contextmanager
+from PySide6.QtCore import QObject, Signal
+
+# Prioridades de los trabajos de motor (menor = más urgente)
+INTERACTIVE, REFUTATION, TREE_SCAN, BATCH = range(4)
+
+class EngineTicket:
+    """Permiso para ocupar 'threads' hilos de CPU con un motor"""
+    __slots__ = ("priority", "threads", "name", "seq", "on_shrink")
+    def __init__(self, priority, threads, name, on_shrink=None):
+        self.priority = priority; self.threads = threads; self.name = name; self.seq = None; self.on_shrink = on_shrink
+
+class EngineScheduler(QObject):
+    """
+    Reparte un presupuesto global de hilos entre todos los trabajos de motor por prioridad:
+    en vivo > refutación > escaneo del árbol > análisis por lotes. El análisis en vivo nunca espera;
+    el resto hace cola y, en cada checkpoint(), cede su hueco si hay un trabajo más urgente esperando
+    o el presupuesto está desbordado, y continúa donde lo dejó cuando vuelve a tener turno.
+    Mientras haya otros trabajos el análisis en vivo se queda con budget-1 hilos como mucho, para que
+    una búsqueda infinita no los deje esperando sin fin: si ya ocupaba más, se le avisa con on_shrink.
+    """
+    queue_changed = Signal(int, int, int) # trabajos activos, en cola, hilos en uso
+
+    def __init__(self, thread_budget=0):
+        super().__init__()
+        self._cond = threading.Condition()
+        self._running = []
+        self._waiting = []
+        self._used = 0
+        self._seq = itertools.count()
+        self.budget = thread_budget or os.cpu_count() or 1
+
+    def set_budget(self, thread_budget):
+        """0 = un hilo por núcleo"""
+        with self._cond: self.budget = thread_budget or os.cpu_count() or 1; self._cond.notify_all()
+
+    def acquire(self, priority, threads=1, name="", abort=None, on_shrink=None):
+        """
+        Bloquea hasta que el trabajo tiene turno; devuelve None si abort() se cumple mientras espera.
+        on_shrink() (solo INTERACTIVE) avisa, con el cerrojo tomado y sin poder bloquear, de que llega
+        otro trabajo y hay que devolver hilos: el llamador libera el turno y pide otro, que sale recortado.
+        """
+        ticket = EngineTicket(priority, max(1, threads), name, on_shrink)
+        return ticket if self._wait_for(ticket, abort) else None
+
+    def release(self, ticket):
+        with self._cond:
+            if ticket not in self._running: return # ya cedido en un checkpoint abortado
+            self._running.remove(ticket); self._used -= ticket.threads; self._cond.notify_all()
+        self._emit()
+
+    @contextmanager
+    def job(self, priority, threads=1, name="", abort=None):
+        """Uso: with scheduler.job(TREE_SCAN, 1, "árbol", abort=lambda: not self.running) as ticket: (None si se abortó)"""
+        ticket = self.acquire(priority, threads, name, abort)
+        try: yield ticket
+        finally:
+            if ticket: self.release(ticket)
+
+    def should_yield(self, ticket):
+        with self._cond:
+            if ticket.priority == INTERACTIVE: return False
+            return self._used > self.budget or any(t.priority < ticket.priority for t in self._waiting)
+
+    def checkpoint(self, ticket, abort=None):
+        """Punto de cesión cooperativa entre dos búsquedas. Devuelve False si el trabajo se abortó esperando"""
+        if not self.should_yield(ticket): return True
+        self.release(ticket)
+        return self._wait_for(ticket, abort)
+
+    def _wait_for(self, ticket, abort):
+        with self._cond:
+            # Un trabajo cedido conserva su número de orden y recupera el turno antes que los nuevos
+            if ticket.seq is None: ticket.seq = next(self._seq)
+            if ticket.priority == INTERACTIVE: ticket.threads = self._interactive_threads(ticket.threads)
+            else: ticket.threads = min(ticket.threads, self.budget)
+            self._waiting.append(ticket)
+            if ticket.priority != INTERACTIVE: self._shrink_interactive()
+            self._emit_locked()
+            while not self._can_run(ticket):
+                if abort and abort():
+                    self._waiting.remove(ticket); self._cond.notify_all(); self._emit_locked()
+                    return False
+                self._cond.wait(0.1)
+            self._waiting.remove(ticket); self._running.append(ticket); self._used += ticket.threads
+            self._cond.notify_all()
+        self._emit()
+        return True
+
+    def _can_run(self, ticket):
+        if ticket.priority == INTERACTIVE: return True
+        head = min((t for t in self._waiting if t.priority != INTERACTIVE), key=lambda t: (t.priority, t.seq))
+        return head is ticket and self._used + ticket.threads <= self.budget
+
+    def _interactive_cap(self):
+        return max(1, self.budget - 1)
+
+    def _interactive_threads(self, threads):
+        others = any(t.priority != INTERACTIVE for t in self._running + self._waiting)
+        return min(threads, self._interactive_cap()) if others else threads
+
+    def _shrink_interactive(self):
+        # Un aviso por turno: el callback solo programa el corte de la búsqueda, no bloquea
+        for t in self._running:
+            if t.priority == INTERACTIVE and t.threads > self._interactive_cap() and t.on_shrink:
+                callback, t.on_shrink = t.on_shrink, None; callback()
+
+    def _emit_locked(self):
+        self.queue_changed.emit(len(self._running), len(self._waiting), self._used)
+
+    def _emit(self):
+        with self._cond: self._emit_locked()
+
+    def stats(self):
+        with self._cond: return {"running": len(self._running), "waiting": len(self._waiting), "threads": self._used, "budget": self.budget}
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+def get_engine_scheduler():
+    """Planificador compartido por todos los workers de motor"""
+    global _shared_scheduler
+    with _shared_lock:
+        if _shared_scheduler is None: _shared_scheduler = EngineScheduler()
+        return _shared_scheduler
@@ -1,80 +1,168 @@
+import asyncio
 import chess
 import chess.engine
 import os
-from PySide6.QtCore import QThread, Signal
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PySide6.QtCore import QObject, QThread, Signal
+from src.core.engine_pool import get_engine_pool
+from src.core.engine_manager import get_engine_manager
+from src.core.engine_scheduler import get_engine_scheduler, INTERACTIVE, TREE_SCAN, BATCH
 
-class EngineWorker(QThread):
+class EngineWorker(QObject):
+    """
+    Análisis en vivo del tablero. Corre como corrutina en el hilo del EngineManager: update_position()
+    corta la búsqueda en curso en el acto y, alcanzado el límite de profundidad, el trabajo duerme
+    hasta la siguiente posición sin sondear. Conserva la interfaz de QThread (start/stop/wait/isRunning).
+    """
     # Señal que envía: (evaluación_str, mejor_movimiento_uci, línea_principal_san)
     info_updated = Signal(str, str, list)
+    # Con multipv > 1, en el mismo fotograma: [(evaluación_str, uci, línea_san), ...] ordenadas por multipv
+    lines_updated = Signal(list)
+    finished = Signal()
 
-    def __init__(self, engine_path="/usr/bin/stockfish", threads=1, hash_mb=64, depth_limit=0):
+    def __init__(self, engine_path="/usr/bin/stockfish", threads=1, hash_mb=64, depth_limit=0, manager=None, app_db=None, fps=10, multipv=1, scheduler=None):
         super().__init__()
         self.engine_path = engine_path
         self.threads = threads
         self.hash_mb = hash_mb
         self.depth_limit = depth_limit
-        self.engine = None
+        self.manager = manager or get_engine_manager()
+        self.scheduler = scheduler or get_engine_scheduler()
+        self.app_db = app_db
+        self.fps = fps
+        self.multipv = multipv
+        self._future = None
+        self._analysis = None
+        self._wakeup = None
+        self._shrunk = False
         self._is_running = True
         self.current_fen = None
 
+    def start(self):
+        self._is_running = True
+        self._future = self.manager.submit(self._run())
+
+    def isRunning(self):
+        return self._future is not None and not self._future.done()
+
+    def wait(self, timeout=None):
+        if self._future is None: return True
+        try: self._future.result(timeout)
+        except Exception: pass
+        return self._future.done()
+
     def stop(self):
         self._is_running = False
-        if self.engine:
-            try:
-                self.engine.quit()
-            except:
-                pass
-            self.engine = None
+        self.manager.call_soon(self._interrupt)
 
     def update_position(self, fen):
         self.current_fen = fen
+        if self.isRunning(): self.manager.call_soon(self._interrupt)
 
-    def run(self):
+    def _interrupt(self):
+        # Se ejecuta en el hilo del bucle: despierta al trabajo y corta la búsqueda en curso
+        if self._wakeup: self._wakeup.set()
+        if self._analysis: self._analysis.stop()
+
+    def _shrink(self):
+        # Llamado por el planificador (otro hilo): llega trabajo de menor prioridad y hay que dejarle un hilo
+        self._shrunk = True
+        self.manager.call_soon(self._interrupt)
+
+    async def _run(self):
+        self._wakeup = asyncio.Event()
         try:
-            self.engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
-            self.engine.configure({"Threads": self.threads, "Hash": self.hash_mb})
-            
-            last_analysed_fen = None
-            
-            while self._is_running:
-                if self.current_fen and self.current_fen != last_analysed_fen:
-                    current_board_fen = self.current_fen
-                    last_analysed_fen = current_board_fen
-                    board = chess.Board(current_board_fen)
-                    
-                    limit = chess.engine.Limit(depth=self.depth_limit) if self.depth_limit > 0 else None
-                    with self.engine.analysis(board, limit) as analysis:
-                        for info in analysis:
-                            if not self._is_running or self.current_fen != current_board_fen:
-                                break
-                            
-                            score = info.get("score")
-                            pv = info.get("pv")
-                            depth = info.get("depth")
-                            nps = info.get("nps")
-                            
-                            if score and pv and depth:
-                                score_str = self._format_score(score, board.turn)
-                                speed = f"{int(nps/1000)}k nps" if nps else ""
-                                full_info = f"d:{depth} | {speed} | {score_str}"
-                                
-                                best_move_uci = pv[0].uci()
-                                mainline = []
-                                temp_board = board.copy()
-                                for m in pv[:5]:
-                                    if m in temp_board.legal_moves:
-                                        mainline.append(temp_board.san(m))
-                                        temp_board.push(m)
-                                    else: break
-                                self.info_updated.emit(full_info, best_move_uci, mainline)
-                
-                self.msleep(50)
+            async with self.manager.lease(self.engine_path, {"Threads": self.threads, "Hash": self.hash_mb}) as engine:
+                await self._analyse_loop(engine)
         except Exception as e:
             print(f"Error crítico en EngineWorker: {e}")
         finally:
-            if self.engine:
-                try: self.engine.quit()
-                except: pass
+            self._analysis = None; self.finished.emit()
+
+    async def _analyse_loop(self, engine):
+        last_analysed_fen = None
+        
+        while self._is_running:
+            if not self.current_fen or self.current_fen == last_analysed_fen:
+                await self._wakeup.wait(); self._wakeup.clear()
+                continue
+            current_board_fen = last_analysed_fen = self.current_fen
+            board = chess.Board(current_board_fen)
+            
+            # Evaluación guardada: se muestra al instante y, si ya alcanza el límite, no se busca
+            cached = await self._offload(self.app_db.get_engine_eval, board) if self.app_db else None
+            if self.current_fen != current_board_fen: continue
+            if cached and cached["pv"]: self._emit_info(board, cached)
+            if cached and 0 < self.depth_limit <= cached["depth"]: continue
+            
+            best = None; latest = {}; pending = False; last_emit = 0.0
+            frame = 1.0 / self.fps if self.fps > 0 else 0.0
+            limit = chess.engine.Limit(depth=self.depth_limit) if self.depth_limit > 0 else None
+            # Prioridad interactiva: nunca espera, son los demás trabajos los que ceden sus hilos.
+            # El turno se tiene solo mientras se busca: en reposo los hilos quedan para el árbol y la refutación.
+            # Si hay otros trabajos el turno sale con menos hilos; 'Threads' se cambia solo para esta búsqueda
+            self._shrunk = False
+            ticket = await self._offload(lambda: self.scheduler.acquire(INTERACTIVE, self.threads, "en vivo", on_shrink=self._shrink))
+            try:
+                options = {"Threads": ticket.threads} if ticket.threads != self.threads else {}
+                analysis = await engine.analysis(board, limit, multipv=self.multipv if self.multipv > 1 else None, options=options)
+            except BaseException: await self._offload(self.scheduler.release, ticket); raise
+            self._analysis = analysis
+            if self._shrunk: analysis.stop()
+            try:
+                while self._is_running and self.current_fen == current_board_fen:
+                    # Con un fotograma pendiente se espera la siguiente info solo lo que le queda al fotograma:
+                    # si no llega (búsqueda profunda o motor parado en el límite), se emite igualmente
+                    wait = max(frame - (time.monotonic() - last_emit), 0) if pending else None
+                    try: info = await asyncio.wait_for(analysis.get(), wait)
+                    except asyncio.TimeoutError: self._emit_frame(board, latest); pending = False; last_emit = time.monotonic(); continue
+                    except chess.engine.AnalysisComplete: break
+                    if self.current_fen != current_board_fen: break
+                    if info.get("score") and info.get("pv") and info.get("depth"):
+                        # Solo se guarda la última info de cada línea; el SAN se calcula una vez por fotograma
+                        latest[info.get("multipv", 1)] = info; pending = True
+                        if info.get("multipv", 1) == 1: best = info
+                        now = time.monotonic()
+                        if now - last_emit >= frame: self._emit_frame(board, latest); pending = False; last_emit = now
+            finally:
+                self._analysis = None; analysis.stop()
+                try: await analysis.wait()
+                except chess.engine.EngineError: pass
+                finally: await self._offload(self.scheduler.release, ticket)
+            if pending and self._is_running and self.current_fen == current_board_fen: self._emit_frame(board, latest)
+            if best and self.app_db and (not cached or best["depth"] >= cached["depth"]): await self._offload(self.app_db.save_engine_eval, board, best)
+            # Recortado por el planificador: se repite la misma posición con los hilos que quedan
+            if self._shrunk: last_analysed_fen = None
+
+    async def _offload(self, fn, *args):
+        # SQLite y el cerrojo del planificador bloquean: fuera del hilo del bucle, que lee la salida UCI de todos los motores
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _emit_frame(self, board, latest):
+        lines = [self._render(board, latest[k]) for k in sorted(latest)]
+        self.info_updated.emit(*lines[0])
+        if self.multipv > 1: self.lines_updated.emit(lines)
+
+    def _emit_info(self, board, info):
+        self.info_updated.emit(*self._render(board, info))
+
+    def _render(self, board, info):
+        score, pv, depth, nps = info.get("score"), info.get("pv"), info.get("depth"), info.get("nps")
+        score_str = self._format_score(score, board.turn)
+        speed = f"{int(nps/1000)}k nps" if nps else ""
+        full_info = f"d:{depth} | {speed} | {score_str}"
+        
+        best_move_uci = pv[0].uci()
+        mainline = []
+        temp_board = board.copy(stack=False)
+        for m in pv[:5]:
+            if m in temp_board.legal_moves:
+                mainline.append(temp_board.san(m))
+                temp_board.push(m)
+            else: break
+        return full_info, best_move_uci, mainline
 
     def _format_score(self, score, turn):
         if score.is_mate():
@@ -85,99 +173,237 @@ class EngineWorker(QThread):
         return f"{cp/100:+.2f}"
 
 class TreeScannerWorker(QThread):
-    """Analizador secundario que recorre el árbol posición a posición rápidamente"""
+    """
+    Analizador secundario del árbol. Por defecto lanza búsquedas MultiPV desde la posición padre
+    restringidas (searchmoves) a las jugadas del árbol, en lotes de 'multipv' jugadas: todas comparten
+    la tabla hash y ganan profundidad con el mismo tiempo. Con multipv=1 se analiza jugada a jugada.
+    """
     eval_ready = Signal(str, str) # uci, score_str (ej. +0.45 o M2)
 
-    def __init__(self, engine_path, fen, moves_uci, depth=12):
+    def __init__(self, engine_path, fen, moves_uci, depth=12, pool=None, multipv=8, time_per_move=0.05, app_db=None, scheduler=None):
         super().__init__()
+        self.app_db = app_db
         self.engine_path = engine_path
         self.fen = fen
         self.moves = moves_uci
         self.depth = depth
+        self.pool = pool or get_engine_pool()
+        self.multipv = multipv
+        self.time_per_move = time_per_move
+        self.scheduler = scheduler or get_engine_scheduler()
+        self._ticket = None
         self._is_running = True
 
     def run(self):
-        engine = None
         try:
-            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
-            engine.configure({"Threads": 1, "Hash": 16})
-            
-            for move_uci in self.moves:
-                if not self._is_running: break
-                
-                try:
-                    board = chess.Board(self.fen)
-                    move = chess.Move.from_uci(move_uci)
-                    if move in board.legal_moves:
-                        board.push(move)
-                        # Análisis ultra-rápido para el árbol (usando profundidad configurada)
-                        info = engine.analyse(board, chess.engine.Limit(time=0.05, depth=self.depth))
-                        score_obj = info.get("score")
-                        if score_obj:
-                            # Devolvemos siempre la evaluación desde el punto de vista del blanco (formateada)
-                            score_white = score_obj.white()
-                            if score_white.is_mate():
-                                mate_val = score_white.mate()
-                                res = f"M{abs(mate_val)}" if mate_val > 0 else f"-M{abs(mate_val)}"
-                            else:
-                                res = f"{score_white.score()/100:+.2f}"
-                            self.eval_ready.emit(move_uci, res)
-                except: continue
+            moves = self._emit_cached()
+            if not moves: return
+            with self.scheduler.job(TREE_SCAN, 1, "árbol", abort=self._aborted) as self._ticket:
+                if not self._ticket: return
+                with self.pool.lease(self.engine_path, {"Threads": 1, "Hash": 16}) as engine:
+                    if self.multipv > 1: self._scan_multipv(engine, moves)
+                    else: self._scan(engine, moves)
         except Exception as e:
             print(f"Error en TreeScanner: {e}")
-        finally:
-            if engine:
-                try: engine.quit()
-                except: pass
+
+    def _emit_cached(self):
+        """Emite las jugadas cuya posición resultante ya tiene evaluación suficiente; devuelve el resto"""
+        if not self.app_db: return list(self.moves)
+        pending = []
+        for move_uci in self.moves:
+            try:
+                board = chess.Board(self.fen); board.push_uci(move_uci)
+                cached = self.app_db.get_engine_eval(board, self.depth - 1)
+            except ValueError: continue
+            if cached: self.eval_ready.emit(move_uci, self._format_white(cached["score"]))
+            else: pending.append(move_uci)
+        return pending
+
+    def _save_child(self, parent, info):
+        """
+        Una línea MultiPV de profundidad d desde el padre es una evaluación de profundidad d-1 del hijo.
+        Un mate se recuenta desde el hijo: si mueve el bando que da mate, queda una jugada suya menos
+        (el hijo ya mateado no se guarda); si mueve el que lo recibe, la distancia no cambia
+        """
+        if not self.app_db or not info.get("depth") or info["depth"] < 2: return
+        score = info["score"]; mate = score.pov(parent.turn).mate()
+        if mate is not None:
+            if mate == 1: return
+            score = chess.engine.PovScore(chess.engine.Mate(mate - 1 if mate > 0 else mate), parent.turn)
+        child = parent.copy(); child.push(info["pv"][0])
+        self.app_db.save_engine_eval(child, {"score": score, "depth": info["depth"] - 1, "pv": info["pv"][1:], "nodes": info.get("nodes")})
+
+    def _scan_multipv(self, engine, moves):
+        board = chess.Board(self.fen)
+        remaining = [m for m in (chess.Move.from_uci(u) for u in moves) if m in board.legal_moves]
+        while remaining and self._is_running and self.scheduler.checkpoint(self._ticket, self._aborted):
+            k = min(self.multipv, len(remaining))
+            # Tiempo equivalente al modo por jugada, pero invertido en una única búsqueda compartida
+            infos = engine.analyse(board, chess.engine.Limit(time=self.time_per_move * k, depth=self.depth), multipv=k, root_moves=remaining)
+            done = set()
+            for info in infos:
+                pv = info.get("pv"); score_obj = info.get("score")
+                if not pv or not score_obj or pv[0] in done: continue
+                done.add(pv[0]); self.eval_ready.emit(pv[0].uci(), self._format_white(score_obj)); self._save_child(board, info)
+            if not done: break
+            # Las jugadas fuera del top-K se buscan en el siguiente lote con searchmoves
+            remaining = [m for m in remaining if m not in done]
+
+    def _scan(self, engine, moves):
+        for move_uci in moves:
+            if not self._is_running or not self.scheduler.checkpoint(self._ticket, self._aborted): break
+            
+            try:
+                board = chess.Board(self.fen)
+                move = chess.Move.from_uci(move_uci)
+                if move in board.legal_moves:
+                    board.push(move)
+                    # Análisis ultra-rápido para el árbol (usando profundidad configurada)
+                    info = engine.analyse(board, chess.engine.Limit(time=self.time_per_move, depth=self.depth))
+                    score_obj = info.get("score")
+                    if score_obj:
+                        self.eval_ready.emit(move_uci, self._format_white(score_obj))
+                        if self.app_db: self.app_db.save_engine_eval(board, info)
+            except: continue
+
+    def _format_white(self, score_obj):
+        """Evaluación siempre desde el punto de vista del blanco (formateada)"""
+        score_white = score_obj.white()
+        if score_white.is_mate():
+            mate_val = score_white.mate()
+            return f"M{abs(mate_val)}" if mate_val > 0 else f"-M{abs(mate_val)}"
+        return f"{score_white.score()/100:+.2f}"
+
+    def _aborted(self): return not self._is_running
 
     def stop(self):
         self._is_running = False
 
 class FullAnalysisWorker(QThread):
+    """
+    Análisis de la partida completa repartido entre N motores del pool (por defecto uno por núcleo).
+    Cada motor recorre un tramo contiguo de la partida, así aprovecha su tabla hash entre jugadas
+    consecutivas, y los resultados se emiten (ply, eval) a medida que llegan.
+    Con time_budget (segundos por partida) el análisis es por pasadas: primero todas las posiciones
+    a min_depth y después, mientras quede tiempo, se profundizan las de mayores oscilaciones de la eval.
+    """
     progress = Signal(int, int)
     analysis_result = Signal(int, int)
+    pass_finished = Signal(int, list) # nº de pasada, evaluaciones de todas las posiciones (cp blancas)
     finished = Signal()
     error_occurred = Signal(str)
 
-    def __init__(self, moves, depth=10, engine_path=None):
+    def __init__(self, moves, depth=10, engine_path=None, pool=None, engines=0, app_db=None, scheduler=None, time_budget=0, min_depth=8, depth_step=2, max_depth=40):
         super().__init__()
+        self.app_db = app_db
         self.moves = moves
         self.depth = depth
         self.engine_path = engine_path
         self.threads = 1
         self.hash_mb = 16
+        self.engines = engines or os.cpu_count() or 1
+        self.pool = pool or get_engine_pool()
+        self.scheduler = scheduler or get_engine_scheduler()
+        self.time_budget = time_budget
+        self.min_depth = min_depth
+        self.depth_step = depth_step
+        self.max_depth = max_depth
         self.running = True
+        self._done = 0
+        self._lock = threading.Lock()
 
     def run(self):
         try:
             import shutil
             engine_path = self.engine_path or shutil.which("stockfish") or "/usr/bin/stockfish"
-            engine = chess.engine.SimpleEngine.popen_uci(engine_path)
-            engine.configure({"Threads": self.threads, "Hash": self.hash_mb})
-            
-            board = chess.Board()
-            self.analyze_position(engine, board, 0)
-            
-            for i, move in enumerate(self.moves):
-                if not self.running: break
-                board.push(move)
-                self.analyze_position(engine, board, i + 1)
-                self.progress.emit(i + 1, len(self.moves))
-            
-            engine.quit()
+            board = chess.Board(); positions = [(0, board.copy())]
+            for i, move in enumerate(self.moves): board.push(move); positions.append((i + 1, board.copy()))
+            if self.time_budget > 0: return self._run_budgeted(engine_path, positions)
+            total = len(positions); self._done = 0
+            # Las posiciones ya evaluadas a esta profundidad no ocupan motor
+            if self.app_db:
+                pending = []
+                for idx, b in positions:
+                    cached = self.app_db.get_engine_eval(b, self.depth)
+                    if cached: self.analysis_result.emit(idx, self._to_centipawns(cached["score"])); self._done += 1; self.progress.emit(self._done, total)
+                    else: pending.append((idx, b))
+                positions = pending
+            if not positions: return
+            self._run_chunks(engine_path, [(idx, b, self.depth) for idx, b in positions], lambda done: self.progress.emit(done, total))
         except Exception as e:
             self.error_occurred.emit(str(e))
         finally:
             self.finished.emit()
 
-    def analyze_position(self, engine, board, idx):
+    def _run_budgeted(self, engine_path, positions):
+        deadline = time.monotonic() + self.time_budget; budget_ms = int(self.time_budget * 1000)
+        evals = [0] * len(positions); depths = [0] * len(positions)
+        work = [(idx, b, self.min_depth) for idx, b in positions]; pass_no = 0
+        def on_done(_):
+            self.progress.emit(min(int((self.time_budget - max(deadline - time.monotonic(), 0)) * 1000), budget_ms), budget_ms)
+        while work and self.running and time.monotonic() < deadline:
+            pass_no += 1
+            for idx, cp, depth in self._run_chunks(engine_path, work, on_done, deadline):
+                # Una búsqueda cortada por el plazo llega menos hondo: no pisa una eval más profunda ya guardada
+                if depth >= depths[idx]: evals[idx] = cp; depths[idx] = depth
+            self.pass_finished.emit(pass_no, list(evals))
+            work = self._deepen_targets(positions, evals, depths)
+
+    def _deepen_targets(self, positions, evals, depths):
+        """Cuarta parte de las posiciones con mayor oscilación de la eval respecto a sus vecinas, dos plies más hondo"""
+        swings = []
+        for i, (idx, board) in enumerate(positions):
+            if depths[i] >= self.max_depth: continue
+            swing = max(abs(evals[i] - evals[i - 1]) if i > 0 else 0, abs(evals[i + 1] - evals[i]) if i + 1 < len(evals) else 0)
+            swings.append((swing, i))
+        swings.sort(key=lambda t: (-t[0], t[1]))
+        chosen = sorted(i for _, i in swings[:max(1, len(positions) // 4)])
+        return [(positions[i][0], positions[i][1], min(depths[i] + self.depth_step, self.max_depth)) for i in chosen]
+
+    def _run_chunks(self, engine_path, work, on_done, deadline=None):
+        """Reparte (ply, tablero, profundidad) en tramos contiguos, uno por motor; devuelve [(ply, cp, profundidad)]"""
+        n = max(1, min(self.engines, len(work))); size = -(-len(work) // n)
+        chunks = [work[i:i + size] for i in range(0, len(work), size)]
+        results = []
+        with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+            futures = [executor.submit(self._analyse_chunk, engine_path, chunk, on_done, deadline) for chunk in chunks]
+            for future in as_completed(futures): results.extend(future.result())
+        return results
+
+    def _analyse_chunk(self, engine_path, chunk, on_done, deadline=None):
+        # Cada tramo pide sus hilos al planificador: con el presupuesto ocupado esperan en cola y ceden ante trabajos más urgentes
+        aborted = lambda: not self.running or (deadline is not None and time.monotonic() >= deadline)
+        results = []
+        with self.scheduler.job(BATCH, self.threads, "análisis", abort=aborted) as ticket:
+            if not ticket: return results
+            with self.pool.lease(engine_path, {"Threads": self.threads, "Hash": self.hash_mb}) as engine:
+                for idx, board, depth in chunk:
+                    if aborted() or not self.scheduler.checkpoint(ticket, aborted): break
+                    result = self.analyze_position(engine, board, idx, depth, deadline)
+                    if result: results.append(result)
+                    with self._lock: self._done += 1; done = self._done
+                    on_done(done)
+        return results
+
+    def analyze_position(self, engine, board, idx, depth=None, deadline=None):
+        depth = depth or self.depth
         try:
-            info = engine.analyse(board, chess.engine.Limit(time=0.01, depth=self.depth))
+            cached = self.app_db.get_engine_eval(board, depth) if self.app_db and deadline is not None else None
+            if cached: info = cached
+            else:
+                # Sin presupuesto, tope fijo de 10 ms; con presupuesto, la búsqueda nunca pasa del tiempo que queda
+                limit = chess.engine.Limit(time=0.01, depth=depth) if deadline is None else chess.engine.Limit(depth=depth, time=max(deadline - time.monotonic(), 0.01))
+                info = engine.analyse(board, limit)
             score_obj = info.get("score")
             if score_obj:
-                score = score_obj.white()
-                val = 2000 if score.is_mate() and score.mate() > 0 else (-2000 if score.is_mate() else score.score())
-                self.analysis_result.emit(idx, val)
+                cp = self._to_centipawns(score_obj)
+                self.analysis_result.emit(idx, cp)
+                if self.app_db and not cached: self.app_db.save_engine_eval(board, info)
+                return idx, cp, info.get("depth") or depth
         except: self.analysis_result.emit(idx, 0)
 
+    def _to_centipawns(self, score_obj):
+        score = score_obj.white()
+        return 2000 if score.is_mate() and score.mate() > 0 else (-2000 if score.is_mate() else score.score())
+
     def stop(self): self.running = False
@@ -0,0 +1,83 @@
+import os
+import struct
+import chess
+import chess.polyglot
+import polars as pl
+
+# Entrada Polyglot: clave (u64), jugada (u16), peso (u16), learn (u32), big-endian
+ENTRY_STRUCT = struct.Struct(">QHHI")
+PROMOTION_CODES = {"n": 1, "b": 2, "r": 3, "q": 4}
+MAX_WEIGHT = 0xFFFF
+
+_RANDOM = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+# uci del enroque -> (color, casilla origen/destino del rey, torre, claves de derechos del bando, uci Polyglot)
+_CASTLES = {
+    "e1g1": (chess.WHITE, chess.E1, chess.G1, chess.H1, chess.F1, (768, 769), "e1h1"),
+    "e1c1": (chess.WHITE, chess.E1, chess.C1, chess.A1, chess.D1, (768, 769), "e1a1"),
+    "e8g8": (chess.BLACK, chess.E8, chess.G8, chess.H8, chess.F8, (770, 771), "e8h8"),
+    "e8c8": (chess.BLACK, chess.E8, chess.C8, chess.A8, chess.D8, (770, 771), "e8a8"),
+}
+
+def _piece_key(piece_type, color, square): return _RANDOM[64 * ((piece_type - 1) * 2 + int(color)) + square]
+
+def _castle_deltas(uci):
+    """Todas las diferencias Zobrist posibles de un enroque (derechos perdidos y casilla al paso previa)"""
+    color, k_from, k_to, r_from, r_to, rights, _ = _CASTLES[uci]
+    core = _piece_key(chess.KING, color, k_from) ^ _piece_key(chess.KING, color, k_to) ^ _piece_key(chess.ROOK, color, r_from) ^ _piece_key(chess.ROOK, color, r_to) ^ _RANDOM[780]
+    lost = [_RANDOM[rights[0]], _RANDOM[rights[1]], _RANDOM[rights[0]] ^ _RANDOM[rights[1]]]
+    eps = [0] + [_RANDOM[772 + f] for f in range(8)]
+    return {core ^ r ^ e for r in lost for e in eps}
+
+_CASTLE_DELTAS = {uci: _castle_deltas(uci) for uci in _CASTLES}
+
+def is_castling(uci, key, child):
+    """
+    Distingue un enroque de un movimiento normal con la misma notación (p. ej. una dama e1g1)
+    sin reconstruir el tablero: basta con comparar la diferencia entre los hashes Zobrist.
+    """
+    return uci in _CASTLE_DELTAS and child is not None and (key ^ child) in _CASTLE_DELTAS[uci]
+
+def to_book_uci(uci, key, child):
+    """Polyglot codifica el enroque como 'rey captura torre' (e1g1 -> e1h1)"""
+    return _CASTLES[uci][6] if is_castling(uci, key, child) else uci
+
+def encode_move(uci):
+    """Jugada UCI (ya en notación Polyglot) -> entero de 16 bits"""
+    ff, fr, tf, tr = ord(uci[0]) - 97, int(uci[1]) - 1, ord(uci[2]) - 97, int(uci[3]) - 1
+    return tf | (tr << 3) | (ff << 6) | (fr << 9) | (PROMOTION_CODES.get(uci[4:5], 0) << 12)
+
+def scale_weights(df):
+    """Escala los pesos de cada posición al rango u16 conservando las proporciones"""
+    top = pl.max_horizontal(pl.col("weight").max().over("key"), 1)
+    return df.with_columns(pl.when(top > MAX_WEIGHT).then((pl.col("weight") * MAX_WEIGHT / top).round()).otherwise(pl.col("weight")).clip(0, MAX_WEIGHT).cast(pl.UInt16).alias("weight"))
+
+def write_entries(f, df):
+    """Escribe las filas (key, uci, child, weight) ordenadas por clave en formato Polyglot"""
+    buf = bytearray(ENTRY_STRUCT.size * df.height); off = 0
+    for key, uci, child, weight in df.select(["key", "uci", "child", "weight"]).iter_rows():
+        ENTRY_STRUCT.pack_into(buf, off, key, encode_move(to_book_uci(uci, key, child)), weight, 0); off += ENTRY_STRUCT.size
+    f.write(buf)
+    return df.height
+
+class PolyglotBook:
+    """
+    Libro Polyglot como fuente del árbol de aperturas. El fichero se mapea en memoria y cada
+    consulta es una búsqueda binaria por clave Zobrist, así que no hace falta ninguna base cargada.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.reader = chess.polyglot.open_reader(path)
+
+    def __len__(self): return len(self.reader)
+
+    def get_stats(self, board):
+        """Jugadas del libro para la posición: uci, peso y porcentaje del peso total"""
+        weights = {}
+        for entry in self.reader.find_all(board, minimum_weight=0):
+            uci = entry.move.uci(); weights[uci] = weights.get(uci, 0) + entry.weight
+        df = pl.DataFrame({"uci": list(weights.keys()), "weight": list(weights.values())}, schema={"uci": pl.String, "weight": pl.Int64})
+        total = df["weight"].sum()
+        return df.with_columns((pl.col("weight") / total * 100 if total else pl.lit(0.0)).alias("pct")).sort("weight", descending=True)
+
+    def close(self): self.reader.close()
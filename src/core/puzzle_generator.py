@@ -0,0 +1,103 @@
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import chess
+import polars as pl
+import pyarrow.parquet as pq
+from src.config import logger
+
+PUZZLE_SCHEMA = {
+    "PuzzleId": pl.String, "FEN": pl.String, "Moves": pl.String, "Rating": pl.Int32,
+    "Popularity": pl.Int16, "Themes": pl.String, "OpeningTags": pl.String
+}
+
+def find_tactics(game_id, full_line, result="*"):
+    """
+    Puzzles de una partida en formato Lichess: FEN antes de la jugada del rival y 'Moves' = jugada del
+    rival + jugada táctica. Candidatos: capturas de torre o dama que no sean una recaptura (los cambios
+    no son táctica) y el mate final.
+
+    El filtro barato va primero: la captura se mira con bitboards sobre el tablero que ya se está
+    reproduciendo, y el mate solo puede ser la última jugada de una partida decisiva, así que
+    is_checkmate() se llama como mucho una vez por partida en lugar de gives_check() en cada jugada.
+    """
+    moves = full_line.split() if full_line else []
+    board = chess.Board(); found = []; prev_to = None
+    for ply, uci in enumerate(moves):
+        try: move = chess.Move.from_uci(uci)
+        except ValueError: break
+        target = chess.BB_SQUARES[move.to_square]
+        captured = target & board.occupied_co[not board.turn]
+        if captured & (board.rooks | board.queens) and ply > 0 and move.to_square != prev_to:
+            found.append({"PuzzleId": f"gen_{game_id}_{ply}", "FEN": _fen_before_last(board), "Moves": f"{moves[ply - 1]} {uci}", "Themes": "hangingPiece"})
+        prev_to = move.to_square if captured else None
+        try: board.push(move)
+        except Exception: break
+    else:
+        if len(moves) > 1 and result in ("1-0", "0-1") and board.is_checkmate():
+            board.pop()
+            found.append({"PuzzleId": f"gen_{game_id}_{len(moves) - 1}", "FEN": _fen_before_last(board), "Moves": " ".join(moves[-2:]), "Themes": "mate mateIn1"})
+    return found
+
+def _fen_before_last(board):
+    """FEN antes de la última jugada del tablero (se deshace y se rehace: solo para candidatos)"""
+    last = board.pop(); fen = board.fen(); board.push(last)
+    return fen
+
+def generate_batch(columns):
+    """Trabajador (otro proceso): un lote de partidas {'id', 'full_line', 'result'} -> (partidas, DataFrame de puzzles)"""
+    rows = []
+    for game_id, full_line, result in zip(columns["id"], columns["full_line"], columns["result"]):
+        rows += find_tactics(game_id, full_line, result or "*")
+    df = pl.DataFrame(rows, schema={k: PUZZLE_SCHEMA[k] for k in ("PuzzleId", "FEN", "Moves", "Themes")})
+    df = df.with_columns(pl.lit(1500, dtype=pl.Int32).alias("Rating"), pl.lit(0, dtype=pl.Int16).alias("Popularity"), pl.lit("", dtype=pl.String).alias("OpeningTags"))
+    return len(columns["id"]), df.select(list(PUZZLE_SCHEMA))
+
+def generate_puzzles(db_path, output_path, workers=None, batch_size=2000, max_games=None, progress_callback=None):
+    """
+    Genera puzzles de una base Parquet de partidas en streaming: los lotes de filas se reparten entre
+    procesos (como mucho 2 por proceso en vuelo, así la memoria no crece con la base) y cada resultado se
+    añade al Parquet de salida según llega. Devuelve el número de puzzles escritos (0: no se crea el fichero).
+    """
+    workers = workers or os.cpu_count() or 1
+    pf = pq.ParquetFile(db_path)
+    total = min(pf.metadata.num_rows, max_games) if max_games else pf.metadata.num_rows
+    start_time = time.time(); done = 0; written = 0; writer = None
+    tmp_path = output_path + ".tmp"
+
+    def collect(n_games, df):
+        nonlocal done, written, writer
+        done += n_games
+        if df.height:
+            table = df.to_arrow()
+            if writer is None: writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table); written += df.height
+        if progress_callback: progress_callback(done, total)
+
+    def batches():
+        sent = 0
+        for batch in pf.iter_batches(batch_size=batch_size, columns=["id", "full_line", "result"]):
+            if sent >= total: return
+            columns = batch.slice(0, total - sent).to_pydict(); sent += len(columns["id"])
+            yield columns
+
+    try:
+        if workers <= 1:
+            for columns in batches(): collect(*generate_batch(columns))
+        else:
+            # 'spawn': el generador también se lanza desde un QThread de la GUI, donde fork no es seguro
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                pending = set()
+                for columns in batches():
+                    pending.add(executor.submit(generate_batch, columns))
+                    if len(pending) >= workers * 2:
+                        ready, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in ready: collect(*future.result())
+                for future in pending: collect(*future.result())
+    finally:
+        if writer: writer.close()
+    if written: os.replace(tmp_path, output_path)
+    elapsed = time.time() - start_time
+    logger.info(f"Generador: {written} puzzles de {done} partidas en {elapsed:.1f}s ({done / max(elapsed, 1e-6):.0f} p/s, {workers} procesos)")
+    return written
@@ -1,47 +1,228 @@
+import re
+import json
 import polars as pl
+import pyarrow.parquet as pq
 import chess
 import random
+from src.core.app_db import PUZZLE_PROGRESS_SCHEMA
+
+SORTED_BY_KEY = b"fa_chess.sorted_by" # metadatos que escribe el conversor
+THEMES_KEY = b"fa_chess.themes"
+OPENINGS_KEY = b"fa_chess.openings"
 
 class PuzzleManager:
+    """
+    Consultas sobre el Parquet de puzzles. El conversor lo escribe ordenado por 'Rating' con
+    estadísticas por row group, así que un rango de dificultad se traduce en unos pocos row groups:
+    count() y get_page() solo leen esos grupos (y de los interiores el recuento sale de los metadatos).
+    Con ficheros antiguos sin ordenar se recurre a la consulta perezosa completa.
+    El progreso del usuario (set_progress) se une por 'PuzzleId' dentro de la consulta: el filtro
+    por estado es un semi/anti join y las páginas salen ya con su columna 'status'.
+    Las familias de apertura tienen un índice invertido familia -> {row group: puzzles}, construido
+    con una pasada sobre la columna categórica 'OpeningFamily' la primera vez que se filtra por una.
+    """
     def __init__(self, parquet_path):
         self.path = parquet_path
         self.lf = pl.scan_parquet(parquet_path)
+        self.pf = pq.ParquetFile(parquet_path)
+        self.row_groups = self._rating_ranges()
+        file_meta = self.pf.metadata.metadata or {}
+        sorted_flag = file_meta.get(SORTED_BY_KEY) == b"Rating"
+        # Vocabulario de temas de la máscara de bits (vacío en ficheros antiguos: filtro por texto)
+        self.themes = json.loads(file_meta[THEMES_KEY]) if THEMES_KEY in file_meta else []
+        self._theme_bits = {t: (f"ThemeMask{i // 64}", 1 << (i % 64)) for i, t in enumerate(self.themes)}
+        # Familias de apertura con su número de puzzles (vacío en ficheros antiguos: filtro por texto)
+        has_family = "OpeningFamily" in self.pf.schema_arrow.names
+        self.openings = json.loads(file_meta[OPENINGS_KEY]) if has_family and OPENINGS_KEY in file_meta else {}
+        self._opening_index = None
+        self.is_sorted = sorted_flag and self.row_groups is not None and all(a[1] <= b[0] for a, b in zip(self.row_groups, self.row_groups[1:]))
         self.current_view = self.lf
+        self.progress = pl.DataFrame(schema=PUZZLE_PROGRESS_SCHEMA)
+        self.apply_filters()
+
+    def _rating_ranges(self):
+        """(mín, máx, filas) de 'Rating' por row group según las estadísticas del fichero"""
+        meta = self.pf.metadata; col = self.pf.schema_arrow.get_field_index("Rating")
+        ranges = []
+        for i in range(meta.num_row_groups):
+            rg = meta.row_group(i); stats = rg.column(col).statistics if col >= 0 else None
+            if stats is None or not stats.has_min_max: return None
+            ranges.append((stats.min, stats.max, rg.num_rows))
+        return ranges
+
+    def set_progress(self, frame):
+        """Progreso del usuario como DataFrame (PuzzleId, status); se aplica en el siguiente apply_filters()"""
+        self.progress = frame.select(pl.col("PuzzleId").cast(pl.String), pl.col("status").cast(pl.String))
+        return self
 
-    def apply_filters(self, min_rating=0, max_rating=4000, theme=None, opening=None):
+    def apply_filters(self, min_rating=0, max_rating=4000, theme=None, opening=None, status=None):
         """Aplica filtros al LazyFrame"""
-        q = self.lf
-        
+        self.min_rating, self.max_rating = int(min_rating), int(max_rating)
         # Filtro de ELO
-        q = q.filter(
-            (pl.col("Rating") >= int(min_rating)) & 
-            (pl.col("Rating") <= int(max_rating))
-        )
-        
-        # Filtro de Temas (Lógica AND estricta, Insensible a mayúsculas)
+        pred = (pl.col("Rating") >= self.min_rating) & (pl.col("Rating") <= self.max_rating)
+        extra = []
+
+        # Filtro de Temas (Lógica AND estricta entre palabras). Cada palabra conserva la semántica de subcadena
+        # insensible a mayúsculas del filtro por texto: se expande a los temas del vocabulario que la contienen
+        # ('mate' -> mate, mateIn1, smotheredMate...) y se comprueba con la máscara de bits (algún bit puesto).
+        # Sin coincidencias en el vocabulario (o en ficheros antiguos) se busca en el texto de 'Themes'
         if theme and len(theme.strip()) > 1:
-            words = theme.split()
-            for word in words:
-                if len(word) > 1:
-                    q = q.filter(pl.col("Themes").str.contains(f"(?i){word}"))
-        
-        # Ordenación por ELO ascendente por defecto
-        q = q.sort("Rating", descending=False)
-            
+            for word in theme.split():
+                if len(word) < 2: continue
+                masks = {}
+                for t in self.themes:
+                    if word.lower() in t.lower(): col, bit = self._theme_bits[t]; masks[col] = masks.get(col, 0) | bit
+                if not masks: extra.append(pl.col("Themes").str.contains(f"(?i){re.escape(word)}")); continue
+                hits = [(pl.col(col) & pl.lit(mask, dtype=pl.UInt64)) != 0 for col, mask in masks.items()]
+                extra.append(pl.any_horizontal(hits) if len(hits) > 1 else hits[0])
+
+        # Filtro de Apertura: una familia conocida se compara en la columna categórica; cualquier otra
+        # etiqueta (variantes, ficheros antiguos) se busca en el texto de 'OpeningTags'
+        self.opening = opening if opening in self.openings else None
+        if self.opening: pred = pred & (pl.col("OpeningFamily") == self.opening)
+        elif opening: extra.append(pl.col("OpeningTags").str.contains(opening, literal=True))
+
+        for e in extra: pred = pred & e
+        # Progreso del usuario: resueltos/fallados por semi join, pendientes por anti join
+        self.status = status if status in ("success", "fail", "pending") else None
+        if self.status == "pending": self._status_ids = self.progress.select("PuzzleId")
+        elif self.status: self._status_ids = self.progress.filter(pl.col("status") == self.status).select("PuzzleId")
+        self._predicate = pred; self._rating_only = not extra and self.status is None
+        self._groups = [i for i, (lo, hi, _) in enumerate(self.row_groups or []) if hi >= self.min_rating and lo <= self.max_rating]
+        if self.opening and self.is_sorted: self._groups = [i for i in self._groups if i in self._opening_groups()]
+        self._group_counts = {}; self._group_weights = {}; self._count = None
+
+        q = self._filter_status(self.lf.filter(pred), lazy=True)
+        # Ordenación por ELO ascendente (ya viene ordenado de disco en los ficheros nuevos)
+        if not self.is_sorted: q = q.sort("Rating", descending=False)
         self.current_view = q
         return self
 
+    def _filter_status(self, frame, lazy=False):
+        if self.status is None: return frame
+        ids = self._status_ids.lazy() if lazy else self._status_ids
+        return frame.join(ids, on="PuzzleId", how="anti" if self.status == "pending" else "semi", maintain_order="left")
+
+    def _with_status(self, frame):
+        """Añade la columna 'status' (pendiente si no hay progreso guardado)"""
+        return frame.join(self.progress, on="PuzzleId", how="left", maintain_order="left").with_columns(pl.col("status").fill_null("pending"))
+
+    def _read_group(self, i, columns=None):
+        return self._filter_status(pl.from_arrow(self.pf.read_row_group(i, columns=columns)).filter(self._predicate))
+
+    def _filter_columns(self):
+        cols = self._predicate.meta.root_names()
+        return cols + ["PuzzleId"] if self.status and "PuzzleId" not in cols else cols
+
+    def _group_count(self, i):
+        if i not in self._group_counts:
+            lo, hi, n = self.row_groups[i]
+            # Grupo entero dentro del rango y sin más filtros: el recuento está en los metadatos (o en el índice de aperturas)
+            if self._rating_only and lo >= self.min_rating and hi <= self.max_rating: self._group_counts[i] = self._opening_groups().get(i, 0) if self.opening else n
+            else: self._group_counts[i] = self._read_group(i, self._filter_columns()).height
+        return self._group_counts[i]
+
+    def family_for_opening(self, name):
+        """
+        Familia de apertura de Lichess para un nombre del ECO ('B90: Sicilian: Najdorf' -> 'Sicilian_Defense'):
+        se comparan las palabras del nombre antes de ':'; entre varias candidatas gana la más específica y luego la de más puzzles.
+        """
+        def words(text): return "".join(c if c.isalnum() else " " for c in text.lower().replace("'", "").replace("defence", "defense")).split()
+        key = words(re.sub(r"^[A-E]\d\d\w?:\s*", "", name).split(":")[0]) # sin el código ECO
+        if not key: return None
+        found = [f for f in self.openings if (w := words(f))[:len(key)] == key or key[:len(w)] == w]
+        return max(found, key=lambda f: (min(len(words(f)), len(key)), self.openings[f]), default=None)
+
+    def _opening_groups(self):
+        """{row group: puzzles} de la familia filtrada, según el índice invertido de aperturas"""
+        if self._opening_index is None:
+            self._opening_index = {}
+            for i in range(self.pf.metadata.num_row_groups):
+                counts = pl.from_arrow(self.pf.read_row_group(i, columns=["OpeningFamily"])).group_by("OpeningFamily").len()
+                for family, n in counts.iter_rows():
+                    if family: self._opening_index.setdefault(family, {})[i] = n
+        return self._opening_index.get(self.opening, {})
+
+    def count(self):
+        """Número de puzzles de la vista filtrada actual"""
+        if self._count is None:
+            if self.is_sorted: self._count = sum(self._group_count(i) for i in self._groups)
+            else: self._count = self.current_view.select(pl.len()).collect().item()
+        return self._count
+
+    def get_page(self, offset, limit):
+        """Puzzles [offset, offset + limit) de la vista filtrada, en orden de dificultad"""
+        if not self.is_sorted: return self._with_status(self.current_view.slice(offset, limit).collect())
+        frames = []; skip = offset; needed = limit
+        for i in self._groups:
+            if needed <= 0: break
+            n = self._group_count(i)
+            if skip >= n: skip -= n; continue
+            df = self._read_group(i).slice(skip, needed); skip = 0
+            frames.append(df); needed -= df.height
+        return self._with_status(pl.concat(frames) if frames else self.lf.head(0).collect())
+
     def get_sample(self):
         """Obtiene TODOS los resultados de la vista filtrada actual"""
         return self.current_view.collect()
 
-    def get_random_puzzle(self):
-        """Elegimos uno al azar de la vista filtrada"""
-        df = self.current_view.head(500).collect()
-        if df.is_empty(): return None
-        
-        row = df.row(random.randint(0, df.height - 1), named=True)
-        return self.prepare_puzzle_data(row)
+    def get_random_puzzle(self, weighted=False, rng=random):
+        """
+        Puzzle al azar de toda la vista filtrada, uniforme o ponderado por 'Popularity' (peso = Popularity + 101,
+        así un -100 aún puede salir). Se elige un row group según su recuento (o peso) y una fila dentro de él:
+        no se ordena ni se recoge el conjunto de candidatos.
+        """
+        found = self.get_random_puzzles(1, weighted=weighted, rng=rng)
+        return found[0] if found else None
+
+    def get_random_puzzles(self, n, weighted=False, rng=random):
+        """n puzzles al azar (con reemplazo) como get_random_puzzle(); cada row group elegido se lee una sola vez"""
+        weighted = weighted and "Popularity" in self.pf.schema_arrow.names
+        if not self.is_sorted:
+            view = self._filter_status(self.lf.filter(self._predicate), lazy=True)
+            if weighted:
+                weights = view.select(self._weight_expr()).collect().to_series().to_list()
+                if not weights: return []
+                ks = rng.choices(range(len(weights)), weights=weights, k=n)
+            else:
+                total = view.select(pl.len()).collect().item()
+                if total == 0: return []
+                ks = [rng.randrange(total) for _ in range(n)]
+            picked = view.with_row_index("_k").filter(pl.col("_k").is_in(list(set(ks)))).collect()
+            rows = {row["_k"]: row for row in picked.iter_rows(named=True)}
+            return [self.prepare_puzzle_data(rows[k]) for k in ks]
+
+        groups = [i for i in self._groups if self._group_count(i) > 0]
+        if not groups: return []
+        picks = {}
+        if weighted:
+            # Por row group basta con cuántas filas salen de él: se sortean al leerlo
+            for i in rng.choices(groups, weights=[self._group_weight(i) for i in groups], k=n): picks[i] = picks.get(i, 0) + 1
+        else:
+            counts = [self._group_count(i) for i in groups]; total = sum(counts)
+            for _ in range(n):
+                k = rng.randrange(total)
+                for i, c in zip(groups, counts):
+                    if k < c: break
+                    k -= c
+                picks.setdefault(i, []).append(k)
+        found = []
+        for i, ks in picks.items():
+            df = self._read_group(i)
+            if weighted: ks = rng.choices(range(df.height), weights=df.select(self._weight_expr()).to_series().to_list(), k=ks)
+            found += [self.prepare_puzzle_data(df.row(k, named=True)) for k in ks]
+        rng.shuffle(found)
+        return found
+
+    def _weight_expr(self):
+        return (pl.col("Popularity").cast(pl.Int32).fill_null(0).clip(-100, 100) + 101).alias("w")
+
+    def _group_weight(self, i):
+        """Suma de pesos de un row group filtrado (solo se leen las columnas del filtro y 'Popularity')"""
+        if i not in self._group_weights:
+            cols = list(dict.fromkeys(self._filter_columns() + ["Popularity"]))
+            self._group_weights[i] = self._read_group(i, cols).select(self._weight_expr()).to_series().sum()
+        return self._group_weights[i]
 
     def prepare_puzzle_data(self, row):
         """Devuelve los datos necesarios para iniciar el puzzle con historial"""
@@ -0,0 +1,133 @@
+import math
+import time
+import random
+from collections import deque
+from src.config import logger
+from src.core.puzzle_manager import PuzzleManager
+
+GLICKO_SCALE = 173.7178
+PUZZLE_RD = 75.0         # desviación supuesta de la puntuación de un puzzle (el Parquet no la guarda)
+RD_RANGE = (45.0, 350.0) # el suelo evita que la puntuación se congele tras muchas partidas
+RELEARN_INTERVAL = 10 / 1440 # un fallo vuelve a salir a los 10 minutos
+MIN_EASE = 1.3
+
+def glicko2_update(rating, rd, vol, results, tau=0.5):
+    """
+    Un periodo de Glicko-2 (Glickman, 'Example of the Glicko-2 system').
+    results: lista de (puntuación_rival, rd_rival, resultado) con resultado en [0, 1].
+    Devuelve (puntuación, rd, volatilidad).
+    """
+    mu = (rating - 1500) / GLICKO_SCALE; phi = rd / GLICKO_SCALE
+    if not results: return rating, min(GLICKO_SCALE * math.sqrt(phi ** 2 + vol ** 2), RD_RANGE[1]), vol
+    v_inv = 0.0; delta_sum = 0.0
+    for opp_rating, opp_rd, score in results:
+        g = 1 / math.sqrt(1 + 3 * (opp_rd / GLICKO_SCALE) ** 2 / math.pi ** 2)
+        e = 1 / (1 + math.exp(-g * (mu - (opp_rating - 1500) / GLICKO_SCALE)))
+        v_inv += g ** 2 * e * (1 - e); delta_sum += g * (score - e)
+    v = 1 / v_inv; delta = v * delta_sum
+
+    # Nueva volatilidad: raíz de f por el método de Illinois
+    a = math.log(vol ** 2)
+    def f(x):
+        ex = math.exp(x)
+        return ex * (delta ** 2 - phi ** 2 - v - ex) / (2 * (phi ** 2 + v + ex) ** 2) - (x - a) / tau ** 2
+    A = a
+    if delta ** 2 > phi ** 2 + v: B = math.log(delta ** 2 - phi ** 2 - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0: k += 1
+        B = a - k * tau
+    fA, fB = f(A), f(B)
+    while abs(B - A) > 1e-6:
+        C = A + (A - B) * fA / (fB - fA); fC = f(C)
+        if fC * fB <= 0: A, fA = B, fB
+        else: fA /= 2
+        B, fB = C, fC
+    new_vol = math.exp(A / 2)
+
+    phi_star = math.sqrt(phi ** 2 + new_vol ** 2)
+    new_phi = 1 / math.sqrt(1 / phi_star ** 2 + 1 / v)
+    new_mu = mu + new_phi ** 2 * delta_sum
+    return 1500 + GLICKO_SCALE * new_mu, GLICKO_SCALE * new_phi, new_vol
+
+def next_review(review, score, now):
+    """
+    Siguiente repaso de un puzzle (variante de SM-2, intervalos en días). Un acierto limpio alarga el
+    intervalo y la facilidad; con pistas (score < 1) crece menos; un fallo lo devuelve a 10 minutos.
+    """
+    review = dict(review or {"interval": 0.0, "ease": 2.5, "reps": 0, "lapses": 0})
+    if score < 0.5:
+        review.update(interval=RELEARN_INTERVAL, reps=0, lapses=review["lapses"] + 1, ease=max(MIN_EASE, review["ease"] - 0.2))
+    else:
+        reps = review["reps"] + 1
+        interval = 1.0 if reps == 1 else (3.0 if reps == 2 else review["interval"] * review["ease"])
+        if score < 1: interval *= 0.6
+        review.update(interval=interval, reps=reps, ease=max(MIN_EASE, review["ease"] + (0.1 if score >= 1 else -0.15)))
+    review.update(due=now + review["interval"] * 86400, last=now)
+    return review
+
+def theme_weakness(attempts, fails):
+    """Tasa de fallo suavizada (Laplace): un tema sin jugar pesa 0.5"""
+    return (fails + 1) / (attempts + 2)
+
+class PuzzleScheduler:
+    """
+    Entrenamiento táctico: puntuación Glicko-2 del usuario, repasos espaciados por puzzle y peso por tema.
+
+    pop() sirve primero un repaso vencido (consulta por índice sobre 'due') y si no hay, el siguiente
+    de una cola precalculada de puzzles nuevos guardada en fa-chess.db. La cola se reconstruye en segundo
+    plano con build_queue() (PuzzleQueueWorker): candidatos pendientes alrededor de la puntuación actual,
+    sorteados con más peso en los temas que más se fallan, y se instala con set_queue().
+    """
+    def __init__(self, app_db, queue_size=200, rng=random):
+        self.app_db = app_db; self.queue_size = queue_size; self.rng = rng
+        default = {"rating": float(app_db.get_tactical_elo()), "rd": 200.0, "vol": 0.06} # se parte del Elo táctico anterior
+        self.rating = app_db.get_config("tactical_glicko", default)
+        self.queue = deque(app_db.get_puzzle_queue())
+        self.served = set() # servidos y aún sin resultado: no se repiten
+
+    def pop(self):
+        """Siguiente puzzle de entrenamiento (o None si la cola está vacía)"""
+        puzzle = next((p for p in self.app_db.get_due_reviews(time.time()) if p["id"] not in self.served), None)
+        while puzzle is None and self.queue:
+            p = self.queue.popleft(); self.app_db.remove_from_puzzle_queue(p["id"])
+            if p["id"] not in self.served: puzzle = p
+        if puzzle: self.served.add(puzzle["id"])
+        return puzzle
+
+    def needs_refill(self):
+        return len(self.queue) < self.queue_size // 2
+
+    def record(self, puzzle, score):
+        """Registra el resultado (1 acierto, <1 con pistas, 0 fallo): puntuación, repaso y temas. Devuelve la nueva puntuación."""
+        now = time.time()
+        r, rd, vol = glicko2_update(self.rating["rating"], self.rating["rd"], self.rating["vol"], [(puzzle.get("rating", 1500), PUZZLE_RD, score)])
+        self.rating = {"rating": r, "rd": min(max(rd, RD_RANGE[0]), RD_RANGE[1]), "vol": vol}
+        self.app_db.set_config("tactical_glicko", self.rating); self.app_db.set_tactical_elo(round(r))
+        self.app_db.save_puzzle_review(puzzle, next_review(self.app_db.get_puzzle_review(puzzle["id"]), score, now))
+        self.app_db.update_theme_stats((puzzle.get("themes") or "").split(), failed=score < 0.5)
+        self.served.discard(puzzle["id"])
+        return r
+
+    def build_queue(self, puzzle_path, progress):
+        """
+        Candidatos para la cola (se ejecuta fuera del hilo de la interfaz, con su propio PuzzleManager):
+        puzzles pendientes en puntuación ± rd, sorteados por popularidad y reordenados por debilidad de tema.
+        """
+        manager = PuzzleManager(puzzle_path).set_progress(progress)
+        window = min(max(self.rating["rd"], 100), 300); target = self.rating["rating"]
+        manager.apply_filters(min_rating=target - window, max_rating=target + window, status="pending")
+        weakness = {t: theme_weakness(a, f) for t, (a, f) in self.app_db.get_theme_stats().items()}
+        keyed = {}
+        for p in manager.get_random_puzzles(self.queue_size * 3, weighted=True, rng=self.rng):
+            w = max((weakness.get(t, 0.5) for t in (p["themes"] or "").split()), default=0.5)
+            # Muestreo ponderado sin reemplazo (Efraimidis-Spirakis): clave u^(1/w), se quedan las mayores
+            keyed.setdefault(p["id"], (self.rng.random() ** (1 / w), p))
+        queue = [p for _, p in sorted(keyed.values(), key=lambda kp: kp[0], reverse=True)[:self.queue_size]]
+        logger.info(f"Entrenamiento: cola de {len(queue)} puzzles en {target - window:.0f}-{target + window:.0f}")
+        return queue
+
+    def set_queue(self, puzzles):
+        """Instala una cola nueva (en el hilo de la interfaz), sin los puzzles ya servidos"""
+        puzzles = [p for p in puzzles if p["id"] not in self.served]
+        self.queue = deque(puzzles); self.app_db.set_puzzle_queue(puzzles)
@@ -1,3 +1,4 @@
+import math
 import chess
 
 def uci_to_san(board, uci):
@@ -44,3 +45,35 @@ def get_material_diff(board):
         chess.WHITE: {'score': net_w, 'diffs': diffs[chess.WHITE]},
         chess.BLACK: {'score': net_b, 'diffs': diffs[chess.BLACK]}
     }
+
+def compute_game_stats(evaluations, n_moves):
+    """
+    Precisión, ACPL y errores por bando a partir de las evaluaciones en centipeones
+    (siempre desde el punto de vista del blanco; evaluations[0] es la posición inicial).
+    Devuelve None si faltan evaluaciones.
+    """
+    if len(evaluations) < n_moves + 1: return None
+    stats = {
+        "white": {"inaccuracies": 0, "mistakes": 0, "blunders": 0, "loss_sum": 0, "moves": 0},
+        "black": {"inaccuracies": 0, "mistakes": 0, "blunders": 0, "loss_sum": 0, "moves": 0}
+    }
+    for i in range(n_moves):
+        is_white = (i % 2 == 0)
+        player = "white" if is_white else "black"
+        # Saturar a +/- 1000 para que los errores en posiciones decididas no distorsionen el ACPL
+        eval_pre = max(-1000, min(1000, evaluations[i]))
+        eval_post = max(-1000, min(1000, evaluations[i + 1]))
+        # Blancas quieren subir la evaluación, negras bajarla
+        loss = max(0, eval_pre - eval_post) if is_white else max(0, eval_post - eval_pre)
+        stats[player]["loss_sum"] += loss
+        stats[player]["moves"] += 1
+        # Estándares competitivos: blunder > 2.00, error > 0.90, imprecisión > 0.40
+        if loss >= 200: stats[player]["blunders"] += 1
+        elif loss >= 90: stats[player]["mistakes"] += 1
+        elif loss >= 40: stats[player]["inaccuracies"] += 1
+
+    for s in stats.values():
+        s["acpl"] = s["loss_sum"] / max(1, s["moves"])
+        # 0 ACPL -> 100% | 20 ACPL -> 90% | 50 ACPL -> 77% | 100 ACPL -> 60%
+        s["accuracy"] = 100 * math.exp(-0.005 * s["acpl"])
+    return stats
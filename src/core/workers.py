@@ -5,6 +5,8 @@ import chess.polyglot
 import polars as pl
 from PySide6.QtCore import QThread, Signal, QObject
 from src.converter import extract_game_data, convert_pgn_to_parquet
+from src.core.engine_pool import get_engine_pool
+from src.core.engine_scheduler import get_engine_scheduler, REFUTATION
 
 class PGNWorker(QThread):
     progress = Signal(int)
@@ -66,36 +68,31 @@ class PuzzleGeneratorWorker(QThread):
     status = Signal(str)
     finished = Signal(str)
 
-    def __init__(self, db_path, output_path):
+    def __init__(self, db_path, output_path, workers=None, engine_path=None, depth=14):
         super().__init__()
         self.db_path = db_path
         self.output_path = output_path
+        self.workers = workers
+        self.engine_path = engine_path # con motor, los candidatos pasan por verify_puzzles()
+        self.depth = depth
 
     def run(self):
+        from src.core.puzzle_generator import generate_puzzles
+        def on_progress(stage):
+            def emit(done, total):
+                self.progress.emit(int(done / max(total, 1) * 100)); self.status.emit(f"{stage}: {done}/{total}")
+            return emit
         try:
-            lf = pl.scan_parquet(self.db_path); df = lf.collect()
-            puzzles = []; total = df.height
-            for i, row in enumerate(df.iter_rows(named=True)):
-                if i % 100 == 0: self.progress.emit(int((i / total) * 100))
-                board = chess.Board(); moves = row["full_line"].split()
-                for m_idx, m_uci in enumerate(moves):
-                    try:
-                        move = chess.Move.from_uci(m_uci); is_tactical = False; puz_type = ""
-                        if board.gives_check(move):
-                            board.push(move)
-                            if board.is_checkmate(): is_tactical = True; puz_type = "mate"
-                            board.pop()
-                        if not is_tactical and board.is_capture(move):
-                            captured = board.piece_at(move.to_square)
-                            if captured and captured.piece_type in [chess.QUEEN, chess.ROOK]: is_tactical = True; puz_type = "material"
-                        if is_tactical:
-                            puzzles.append({"PuzzleId": f"gen_{i}_{m_idx}", "FEN": board.fen(), "Moves": " ".join(moves[m_idx:]), "Rating": 1500, "Themes": puz_type, "OpeningTags": ""})
-                            if puz_type == "mate": break
-                        board.push(move)
-                    except: break
-            if puzzles: pl.DataFrame(puzzles).write_parquet(self.output_path); self.finished.emit(self.output_path)
-            else: self.finished.emit("")
-        except: self.finished.emit("")
+            candidates = self.output_path + ".candidates.parquet" if self.engine_path else self.output_path
+            n = generate_puzzles(self.db_path, candidates, workers=self.workers, progress_callback=on_progress("Generando puzzles"))
+            if n and self.engine_path:
+                from src.core.batch import verify_puzzles
+                n = verify_puzzles(candidates, self.output_path, self.engine_path, depth=self.depth, workers=self.workers, progress_callback=on_progress("Verificando con el motor"))
+                os.remove(candidates)
+            self.finished.emit(self.output_path if n else "")
+        except Exception as e:
+            from src.config import logger
+            logger.error(f"PuzzleGenerator: {e}"); self.finished.emit("")
 
 class PuzzleSaveWorker(QThread):
     def __init__(self, app_db, puzzle_id, status):
@@ -104,6 +101,26 @@ class PuzzleSaveWorker(QThread):
         try: self.app_db.save_puzzle_status(self.puzzle_id, self.status)
         except: pass
 
+class PuzzleQueueWorker(QThread):
+    """Reconstruye en segundo plano la cola de entrenamiento del PuzzleScheduler"""
+    finished = Signal(list)
+    def __init__(self, scheduler, puzzle_path, progress):
+        super().__init__(); self.scheduler = scheduler; self.puzzle_path = puzzle_path; self.progress = progress
+    def run(self):
+        try: self.finished.emit(self.scheduler.build_queue(self.puzzle_path, self.progress))
+        except Exception as e:
+            from src.config import logger
+            logger.error(f"PuzzleQueue: {e}"); self.finished.emit([])
+
+class CacheMaintenanceWorker(QThread):
+    finished = Signal(int)
+    def __init__(self, cache_manager, budget_mb=None, parent=None): super().__init__(parent); self.cache_manager = cache_manager; self.budget_mb = budget_mb
+    def run(self):
+        try: self.finished.emit(self.cache_manager.run_maintenance(self.budget_mb))
+        except Exception as e:
+            from src.config import logger
+            logger.error(f"CacheMaintenance: {e}"); self.finished.emit(0)
+
 class StatsWorker(QThread):
     finished = Signal(object, object)
     progress = Signal(int)
@@ -161,58 +178,71 @@ class PGNExportWorker(QThread):
         except: self.finished.emit("")
 
 class CachePopulatorWorker(QThread):
+    """
+    Calienta la caché de aperturas nivel a nivel: en cada profundidad se resuelve toda la
+    frontera del BFS con un único escaneo, en lugar de una búsqueda list.contains por posición.
+    Las estadísticas siguen la semántica de StatsWorker (comparten la tabla opening_cache): cada
+    partida cuenta en una posición por su primera llegada, en cualquier ply (transposiciones incluidas).
+    """
     progress = Signal(int); status = Signal(str); finished = Signal(int)
-    def __init__(self, db_manager, app_db, min_games=50000): super().__init__(); self.db = db_manager; self.app_db = app_db; self.min_games = min_games; self.running = True
+    def __init__(self, db_manager, app_db, min_games=50000, max_depth=30): super().__init__(); self.db = db_manager; self.app_db = app_db; self.min_games = min_games; self.max_depth = max_depth; self.running = True
     def run(self):
         try:
             ref_path = self.db.get_reference_path(); lazy_view = self.db.get_reference_view()
             if not ref_path or lazy_view is None: self.finished.emit(0); return
-            from collections import deque
-            queue = deque([chess.Board()]); processed_hashes = set(); count = 0
-            while queue and self.running:
-                board = queue.popleft()
-                if len(board.move_stack) >= 30: continue
-                pos_hash = chess.polyglot.zobrist_hash(board)
-                if pos_hash in processed_hashes: continue
-                processed_hashes.add(pos_hash)
-                stats, _ = self.app_db.get_opening_stats(ref_path, pos_hash)
-                if stats is None:
-                    stats = self._calculate_stats_sync(lazy_view, pos_hash)
-                    if stats is not None:
-                        self.app_db.save_opening_stats(ref_path, pos_hash, stats, None); count += 1
-                        if count % 10 == 0: self.progress.emit(count)
-                if stats is not None and not stats.is_empty() and "uci" in stats.columns:
-                    for row in stats.rows(named=True):
-                        if row["c"] >= self.min_games:
-                            nb = board.copy()
-                            try: nb.push_uci(row["uci"]); queue.append(nb)
-                            except: pass
-                if count > 5000: break
+            # Listas completas: una posición de la frontera puede alcanzarse por transposición más allá de max_depth
+            base = lazy_view.select([pl.col("fens").alias("_f"), pl.col("full_line").str.split(" ").alias("_m"), "result", "w_elo", "b_elo"])
+            cached = self.app_db.get_cached_positions(ref_path)
+            frontier = {chess.polyglot.zobrist_hash(chess.Board())}; seen = set(frontier); count = 0
+            for depth in range(self.max_depth):
+                if not frontier or not self.running: break
+                self.status.emit(f"Profundidad {depth + 1}: {len(frontier)} posiciones")
+                level = self._calculate_level_stats(base, frontier)
+                new_entries = []; next_frontier = set()
+                for (pos_hash,), stats in level.partition_by("pos_hash", as_dict=True).items():
+                    if pos_hash not in cached: new_entries.append((pos_hash, stats.drop(["pos_hash", "child"]).sort("c", descending=True), None))
+                    for child, c in stats.select(["child", "c"]).iter_rows():
+                        if c >= self.min_games and child is not None and child not in seen: seen.add(child); next_frontier.add(child)
+                if new_entries: self.app_db.save_opening_stats_many(ref_path, new_entries); count += len(new_entries)
+                frontier = next_frontier
+                self.progress.emit(int((depth + 1) / self.max_depth * 100))
             self.finished.emit(count)
         except: self.finished.emit(0)
-    def _calculate_stats_sync(self, lazy_view, pos_hash):
-        target = int(pos_hash)
-        q = (lazy_view.filter(pl.col("fens").list.contains(pl.lit(target, dtype=pl.UInt64))).with_columns([pl.col("full_line").str.split(" ").alias("_m"), pl.col("fens").list.eval(pl.element() == target).list.arg_max().alias("_i")]).filter(pl.col("_i") < pl.col("_m").list.len()).with_columns(pl.col("_m").list.get(pl.col("_i")).alias("uci")).filter((pl.col("uci").str.len_chars() >= 4) & (pl.col("uci").str.len_chars() <= 5)).group_by("uci").agg([pl.len().alias("c"), (pl.col("result") == "1-0").sum().alias("w"), (pl.col("result") == "1/2-1/2").sum().alias("d"), (pl.col("result") == "0-1").sum().alias("b"), pl.col("w_elo").mean().fill_null(0).alias("avg_w_elo"), pl.col("b_elo").mean().fill_null(0).alias("avg_b_elo")]))
-        try: return q.collect(streaming=True)
-        except: return None
+    def _calculate_level_stats(self, base, frontier):
+        """
+        Estadísticas (pos_hash, uci) de toda la frontera de una profundidad en un solo escaneo: por partida,
+        los plies donde aparece una posición de la frontera, quedándose con la primera aparición de cada una
+        (arg_unique sobre los hashes encontrados), como el arg_max de StatsWorker._build_stats_query
+        """
+        targets = pl.Series(list(frontier), dtype=pl.UInt64).implode()
+        q = (base.with_columns(pl.col("_f").list.eval(pl.element().is_in(targets).arg_true()).alias("_i"))
+             .with_columns(pl.col("_i").list.gather(pl.col("_f").list.gather(pl.col("_i")).list.eval(pl.element().arg_unique())))
+             .explode("_i").filter(pl.col("_i").is_not_null())
+             .select([pl.col("_f").list.get(pl.col("_i")).alias("pos_hash"), pl.col("_m").list.get(pl.col("_i"), null_on_oob=True).alias("uci"), pl.col("_f").list.get(pl.col("_i") + 1, null_on_oob=True).alias("child"), "result", "w_elo", "b_elo"])
+             .filter((pl.col("uci").str.len_chars() >= 4) & (pl.col("uci").str.len_chars() <= 5))
+             .group_by(["pos_hash", "uci"]).agg([pl.len().alias("c"), (pl.col("result") == "1-0").sum().alias("w"), (pl.col("result") == "1/2-1/2").sum().alias("d"), (pl.col("result") == "0-1").sum().alias("b"), pl.col("w_elo").mean().fill_null(0).alias("avg_w_elo"), pl.col("b_elo").mean().fill_null(0).alias("avg_b_elo"), pl.col("child").first()]))
+        return q.collect(engine="streaming")
     def stop(self): self.running = False
 
 class RefutationWorker(QThread):
     finished = Signal(str, str)
-    def __init__(self, engine_path, fen):
-        super().__init__(); self.engine_path = engine_path; self.fen = fen; self.running = True
+    def __init__(self, engine_path, fen, pool=None, app_db=None, scheduler=None):
+        super().__init__(); self.engine_path = engine_path; self.fen = fen; self.pool = pool or get_engine_pool(); self.app_db = app_db; self.scheduler = scheduler or get_engine_scheduler(); self.running = True
     def run(self):
         try:
             import chess.engine
-            engine = chess.engine.SimpleEngine.popen_uci(self.engine_path)
             board = chess.Board(self.fen)
-            info = engine.analyse(board, chess.engine.Limit(time=0.2, depth=14))
+            info = self.app_db.get_engine_eval(board, 14) if self.app_db else None
+            if not info or not info["pv"]:
+                with self.scheduler.job(REFUTATION, 1, "refutación", abort=lambda: not self.running) as ticket:
+                    if not ticket: return
+                    with self.pool.lease(self.engine_path) as engine: info = engine.analyse(board, chess.engine.Limit(time=0.2, depth=14))
+                if self.app_db: self.app_db.save_engine_eval(board, info)
             best_move = info.get("pv")[0] if info.get("pv") else None
             if best_move:
-                score = info.get("score").relative.score(mate_score=10000) / 100.0
+                score = info.get("score").pov(board.turn).score(mate_score=10000) / 100.0
                 msg = f"El rival responde {board.san(best_move)}."
                 if score > 2: msg += " Pierdes material."
                 self.finished.emit(best_move.uci(), msg)
-            engine.quit()
         except: self.finished.emit("", "Incorrecto")
     def stop(self): self.running = False
@@ -0,0 +1,10 @@
+from yoyo import step
+
+__depends__ = {'0003_add_eval_to_opening_cache'}
+
+steps = [
+    step(
+        "ALTER TABLE opening_cache ADD COLUMN db_fingerprint TEXT",
+        "ALTER TABLE opening_cache DROP COLUMN db_fingerprint"
+    )
+]
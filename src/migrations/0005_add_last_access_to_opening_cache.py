@@ -0,0 +1,14 @@
+from yoyo import step
+
+__depends__ = {'0004_add_fingerprint_to_opening_cache'}
+
+steps = [
+    step(
+        "ALTER TABLE opening_cache ADD COLUMN last_access REAL",
+        "ALTER TABLE opening_cache DROP COLUMN last_access"
+    ),
+    step(
+        "CREATE INDEX IF NOT EXISTS idx_opening_cache_last_access ON opening_cache (last_access)",
+        "DROP INDEX IF EXISTS idx_opening_cache_last_access"
+    )
+]
@@ -0,0 +1,19 @@
+from yoyo import step
+
+__depends__ = {'0005_add_last_access_to_opening_cache'}
+
+steps = [
+    step(
+        """CREATE TABLE IF NOT EXISTS engine_evals (
+            pos_hash TEXT PRIMARY KEY,
+            epd TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            score_cp INTEGER,
+            mate INTEGER,
+            pv TEXT,
+            nodes INTEGER,
+            updated REAL
+        )""",
+        "DROP TABLE engine_evals"
+    )
+]
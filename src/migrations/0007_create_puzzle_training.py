@@ -0,0 +1,31 @@
+from yoyo import step
+
+__depends__ = {'0006_create_engine_evals'}
+
+steps = [
+    step(
+        """CREATE TABLE IF NOT EXISTS puzzle_reviews (
+            puzzle_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            due REAL NOT NULL,
+            interval REAL NOT NULL,
+            ease REAL NOT NULL,
+            reps INTEGER NOT NULL,
+            lapses INTEGER NOT NULL,
+            last REAL
+        )""",
+        "DROP TABLE puzzle_reviews"
+    ),
+    step(
+        "CREATE INDEX IF NOT EXISTS idx_puzzle_reviews_due ON puzzle_reviews (due)",
+        "DROP INDEX IF EXISTS idx_puzzle_reviews_due"
+    ),
+    step(
+        "CREATE TABLE IF NOT EXISTS puzzle_theme_stats (theme TEXT PRIMARY KEY, attempts INTEGER NOT NULL, fails INTEGER NOT NULL)",
+        "DROP TABLE puzzle_theme_stats"
+    ),
+    step(
+        "CREATE TABLE IF NOT EXISTS puzzle_queue (pos INTEGER PRIMARY KEY, puzzle_id TEXT NOT NULL, data TEXT NOT NULL)",
+        "DROP TABLE puzzle_queue"
+    )
+]
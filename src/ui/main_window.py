@@ -18,10 +18,12 @@ from PySide6.QtGui import QAction, QFont, QShortcut, QKeySequence, QPainter, QCo
 import qtawesome as qta
 
 from src.config import CONFIG_FILE, LIGHT_STYLE, ECO_FILE, APP_DB_FILE, logger
-from src.core.workers import PGNWorker, StatsWorker, PGNExportWorker, PGNAppendWorker, PuzzleGeneratorWorker
+from src.core.workers import PGNWorker, StatsWorker, PGNExportWorker, PGNAppendWorker, PuzzleGeneratorWorker, CacheMaintenanceWorker, CachePopulatorWorker
 from src.core.eco import ECOManager
 from src.core.db_manager import DBManager
 from src.core.app_db import AppDBManager
+from src.core.cache_manager import CacheManager
+from src.core.polyglot_book import PolyglotBook
 from src.core.game_controller import GameController
 from src.ui.board import ChessBoard
 from src.ui.settings_dialog import SettingsDialog
@@ -40,6 +42,9 @@ from src.ui.styles import (STYLE_EVAL_BAR, STYLE_LABEL_EVAL, STYLE_TABLE_HEADER,
                        STYLE_PROGRESS_BAR, STYLE_BADGE_NORMAL, STYLE_BADGE_SUCCESS, 
                        STYLE_BADGE_ERROR, STYLE_GAME_HEADER, STYLE_ACTION_BUTTON)
 from src.core.engine_worker import EngineWorker, FullAnalysisWorker
+from src.core.engine_pool import get_engine_pool
+from src.core.engine_manager import get_engine_manager
+from src.core.engine_scheduler import get_engine_scheduler
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -60,6 +65,8 @@ class MainWindow(QMainWindow):
         self.db_loaded_count = 0
         self.current_db_df = None
         self.last_pos_count = 1000000 
+        self.books = {} # ruta -> PolyglotBook abiertos como fuente del árbol
+        self.active_book = None
         
         self.game.position_changed.connect(self.update_ui)
         self.db.active_db_changed.connect(self.refresh_db_list)
@@ -73,6 +80,9 @@ class MainWindow(QMainWindow):
         self.stats_timer.timeout.connect(self.run_stats_worker)
         
         self.load_config() 
+        self.cache_manager = CacheManager(self.app_db, budget_mb=self.cache_budget_mb)
+        self.maintenance_timer = QTimer(); self.maintenance_timer.timeout.connect(self.run_cache_maintenance); self.maintenance_timer.start(30 * 60 * 1000)
+        QTimer.singleShot(10000, self.run_cache_maintenance)
         self.init_ui()
         self.init_menu()
         self.init_shortcuts()
@@ -81,6 +91,8 @@ class MainWindow(QMainWindow):
         for path in self.pending_dbs:
             if path and os.path.exists(path):
                 self.load_parquet(path)
+        for path in self.pending_books:
+            if path and os.path.exists(path): self.load_book(path, save=False)
         
         # Restaurar Base Activa persistida
         if hasattr(self, 'pending_active_db') and self.pending_active_db:
@@ -179,29 +191,43 @@ class MainWindow(QMainWindow):
         self.progress = QProgressBar(); self.progress.setMaximumWidth(150); self.progress.setFixedHeight(14); self.progress.setTextVisible(True); self.progress.setVisible(False)
         self.btn_stop_op = QPushButton(qta.icon('fa5s.times-circle', color='#c62828'), ""); self.btn_stop_op.setFixedWidth(24); self.btn_stop_op.setFixedHeight(24); self.btn_stop_op.setFlat(True); self.btn_stop_op.setVisible(False); self.btn_stop_op.clicked.connect(self.stop_current_operation)
         self.statusBar().addPermanentWidget(self.progress); self.statusBar().addPermanentWidget(self.btn_stop_op)
+        self.label_engine_queue = QLabel(""); self.label_engine_queue.setStyleSheet("color: #666; padding: 0 6px;"); self.statusBar().addPermanentWidget(self.label_engine_queue)
+        self.apply_engine_budget(); get_engine_scheduler().queue_changed.connect(self.on_engine_queue_changed)
         self.search_criteria = {"white": "", "black": "", "min_elo": "", "result": "Cualquiera"}
 
+    def apply_engine_budget(self):
+        # El pool conserva tantos motores libres como hilos reparte el planificador
+        scheduler = get_engine_scheduler(); scheduler.set_budget(self.engine_budget); get_engine_pool().set_max_idle(scheduler.budget)
+
     def start_full_analysis(self):
         if self.action_engine.isChecked(): self.action_engine.toggle(); self.toggle_engine(False)
         self.board_ana.setEnabled(False); self.opening_tree.setEnabled(False)
         self.progress.setRange(0, 100); self.progress.setValue(0); self.progress.show()
         total_moves = len(self.game.full_mainline) + 1; self.game_evals = [0] * total_moves; self.eval_graph.set_evaluations(self.game_evals)
-        self.analysis_worker = FullAnalysisWorker(self.game.full_mainline, depth=self.engine_depth, engine_path=self.engine_path)
+        self.analysis_worker = FullAnalysisWorker(self.game.full_mainline, depth=self.engine_depth, engine_path=self.engine_path, engines=self.analysis_engines, app_db=self.app_db, time_budget=self.analysis_budget)
         self.analysis_worker.progress.connect(lambda curr, total: self.progress.setValue(int((curr/total)*100)))
-        self.analysis_worker.analysis_result.connect(self.on_analysis_update); self.analysis_worker.finished.connect(self.on_analysis_finished); self.analysis_worker.start()
+        self.analysis_worker.analysis_result.connect(self.on_analysis_update); self.analysis_worker.pass_finished.connect(self.on_analysis_pass); self.analysis_worker.finished.connect(self.on_analysis_finished); self.analysis_worker.start()
 
     def on_analysis_update(self, idx, cp_score):
-        if 0 <= idx < len(self.game_evals): self.game_evals[idx] = cp_score; self.eval_graph.set_evaluations(self.game_evals)
+        if 0 <= idx < len(self.game_evals):
+            self.game_evals[idx] = cp_score
+            # Con presupuesto de tiempo la gráfica se redibuja al final de cada pasada
+            if not self.analysis_budget: self.eval_graph.set_evaluations(self.game_evals)
+
+    def on_analysis_pass(self, pass_no, evals):
+        if len(evals) == len(self.game_evals): self.game_evals = list(evals); self.eval_graph.set_evaluations(self.game_evals)
+        self.statusBar().showMessage(f"Análisis: pasada {pass_no} completada", 3000)
 
     def on_analysis_finished(self):
         self.progress.hide(); self.board_ana.setEnabled(True); self.opening_tree.setEnabled(True)
+        self.eval_graph.set_evaluations(self.game_evals)
         w_name = getattr(self, 'current_white', "Blancas"); b_name = getattr(self, 'current_black', "Negras")
         self.analysis_report.update_stats(self.game_evals, [m.uci() for m in self.game.full_mainline], w_name, b_name)
 
     def toggle_engine(self, checked):
         self.eval_bar.setVisible(checked)
         if checked:
-            self.engine_worker = EngineWorker(engine_path=self.engine_path, threads=self.engine_threads, hash_mb=self.engine_hash, depth_limit=self.engine_depth)
+            self.engine_worker = EngineWorker(engine_path=self.engine_path, threads=self.engine_threads, hash_mb=self.engine_hash, depth_limit=self.engine_depth, app_db=self.app_db, fps=self.engine_fps)
             self.engine_worker.info_updated.connect(self.on_engine_update); self.engine_worker.update_position(self.game.board.fen()); self.engine_worker.start()
         else:
             if hasattr(self, 'engine_worker'): self.engine_worker.stop(); self.engine_worker.wait()
@@ -218,8 +244,13 @@ class MainWindow(QMainWindow):
             if 0 <= self.game.current_idx < len(self.game_evals): self.game_evals[self.game.current_idx] = cp_val; self.eval_graph.set_evaluations(self.game_evals)
         except: pass
 
+    def on_engine_queue_changed(self, running, waiting, threads):
+        budget = get_engine_scheduler().budget
+        self.label_engine_queue.setText(f"Motores: {running} activos · {waiting} en cola · {threads}/{budget} hilos" if running or waiting else "")
+
     def closeEvent(self, event):
-        if hasattr(self, 'engine_worker'): self.engine_worker.stop()
+        if hasattr(self, 'engine_worker'): self.engine_worker.stop(); self.engine_worker.wait()
+        get_engine_manager().shutdown() # cierra también el pool de motores compartido
         super().closeEvent(event)
 
     def create_scid_table(self, headers):
@@ -265,6 +296,12 @@ class MainWindow(QMainWindow):
         if not hasattr(self, '_stats_thread_pool'): self._stats_thread_pool = []
         self._stats_thread_pool = [w for w in self._stats_thread_pool if w.isRunning()]
         
+        # Libro Polyglot: búsqueda binaria en memoria, sin worker
+        if self.active_book is not None:
+            opening_name, _ = self.eco.get_opening_name(self.game.current_line_uci)
+            next_move = self.game.full_mainline[self.game.current_idx].uci() if self.game.current_idx < len(self.game.full_mainline) else None
+            self.opening_tree.update_book(self.active_book.get_stats(self.game.board), self.game.board, opening_name, next_move_uci=next_move); return
+
         current_hash = chess.polyglot.zobrist_hash(self.game.board)
         
         # --- ALGORITMO DE PARADA INTELIGENTE POR VOLUMEN ---
@@ -302,6 +339,7 @@ class MainWindow(QMainWindow):
     def update_stats(self): self.stats_timer.start(50)
 
     def on_stats_finished(self, res, engine_eval):
+        if self.active_book is not None: self.progress.hide(); return
         self.progress.hide(); opening_name, _ = self.eco.get_opening_name(self.game.current_line_uci)
         next_move = self.game.full_mainline[self.game.current_idx].uci() if self.game.current_idx < len(self.game.full_mainline) else None
         
@@ -332,7 +370,7 @@ class MainWindow(QMainWindow):
             except: pass
             
         from src.core.engine_worker import TreeScannerWorker
-        self.tree_scanner = TreeScannerWorker(self.engine_path, self.game.board.fen(), moves_uci, depth=self.tree_depth)
+        self.tree_scanner = TreeScannerWorker(self.engine_path, self.game.board.fen(), moves_uci, depth=self.tree_depth, app_db=self.app_db)
         self.tree_scanner.eval_ready.connect(self.on_tree_scan_result)
         self.tree_scanner.start()
 
@@ -350,15 +388,19 @@ class MainWindow(QMainWindow):
     def change_reference_db(self, display_name):
         idx = self.opening_tree.combo_ref.currentIndex()
         real_name = self.opening_tree.combo_ref.itemData(idx) or display_name
+        self.active_book = self.books.get(real_name)
+        if self.active_book is not None: self.update_stats(); return
         if self.db.set_reference_db(real_name): self.last_pos_count = 1000000; self.update_stats()
 
     def refresh_reference_combo(self):
         if not hasattr(self, 'opening_tree'): return
         self.opening_tree.combo_ref.blockSignals(True); current = self.opening_tree.combo_ref.currentText(); self.opening_tree.combo_ref.clear(); self.opening_tree.combo_ref.addItem("Base Activa")
         for name in sorted(self.db.dbs.keys()): self.opening_tree.combo_ref.addItem(name.replace(".parquet", ""), name)
+        for path, book in self.books.items(): self.opening_tree.combo_ref.addItem(qta.icon('fa5s.book', color='#795548'), book.name, path)
         idx = self.opening_tree.combo_ref.findText(current)
         if idx >= 0: self.opening_tree.combo_ref.setCurrentIndex(idx)
         else: self.opening_tree.combo_ref.setCurrentIndex(0)
+        self.active_book = self.books.get(self.opening_tree.combo_ref.currentData())
         self.opening_tree.combo_ref.blockSignals(False)
 
     def _create_action(self, text, icon_name, shortcut="", slot=None, tip="", color=None, is_checkable=False):
@@ -374,6 +416,7 @@ class MainWindow(QMainWindow):
         file_menu = menubar.addMenu("&Archivo")
         file_menu.addAction(self._create_action("Nueva Base...", 'fa5s.plus-circle', "Ctrl+N", self.create_new_db))
         file_menu.addAction(self._create_action("Abrir Base...", 'fa5s.folder-open', "Ctrl+O", self.open_parquet_file))
+        file_menu.addAction(self._create_action("Abrir Libro Polyglot...", 'fa5s.book', slot=self.open_book_file))
         self.save_action = self._create_action("Guardar Base Activa", 'fa5s.save', "Ctrl+S", self.save_to_active_db)
         file_menu.addAction(self.save_action); file_menu.addSeparator(); file_menu.addAction(self._create_action("Configuración...", 'fa5s.cog', slot=self.open_settings))
         
@@ -395,6 +438,21 @@ class MainWindow(QMainWindow):
         path, _ = QFileDialog.getSaveFileName(self, "Crear Nueva Base", "", "Chess Parquet (*.parquet)")
         if path: self.db.create_new_database(path); self.load_parquet(path)
 
+    def open_book_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Abrir Libro Polyglot", "", "Polyglot Book (*.bin)")
+        if path: self.load_book(path)
+
+    def load_book(self, path, save=True):
+        try: book = PolyglotBook(path)
+        except Exception as e: logger.error(f"No se pudo abrir el libro {path}: {e}"); return None
+        if path in self.books: self.books[path].close()
+        self.books[path] = book; self.refresh_reference_combo()
+        idx = self.opening_tree.combo_ref.findData(path)
+        if idx >= 0: self.opening_tree.combo_ref.setCurrentIndex(idx)
+        self.active_book = book; self.update_stats()
+        if save: self.save_config()
+        return book
+
     def open_parquet_file(self):
         path, _ = QFileDialog.getOpenFileName(self, "Abrir Parquet", "", "Chess Parquet (*.parquet)")
         if path: self.load_parquet(path)
@@ -407,7 +465,9 @@ class MainWindow(QMainWindow):
         return name
 
     def save_to_active_db(self):
-        if self.db.save_active_db(): self.statusBar().showMessage("Base guardada en disco", 3000)
+        if self.db.save_active_db():
+            self.app_db.purge_stale_opening_stats(self.db.db_metadata[self.db.active_db_name]["path"])
+            self.statusBar().showMessage("Base guardada en disco", 3000)
 
     def add_current_game_to_db(self):
         if not self.db.active_db_name: return
@@ -416,13 +476,18 @@ class MainWindow(QMainWindow):
         data = {"id": int(time.time()*1000), "white": "Jugador", "black": "Oponente", "w_elo": 0, "b_elo": 0, "result": "*", "date": datetime.now().strftime("%Y.%m.%d"), "event": "Local", "site": "", "line": " ".join([m.uci() for m in self.game.full_mainline[:12]]), "full_line": self.game.current_line_uci, "fens": fens}
         if self.db.add_game(self.db.active_db_name, data): self.refresh_db_list()
 
+    def run_cache_maintenance(self):
+        if getattr(self, 'maintenance_worker', None) and self.maintenance_worker.isRunning(): return
+        self.maintenance_worker = CacheMaintenanceWorker(self.cache_manager); self.maintenance_worker.start()
+
     def open_settings(self):
-        cfg = {"color_light": self.board_ana.color_light, "color_dark": self.board_ana.color_dark, "perf_threshold": self.perf_threshold, "engine_path": self.engine_path, "engine_threads": self.engine_threads, "engine_hash": self.engine_hash, "engine_depth": self.engine_depth, "tree_depth": self.tree_depth, "min_games": self.min_games, "venom_eval": self.venom_eval, "venom_win": self.venom_win, "practical_win": self.practical_win}
-        dialog = SettingsDialog(cfg, self)
+        cfg = {"color_light": self.board_ana.color_light, "color_dark": self.board_ana.color_dark, "perf_threshold": self.perf_threshold, "engine_path": self.engine_path, "engine_threads": self.engine_threads, "engine_hash": self.engine_hash, "engine_depth": self.engine_depth, "tree_depth": self.tree_depth, "min_games": self.min_games, "venom_eval": self.venom_eval, "venom_win": self.venom_win, "practical_win": self.practical_win, "cache_budget_mb": self.cache_budget_mb, "analysis_engines": self.analysis_engines, "engine_fps": self.engine_fps, "engine_budget": self.engine_budget, "analysis_budget": self.analysis_budget}
+        dialog = SettingsDialog(cfg, self, cache_manager=self.cache_manager)
         if dialog.exec_():
             n = dialog.get_config(); self.board_ana.color_light = n["color_light"]; self.board_ana.color_dark = n["color_dark"]; self.board_ana.update_board()
             self.perf_threshold = n["perf_threshold"]; self.engine_path = n["engine_path"]; self.engine_threads = n["engine_threads"]; self.engine_hash = n["engine_hash"]; self.engine_depth = n["engine_depth"]; self.tree_depth = n["tree_depth"]
             self.venom_eval = n["venom_eval"]; self.venom_win = n["venom_win"]; self.practical_win = n["practical_win"]
+            self.cache_budget_mb = n["cache_budget_mb"]; self.cache_manager.budget_mb = self.cache_budget_mb; self.analysis_engines = n["analysis_engines"]; self.engine_fps = n["engine_fps"]; self.engine_budget = n["engine_budget"]; self.analysis_budget = n["analysis_budget"]; self.apply_engine_budget()
             self.opening_tree.perf_threshold = self.perf_threshold; self.opening_tree.venom_eval = self.venom_eval; self.opening_tree.venom_win = self.venom_win; self.opening_tree.practical_win = self.practical_win
             self.save_config()
             if self.action_engine.isChecked(): self.toggle_engine(False); self.toggle_engine(True)
@@ -435,15 +500,20 @@ class MainWindow(QMainWindow):
         self.engine_path = self.app_db.get_config("engine_path", "/usr/bin/stockfish")
         self.engine_threads = self.app_db.get_config("engine_threads", 1); self.engine_hash = self.app_db.get_config("engine_hash", 64); self.engine_depth = self.app_db.get_config("engine_depth", 10); self.tree_depth = self.app_db.get_config("tree_depth", 12); self.min_games = self.app_db.get_config("min_games", 20)
         self.venom_eval = self.app_db.get_config("venom_eval", 0.5); self.venom_win = self.app_db.get_config("venom_win", 52); self.practical_win = self.app_db.get_config("practical_win", 60)
+        self.cache_budget_mb = self.app_db.get_config("cache_budget_mb", 512)
+        self.analysis_engines = self.app_db.get_config("analysis_engines", 0); self.engine_fps = self.app_db.get_config("engine_fps", 10); self.engine_budget = self.app_db.get_config("engine_budget", 0); self.analysis_budget = self.app_db.get_config("analysis_budget", 0)
         self.pending_dbs = self.app_db.get_config("open_dbs", [])
+        self.pending_books = self.app_db.get_config("open_books", [])
         self.pending_active_db = self.app_db.get_config("active_db", None)
 
     def save_config(self):
         dbs = [m["path"] for m in self.db.db_metadata.values() if m.get("path")]
         self.app_db.set_config("open_dbs", dbs)
         self.app_db.set_config("active_db", self.db.active_db_name)
+        self.app_db.set_config("open_books", list(self.books.keys()))
         self.app_db.set_config("colors", {"light": self.board_ana.color_light, "dark": self.board_ana.color_dark})
         self.app_db.set_config("engine_path", self.engine_path); self.app_db.set_config("engine_threads", self.engine_threads); self.app_db.set_config("engine_hash", self.engine_hash); self.app_db.set_config("engine_depth", self.engine_depth); self.app_db.set_config("tree_depth", self.tree_depth); self.app_db.set_config("min_games", self.min_games); self.app_db.set_config("venom_eval", self.venom_eval); self.app_db.set_config("venom_win", self.venom_win); self.app_db.set_config("practical_win", self.practical_win); self.app_db.set_config("perf_threshold", self.perf_threshold)
+        self.app_db.set_config("cache_budget_mb", self.cache_budget_mb); self.app_db.set_config("analysis_engines", self.analysis_engines); self.app_db.set_config("engine_fps", self.engine_fps); self.app_db.set_config("engine_budget", self.engine_budget); self.app_db.set_config("analysis_budget", self.analysis_budget)
 
     def refresh_db_list(self):
         if not self.db.active_db_name: return
@@ -500,7 +570,7 @@ class MainWindow(QMainWindow):
         if not self.db.db_metadata[n]["read_only"]: m.addAction("Persistir Base", self.save_to_active_db)
         m.addAction("Quitar de la lista", lambda: self.remove_database(it)).exec(self.db_sidebar.list_widget.mapToGlobal(pos))
     def remove_database(self, it):
-        n = it.data(Qt.UserRole + 1); del self.db.dbs[n]; del self.db.db_metadata[n]; self.db_sidebar.list_widget.takeItem(self.db_sidebar.list_widget.row(it)); self.save_config()
+        n = it.data(Qt.UserRole + 1); del self.db.dbs[n]; del self.db.db_metadata[n]; self.db.discard_edits(n); self.db_sidebar.list_widget.takeItem(self.db_sidebar.list_widget.row(it)); self.save_config()
     def on_db_table_context_menu(self, pos): pass
     def _fix_tab_buttons(self):
         for i in [0, 1, 2]:
@@ -540,7 +610,7 @@ class MainWindow(QMainWindow):
     def warm_up_opening_cache(self):
         n = self.opening_tree.combo_ref.currentText(); t = self.db.get_active_count(); d = max(10, int(t * 0.005))
         if QMessageBox.question(self, "Calentar", f"¿Calentar {n} con umbral {d}?") == QMessageBox.Yes:
-            self.progress.show(); self.btn_stop_op.show(); self.warm_worker = CachePopulatorWorker(self.db, self.app_db, min_games=d); self.warm_worker.finished.connect(self.on_warm_up_finished); self.warm_worker.start()
+            self.progress.setRange(0, 100); self.progress.setValue(0); self.progress.show(); self.btn_stop_op.show(); self.warm_worker = CachePopulatorWorker(self.db, self.app_db, min_games=d); self.warm_worker.progress.connect(self.progress.setValue); self.warm_worker.status.connect(lambda m: self.statusBar().showMessage(m)); self.warm_worker.finished.connect(self.on_warm_up_finished); self.warm_worker.start()
     def on_warm_up_finished(self, c): self.progress.hide(); self.btn_stop_op.hide(); QMessageBox.information(self, "Fin", f"Cacheadas {c} posiciones.")
     def stop_current_operation(self):
         if hasattr(self, 'warm_worker'): self.warm_worker.stop()
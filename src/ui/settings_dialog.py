@@ -4,15 +4,17 @@ from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
 from PySide6.QtGui import QColor, QIcon
 from PySide6.QtCore import Qt
 import qtawesome as qta
+from src.core.workers import CacheMaintenanceWorker
 import os
 
 class SettingsDialog(QDialog):
-    def __init__(self, current_config, parent=None):
+    def __init__(self, current_config, parent=None, cache_manager=None):
         super().__init__(parent)
         self.setWindowTitle("Configuración de fa-chess")
         self.resize(480, 400)
         
         self.config = current_config
+        self.cache_manager = cache_manager
         
         layout = QVBoxLayout(self)
         self.tabs = QTabWidget()
@@ -81,6 +83,39 @@ class SettingsDialog(QDialog):
         self.spin_tree_depth.setToolTip("Profundidad fija para rellenar las filas del árbol. Mantén este valor bajo para velocidad.")
         eng_layout.addRow("Profundidad del Árbol:", self.spin_tree_depth)
         
+        self.spin_analysis_engines = QSpinBox()
+        self.spin_analysis_engines.setRange(0, os.cpu_count() or 1)
+        self.spin_analysis_engines.setValue(self.config.get("analysis_engines", 0))
+        self.spin_analysis_engines.setSpecialValueText("Auto")
+        self.spin_analysis_engines.setToolTip("Procesos de motor en paralelo para el análisis completo de partida. Auto = uno por núcleo.")
+        eng_layout.addRow("Motores en Análisis:", self.spin_analysis_engines)
+        
+        self.spin_analysis_budget = QSpinBox()
+        self.spin_analysis_budget.setRange(0, 3600)
+        self.spin_analysis_budget.setSingleStep(15)
+        self.spin_analysis_budget.setValue(self.config.get("analysis_budget", 0))
+        self.spin_analysis_budget.setSuffix(" s")
+        self.spin_analysis_budget.setSpecialValueText("Desactivado")
+        self.spin_analysis_budget.setToolTip("Tiempo total por partida para el análisis completo.\n"
+                                             "Primero se recorren todas las jugadas a poca profundidad y el resto del tiempo\n"
+                                             "se dedica a profundizar donde la evaluación oscila más. Desactivado = profundidad fija.")
+        eng_layout.addRow("Presupuesto por Partida:", self.spin_analysis_budget)
+        
+        self.spin_engine_budget = QSpinBox()
+        self.spin_engine_budget.setRange(0, 4 * (os.cpu_count() or 1))
+        self.spin_engine_budget.setValue(self.config.get("engine_budget", 0))
+        self.spin_engine_budget.setSpecialValueText("Auto")
+        self.spin_engine_budget.setToolTip("Hilos de CPU que pueden usar a la vez todos los motores (en vivo, refutación, árbol y análisis).\n"
+                                           "Los trabajos menos urgentes esperan en cola. Auto = uno por núcleo.")
+        eng_layout.addRow("Presupuesto de Hilos:", self.spin_engine_budget)
+        
+        self.spin_engine_fps = QSpinBox()
+        self.spin_engine_fps.setRange(1, 60)
+        self.spin_engine_fps.setValue(self.config.get("engine_fps", 10))
+        self.spin_engine_fps.setSuffix(" Hz")
+        self.spin_engine_fps.setToolTip("Refrescos por segundo del análisis en vivo. Entre fotogramas solo se guarda la última línea del motor.")
+        eng_layout.addRow("Refresco del Motor:", self.spin_engine_fps)
+        
         self.tabs.addTab(tab_engine, qta.icon("fa5s.microchip"), "Motor")
 
         # --- PESTAÑA VENENO 🧪 ---
@@ -116,6 +151,34 @@ class SettingsDialog(QDialog):
         
         self.tabs.addTab(tab_venom, qta.icon("fa5s.vial"), "Veneno")
         
+        # --- PESTAÑA CACHÉ ---
+        tab_cache = QWidget()
+        cache_layout = QFormLayout(tab_cache)
+        
+        self.spin_cache_budget = QSpinBox()
+        self.spin_cache_budget.setRange(16, 1048576)
+        self.spin_cache_budget.setSingleStep(64)
+        self.spin_cache_budget.setValue(self.config.get("cache_budget_mb", 512))
+        self.spin_cache_budget.setSuffix(" MB")
+        self.spin_cache_budget.setToolTip("Tamaño máximo de la caché de aperturas en fa-chess.db.\n"
+                                          "Al superarlo se expulsan las posiciones usadas hace más tiempo.")
+        cache_layout.addRow("Presupuesto en disco:", self.spin_cache_budget)
+        
+        self.label_cache_size = QLabel("-")
+        cache_layout.addRow("Tamaño fa-chess.db:", self.label_cache_size)
+        self.label_cache_entries = QLabel("-")
+        cache_layout.addRow("Posiciones cacheadas:", self.label_cache_entries)
+        self.label_cache_hits = QLabel("-")
+        cache_layout.addRow("Aciertos (sesión):", self.label_cache_hits)
+        
+        self.btn_maintenance = QPushButton(qta.icon("fa5s.broom"), " Limpiar y compactar ahora")
+        self.btn_maintenance.clicked.connect(self.run_cache_maintenance)
+        self.btn_maintenance.setEnabled(self.cache_manager is not None)
+        cache_layout.addRow("", self.btn_maintenance)
+        
+        self.tabs.addTab(tab_cache, qta.icon("fa5s.database"), "Caché")
+        self.refresh_cache_stats()
+        
         layout.addWidget(self.tabs)
         
         # Botones de Acción
@@ -150,6 +213,26 @@ class SettingsDialog(QDialog):
         if path:
             self.edit_engine_path.setText(path)
 
+    def refresh_cache_stats(self):
+        if not self.cache_manager: return
+        try: st = self.cache_manager.get_stats()
+        except Exception: return
+        mb = lambda b: f"{b / (1024 * 1024):.1f} MB"
+        self.label_cache_size.setText(f"{mb(st['file_bytes'])} ({mb(st['free_bytes'])} libres)")
+        self.label_cache_entries.setText(f"{st['entries']:,} en {st['databases']} bases".replace(",", "."))
+        self.label_cache_hits.setText(f"{st['hit_rate'] * 100:.1f}% ({st['hits']} / {st['hits'] + st['misses']})")
+
+    def run_cache_maintenance(self):
+        # En segundo plano y con el presupuesto del diálogo solo para esta pasada: se guarda al aceptar.
+        # El hilo cuelga de la ventana principal para sobrevivir al cierre del diálogo
+        self.btn_maintenance.setEnabled(False); self.btn_maintenance.setText(" Limpiando...")
+        self.maintenance_worker = CacheMaintenanceWorker(self.cache_manager, self.spin_cache_budget.value(), parent=self.parent())
+        self.maintenance_worker.finished.connect(self.on_cache_maintenance_done); self.maintenance_worker.start()
+
+    def on_cache_maintenance_done(self, removed):
+        self.btn_maintenance.setEnabled(True); self.btn_maintenance.setText(" Limpiar y compactar ahora")
+        self.refresh_cache_stats()
+
     def get_config(self):
         return {
             "color_light": self.config["color_light"],
@@ -160,7 +243,12 @@ class SettingsDialog(QDialog):
             "engine_hash": self.spin_hash.value(),
             "engine_depth": self.spin_depth.value(),
             "tree_depth": self.spin_tree_depth.value(),
+            "analysis_engines": self.spin_analysis_engines.value(),
+            "analysis_budget": self.spin_analysis_budget.value(),
+            "engine_fps": self.spin_engine_fps.value(),
+            "engine_budget": self.spin_engine_budget.value(),
             "venom_eval": self.spin_v_eval.value(),
             "venom_win": self.spin_v_win.value(),
-            "practical_win": self.spin_p_win.value()
+            "practical_win": self.spin_p_win.value(),
+            "cache_budget_mb": self.spin_cache_budget.value()
         }
@@ -3,6 +3,7 @@ from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 import qtawesome as qta
+from src.core.utils import compute_game_stats
 
 class AnalysisReport(QWidget):
     def __init__(self, parent=None):
@@ -72,7 +73,7 @@ class AnalysisReport(QWidget):
 
     def update_stats(self, evaluations, moves_uci, white_name="Blancas", black_name="Negras"):
         """
-        Calcula estadísticas basadas en la lista de evaluaciones (centipeones)
+        Muestra las estadísticas calculadas a partir de la lista de evaluaciones (centipeones)
         """
         # Actualizar Cabeceras con Iconos
         self.lbl_white.setText(white_name)
@@ -83,63 +84,13 @@ class AnalysisReport(QWidget):
         self.lbl_white.setText(f"♔ {white_name}")
         self.lbl_black.setText(f"♚ {black_name}")
         
-        # Reiniciar stats
-        stats = {
-            "white": {"inaccuracies": 0, "mistakes": 0, "blunders": 0, "loss_sum": 0, "moves": 0},
-            "black": {"inaccuracies": 0, "mistakes": 0, "blunders": 0, "loss_sum": 0, "moves": 0}
-        }
-        
-        # Necesitamos pares (eval_pre, eval_post) para cada movimiento
-        # evals[0] es startpos. evals[1] es tras 1. e4 (jugada blanca).
-        # Para blancas (índices pares en moves_uci, 0, 2...): Loss = evals[i] - evals[i+1] (si evals[i] > evals[i+1])
-        # OJO: Las evaluaciones siempre son relativas a blancas en mi implementación interna (+ ventaja blanca)
-        # Si juega blancas: Queremos maximizar eval. Loss = Eval_Pre - Eval_Post
-        # Si juega negras: Queremos minimizar eval (hacerlo negativo). Loss = Eval_Post - Eval_Pre
-        
-        # Validar longitudes
-        if len(evaluations) < len(moves_uci) + 1:
-            return # Datos incompletos
+        stats = compute_game_stats(evaluations, len(moves_uci))
+        if stats is None: return # Datos incompletos
 
-        for i, move in enumerate(moves_uci):
-            is_white = (i % 2 == 0)
-            player = "white" if is_white else "black"
-            
-            # Saturar evaluaciones a +/- 1000 (10.0) para que errores en posiciones 
-            # totalmente ganadas/perdidas no distorsionen el ACPL.
-            eval_pre = max(-1000, min(1000, evaluations[i]))
-            eval_post = max(-1000, min(1000, evaluations[i+1]))
-            
-            # Calcular pérdida (Loss) siempre positiva
-            if is_white:
-                loss = max(0, eval_pre - eval_post)
-            else:
-                loss = max(0, eval_post - eval_pre)
-            
-            # Acumular para ACPL
-            stats[player]["loss_sum"] += loss
-            stats[player]["moves"] += 1
-            
-            # Categorizar Error (Estándares competitivos)
-            if loss >= 200:   # Blunder > 2.00
-                stats[player]["blunders"] += 1
-            elif loss >= 90:  # Mistake > 0.90
-                stats[player]["mistakes"] += 1
-            elif loss >= 40:  # Inaccuracy > 0.40
-                stats[player]["inaccuracies"] += 1
-
-        # Calcular finales y actualizar UI
         for color in ["white", "black"]:
             s = stats[color]
-            moves = max(1, s["moves"])
-            acpl = s["loss_sum"] / moves
-            
-            # Fórmula de Precisión ajustada (Aprox. realismo competitivo)
-            # 0 ACPL -> 100% | 20 ACPL -> 90% | 50 ACPL -> 77% | 100 ACPL -> 60%
-            import math
-            accuracy = 100 * math.exp(-0.005 * acpl)
-            
             self.labels[f"{color}_inaccuracies"].setText(str(s["inaccuracies"]))
             self.labels[f"{color}_mistakes"].setText(str(s["mistakes"]))
             self.labels[f"{color}_blunders"].setText(str(s["blunders"]))
-            self.labels[f"{color}_acpl"].setText(f"{acpl:.1f}")
-            self.labels[f"{color}_accuracy"].setText(f"{accuracy:.1f}%")
\ No newline at end of file
+            self.labels[f"{color}_acpl"].setText(f"{s['acpl']:.1f}")
+            self.labels[f"{color}_accuracy"].setText(f"{s['accuracy']:.1f}%")
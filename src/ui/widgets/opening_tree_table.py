@@ -10,6 +10,9 @@ from src.ui.widgets.results_bar import ResultsWidget
 from src.ui.utils import SortableWidgetItem
 from src.core.utils import uci_to_san
 
+TREE_HEADERS = ["🧪", "Movim.", "Eval", "Frec.", "Barra", "Win %", "AvElo", "Perf"]
+BOOK_HEADERS = ["🧪", "Movim.", "Eval", "Peso", "Barra", "Peso %", "AvElo", "Perf"] # libro Polyglot: el porcentaje es del peso, no de victorias
+
 class OpeningTreeTable(QWidget):
     move_selected = Signal(str) # uci
     move_hovered = Signal(str)  # uci or None
@@ -58,7 +61,7 @@ class OpeningTreeTable(QWidget):
 
         self.stack = QStackedWidget()
         self.table = QTableWidget(0, 8)
-        self.table.setHorizontalHeaderLabels(["🧪", "Movim.", "Eval", "Frec.", "Barra", "Win %", "AvElo", "Perf"])
+        self.table.setHorizontalHeaderLabels(TREE_HEADERS)
         
         self.table.horizontalHeaderItem(0).setToolTip("Buscador de Veneno: Jugadas con alta recompensa práctica a pesar de la evaluación.")
         self.table.horizontalHeaderItem(2).setToolTip("Evaluación del motor para este movimiento")
@@ -110,10 +113,10 @@ class OpeningTreeTable(QWidget):
         self.total_view_count = total_view_count
         self.branch_evals_cache = {} # RESETEAR MEMORIA AL CAMBIAR DE POSICIÓN
         self.label_eco.setText(f"{opening_name} ({engine_eval:+.2f})" if engine_eval is not None else opening_name)
-        self.table.setSortingEnabled(False); self.table.setRowCount(0)
+        self.table.setSortingEnabled(False); self.table.setRowCount(0); self.table.setHorizontalHeaderLabels(TREE_HEADERS)
         
         if stats_df is None or stats_df.is_empty():
-            self.stack.setCurrentIndex(2); return
+            self.label_insufficient.setText("Cálculo detenido"); self.stack.setCurrentIndex(2); return
 
         self.stack.setCurrentIndex(0)
         is_white_turn = current_board.turn == chess.WHITE
@@ -165,6 +168,35 @@ class OpeningTreeTable(QWidget):
 
         self.table.setSortingEnabled(True); self.table.sortByColumn(3, Qt.DescendingOrder)
 
+    def update_book(self, book_df, current_board, opening_name, next_move_uci=None):
+        """Muestra las jugadas de un libro Polyglot: peso y su porcentaje, con cabeceras propias ('Peso', 'Peso %') para no leerlo como tasa de victorias"""
+        self.set_loading(False)
+        self.total_view_count = 0
+        self.branch_evals_cache = {}
+        self.label_eco.setText(opening_name)
+        self.table.setSortingEnabled(False); self.table.setRowCount(0); self.table.setHorizontalHeaderLabels(BOOK_HEADERS)
+
+        if book_df is None or book_df.is_empty():
+            self.label_insufficient.setText("Fuera de libro"); self.stack.setCurrentIndex(2); return
+
+        self.stack.setCurrentIndex(0)
+        self.table.setRowCount(book_df.height)
+        for i, r in enumerate(book_df.rows(named=True)):
+            is_played = r["uci"] == next_move_uci
+            try: move_text = uci_to_san(current_board, r["uci"])
+            except: move_text = r["uci"]
+            it_move = QTableWidgetItem(move_text); it_move.setData(Qt.UserRole, r["uci"]); it_move.setTextAlignment(Qt.AlignCenter)
+            font = it_move.font(); font.setBold(True); it_move.setFont(font)
+            it_weight = SortableWidgetItem(f"{r['weight']:,}".replace(",", ".")); it_weight.setData(Qt.UserRole, r["weight"]); it_weight.setTextAlignment(Qt.AlignCenter)
+            it_pct = SortableWidgetItem(f"{r['pct']:.1f}%"); it_pct.setData(Qt.UserRole, r["pct"]); it_pct.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            items = {0: QTableWidgetItem(""), 1: it_move, 2: QTableWidgetItem("-"), 3: it_weight, 5: it_pct, 6: QTableWidgetItem("-"), 7: QTableWidgetItem("-")}
+            for col, it in items.items():
+                if col != 1 and col not in (3, 5): it.setTextAlignment(Qt.AlignCenter)
+                if is_played: it.setBackground(QColor("#f6f669"))
+                self.table.setItem(i, col, it)
+
+        self.table.setSortingEnabled(True); self.table.sortByColumn(3, Qt.DescendingOrder)
+
     def update_branch_evals(self, multi_evals, is_white_turn):
         """Actualiza dinámicamente usando una memoria persistente de ramas"""
         if not multi_evals or self.stack.currentIndex() != 0: return
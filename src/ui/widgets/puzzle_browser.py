@@ -9,6 +9,7 @@ import qtawesome as qta
 from src.ui.board import ChessBoard
 from src.core.game_controller import GameController
 from src.core.puzzle_manager import PuzzleManager
+from src.core.puzzle_scheduler import PuzzleScheduler
 from src.config import PUZZLE_FILE, logger
 
 # Mapeo de temas humanizados
@@ -16,7 +17,7 @@ THEME_MAP = {
     "mate": "👑 Mate", "fork": "🍴 Ataque Doble", "pin": "📌 Clavada", "skewer": "🏹 Enfilada", "sacrifice": "🎁 Sacrificio",
     "attraction": "🧲 Atracción", "deflection": "🔄 Desviación", "discoveredAttack": "🎭 Descubierta", "zugzwang": "⏳ Zugzwang",
     "endgame": "🏁 Final", "advancedPawn": "♟️ Peón Avanzado", "backRankMate": "🪜 Mate de Pasillo", "trappedPiece": "🕸️ Pieza Atrapada",
-    "defensiveMove": "🛡️ Jugada Defensiva", "crushing": "💥 Aplastante", "advantage": "📈 Ventaja"
+    "defensiveMove": "🛡️ Jugada Defensiva", "crushing": "💥 Aplastante", "advantage": "📈 Ventaja", "hangingPiece": "🎯 Pieza Colgada"
 }
 
 class MultiThemeSelector(QPushButton):
@@ -24,6 +25,11 @@ class MultiThemeSelector(QPushButton):
     def __init__(self, themes_dict, parent=None):
         super().__init__("Seleccionar Temas...", parent); self.themes_dict = themes_dict; self.selected_themes = []
         self.setFixedWidth(180); self.setMenu(QMenu(self)); self.setStyleSheet("QPushButton { text-align: left; padding: 5px; background: #fff; border: 1px solid #ddd; }"); self.init_menu()
+    def set_themes(self, themes_dict):
+        """Reconstruye el menú con el vocabulario de temas de la base de puzzles"""
+        self.themes_dict = themes_dict; self.selected_themes = [t for t in self.selected_themes if t in themes_dict]
+        self.menu().clear(); self.init_menu()
+        for a in self.menu().actions(): a.setChecked(a.data() in self.selected_themes)
     def init_menu(self):
         menu = self.menu()
         for tag, human in self.themes_dict.items():
@@ -48,7 +54,8 @@ class PuzzleListItemWidget(QWidget):
 
 class PuzzleBrowserWidget(QWidget):
     def __init__(self, parent_main=None):
-        super().__init__(parent_main); self.parent_main = parent_main; self.game = GameController(); self.manager = None; self.puzzle_df = None; self.current_puzzle = None; self.current_index = 0; self.solution_idx = 0; self.has_failed_current = False; self.hint_level = 0; self.batch_size = 50; self.loaded_count = 0; self.filter_status = "all"; self.filter_themes = []
+        super().__init__(parent_main); self.parent_main = parent_main; self.game = GameController(); self.manager = None; self.puzzle_df = None; self.current_puzzle = None; self.current_index = 0; self.solution_idx = 0; self.has_failed_current = False; self.hint_level = 0; self.batch_size = 50; self.loaded_count = 0; self.filter_status = "all"; self.filter_themes = []; self.filter_opening = None; self.total_count = 0; self.result_recorded = False; self._queue_worker = None
+        self.scheduler = PuzzleScheduler(parent_main.app_db) if parent_main else None
         self.filter_timer = QTimer(); self.filter_timer.setSingleShot(True); self.filter_timer.timeout.connect(self.apply_filters); self.game.position_changed.connect(self.update_ui); self.init_ui()
         if os.path.exists(PUZZLE_FILE): self.load_db(PUZZLE_FILE)
 
@@ -58,10 +65,14 @@ class PuzzleBrowserWidget(QWidget):
         
         vl_elo = QVBoxLayout(); saved_elo = 1200; self.label_elo_val = QLabel(f"Dificultad: <b>{saved_elo}</b>"); self.slider_elo = QSlider(Qt.Horizontal); self.slider_elo.setRange(400, 3000); self.slider_elo.setValue(saved_elo); self.slider_elo.setFixedWidth(120); self.slider_elo.valueChanged.connect(self.on_slider_changed); vl_elo.addWidget(self.label_elo_val); vl_elo.addWidget(self.slider_elo); top_layout.addLayout(vl_elo)
         top_layout.addSpacing(15); top_layout.addWidget(QLabel("Temas:")); self.theme_selector = MultiThemeSelector(THEME_MAP); self.theme_selector.themes_changed.connect(self.set_themes_filter); top_layout.addWidget(self.theme_selector)
+        self.combo_opening = QComboBox(); self.combo_opening.setFixedWidth(180); self.combo_opening.addItem("Todas las aperturas", None); self.combo_opening.currentIndexChanged.connect(self.on_opening_changed); top_layout.addWidget(self.combo_opening)
+        self.btn_opening_line = QPushButton(qta.icon('fa5s.sitemap', color='#555'), ""); self.btn_opening_line.setFixedWidth(30); self.btn_opening_line.setToolTip("Ejercicios de la apertura que estás estudiando en el árbol"); self.btn_opening_line.clicked.connect(self.filter_by_tree_opening); top_layout.addWidget(self.btn_opening_line)
         
         top_layout.addSpacing(15); self.btn_pending = QPushButton(qta.icon('fa5s.star', color='#888'), ""); self.btn_success = QPushButton(qta.icon('fa5s.star', color='#2e7d32'), ""); self.btn_fail = QPushButton(qta.icon('fa5s.star', color='#c62828'), "")
         for btn in [self.btn_pending, self.btn_success, self.btn_fail]:
             btn.setCheckable(True); btn.setFixedWidth(30); btn.clicked.connect(self.on_status_filter_clicked); top_layout.addWidget(btn)
+        top_layout.addSpacing(15); self.btn_random = QPushButton(qta.icon('fa5s.dice', color='#555'), ""); self.btn_random.setFixedWidth(30); self.btn_random.setToolTip("Ejercicio al azar entre los filtrados (más probable cuanto más popular)"); self.btn_random.clicked.connect(self.load_random_puzzle); top_layout.addWidget(self.btn_random)
+        self.btn_train = QPushButton(qta.icon('fa5s.graduation-cap', color='#555'), ""); self.btn_train.setCheckable(True); self.btn_train.setFixedWidth(30); self.btn_train.setToolTip("Entrenamiento: repasos pendientes y ejercicios a tu nivel, más de los temas que más fallas (no usa los filtros de dificultad, tema, apertura ni estado)"); self.btn_train.setChecked(bool(self.parent_main and self.parent_main.app_db.get_config("puzzle_training", False))); self.btn_train.toggled.connect(self.on_train_toggled); top_layout.addWidget(self.btn_train)
             
         top_layout.addStretch()
         # BOTONES DE AYUDA (TOGGLE)
@@ -80,6 +91,7 @@ class PuzzleBrowserWidget(QWidget):
             v = QVBoxLayout(); l = QLabel(label); l.setStyleSheet("font-size: 9px; color: #888;"); v.addWidget(l, 0, Qt.AlignCenter); val.setStyleSheet(f"font-size: 14px; font-weight: bold; color: {color};"); v.addWidget(val, 0, Qt.AlignCenter); stats_row.addLayout(v)
         dash_l.addLayout(stats_row); rp_layout.addWidget(self.dash_frame, 1); self.splitter.addWidget(right_panel); self.splitter.setStretchFactor(0, 3); self.splitter.setStretchFactor(1, 1); layout.addWidget(self.splitter)
         self.label_feedback = QLabel("Selecciona un ejercicio"); self.label_feedback.setStyleSheet("font-size: 14px; font-weight: bold; background: #333; color: #fff; padding: 10px;"); self.label_feedback.setAlignment(Qt.AlignCenter); layout.addWidget(self.label_feedback)
+        self.sync_training_ui()
 
     def toggle_hint_tension(self):
         if self.btn_hint_tension.isChecked():
@@ -137,7 +149,7 @@ class PuzzleBrowserWidget(QWidget):
         except: return []
 
     def start_puzzle(self, puzzle):
-        self.current_puzzle = puzzle; self.solution_idx = 0; self.has_failed_current = False; self.hint_level = 0
+        self.current_puzzle = puzzle; self.solution_idx = 0; self.has_failed_current = False; self.hint_level = 0; self.result_recorded = False
         for b in [self.btn_hint_tension, self.btn_hint_piece, self.btn_hint_dest]: b.setChecked(False)
         self.chess_board.highlighted_square = None; self.chess_board.tension_squares = []; self.chess_board.set_engine_move(None)
         self.game.board.set_fen(puzzle["initial_fen"]); self.game.full_mainline = []; self.game.current_idx = 0
@@ -165,7 +177,7 @@ class PuzzleBrowserWidget(QWidget):
             self.label_feedback.setStyleSheet("background: #c62828; color: #fff; padding: 10px;")
             
             from src.core.workers import RefutationWorker
-            self._ref_worker = RefutationWorker(self.parent_main.engine_path, self.game.board.fen())
+            self._ref_worker = RefutationWorker(self.parent_main.engine_path, self.game.board.fen(), app_db=self.parent_main.app_db)
             self._ref_worker.finished.connect(self.on_refutation_ready)
             self._ref_worker.start()
             self.update_elo(False)
@@ -194,23 +206,53 @@ class PuzzleBrowserWidget(QWidget):
         except: pass
 
     def update_elo(self, success):
-        if not self.parent_main: return
-        my_elo = self.parent_main.app_db.get_tactical_elo(); puzzle_elo = self.current_puzzle.get("rating", 1200)
-        expected = 1 / (1 + 10**((puzzle_elo - my_elo) / 400.0)); actual = 1.0 if success and not self.has_failed_current else 0.0
+        # Un único resultado por ejercicio: el primer fallo cuenta aunque luego se resuelva
+        if not self.scheduler or self.result_recorded: return
+        self.result_recorded = True; actual = 1.0 if success and not self.has_failed_current else 0.0
         if success and self.hint_level > 0: actual = 0.7
-        variation = int(32 * (actual - expected))
-        if variation == 0: variation = 1 if actual > 0.5 else -1
-        self.parent_main.app_db.set_tactical_elo(max(100, my_elo + variation)); self.update_status("success" if success and not self.has_failed_current else "fail")
+        self.scheduler.record(self.current_puzzle, actual); self.update_status("success" if success and not self.has_failed_current else "fail")
+
+    def on_train_toggled(self, checked):
+        if self.parent_main: self.parent_main.app_db.set_config("puzzle_training", checked)
+        self.sync_training_ui()
+        if checked: self.load_next_puzzle()
+
+    def sync_training_ui(self):
+        """La cola de entrenamiento elige por tu puntuación y tus temas débiles: los filtros quedan desactivados mientras está activa"""
+        training = self.btn_train.isChecked()
+        for w in [self.slider_elo, self.theme_selector, self.combo_opening, self.btn_opening_line, self.btn_pending, self.btn_success, self.btn_fail]: w.setEnabled(not training)
+        if training: self.label_feedback.setText("Modo entrenamiento: los filtros no se aplican")
+
+    def refill_queue(self):
+        """Reconstruye la cola de entrenamiento en segundo plano si no hay ya una reconstrucción en marcha"""
+        if not self.scheduler or not self.manager or (self._queue_worker and self._queue_worker.isRunning()): return
+        from src.core.workers import PuzzleQueueWorker
+        self._queue_worker = PuzzleQueueWorker(self.scheduler, self.manager.path, self.parent_main.app_db.get_puzzle_stats_frame())
+        self._queue_worker.finished.connect(self.on_queue_ready); self._queue_worker.start()
+
+    def on_queue_ready(self, puzzles):
+        if puzzles: self.scheduler.set_queue(puzzles)
 
     def load_next_puzzle(self):
-        """Carga automáticamente el siguiente ejercicio de la lista"""
-        if self.current_index + 1 < self.puzzle_df.height:
+        """Siguiente ejercicio: de la cola de entrenamiento si está activa, si no el siguiente de la lista"""
+        if self.scheduler and self.btn_train.isChecked():
+            puzzle = self.scheduler.pop()
+            if self.scheduler.needs_refill(): self.refill_queue()
+            if puzzle: self.current_index = -1; self.list_view.clearSelection(); self.start_puzzle(puzzle); return
+        if self.current_index + 1 >= self.loaded_count: self.load_more_puzzles()
+        if self.current_index + 1 < self.loaded_count:
             self.load_puzzle_by_index(self.current_index + 1)
 
+    def load_random_puzzle(self):
+        puzzle = self.manager.get_random_puzzle(weighted=True) if self.manager else None
+        if not puzzle: self.label_feedback.setText("No hay ejercicios con estos filtros"); return
+        # Fuera de la lista paginada: current_index no apunta a ninguna fila
+        self.current_index = -1; self.list_view.clearSelection(); self.start_puzzle(puzzle)
+
     def update_status(self, status):
         """Actualiza el estado del puzzle tanto en el DF como en la lista visual y DB"""
-        # 1. Actualizar DataFrame
-        self.puzzle_df[self.current_index, "status"] = status
+        # 1. Actualizar DataFrame (un ejercicio al azar no está en la lista cargada)
+        if self.puzzle_df is not None and 0 <= self.current_index < self.puzzle_df.height: self.puzzle_df[self.current_index, "status"] = status
         
         # 2. Actualizar icono en la lista visual
         item = self.list_view.item(self.current_index)
@@ -230,18 +272,33 @@ class PuzzleBrowserWidget(QWidget):
 
     def update_dashboard(self):
         if not self.parent_main: return
-        stats = self.parent_main.app_db.get_all_puzzle_stats(); success = sum(1 for s in stats.values() if s == "success"); fail = sum(1 for s in stats.values() if s == "fail")
-        self.val_total.setText(str(len(stats))); self.val_success.setText(str(success)); self.val_fail.setText(str(fail)); self.label_elo_tactico.setText(f"ELO TÁCTICO: {self.parent_main.app_db.get_tactical_elo()}")
+        summary = self.parent_main.app_db.get_puzzle_summary()
+        self.val_total.setText(str(summary["total"])); self.val_success.setText(str(summary["success"])); self.val_fail.setText(str(summary["fail"])); self.label_elo_tactico.setText(f"ELO TÁCTICO: {self.parent_main.app_db.get_tactical_elo()}")
 
     def set_themes_filter(self, themes_list): self.filter_themes = themes_list; self.apply_filters()
+    def set_openings(self, openings):
+        """Rellena el filtro de aperturas con las familias de la base (ya ordenadas por número de puzzles)"""
+        self.combo_opening.blockSignals(True); self.combo_opening.clear(); self.combo_opening.addItem("Todas las aperturas", None)
+        for family, n in openings.items(): self.combo_opening.addItem(f"{family.replace('_', ' ')} ({n})", family)
+        i = self.combo_opening.findData(self.filter_opening); self.combo_opening.setCurrentIndex(max(i, 0)); self.filter_opening = self.combo_opening.currentData()
+        self.combo_opening.blockSignals(False)
+    def on_opening_changed(self, _): self.filter_opening = self.combo_opening.currentData(); self.apply_filters()
+    def filter_by_tree_opening(self):
+        """Filtra por la familia de apertura de la posición actual del árbol de aperturas"""
+        if not self.manager or not self.parent_main: return
+        name, _ = self.parent_main.eco.get_opening_name(self.parent_main.game.current_line_uci)
+        family = self.manager.family_for_opening(name)
+        if not family: self.label_feedback.setText(f"No hay ejercicios de «{name}»"); return
+        self.combo_opening.setCurrentIndex(self.combo_opening.findData(family))
     def apply_filters(self):
         if not self.manager: return
-        target_elo = self.slider_elo.value(); self.manager.apply_filters(min_rating=target_elo-100, max_rating=target_elo+100, theme=" ".join(self.filter_themes))
-        full_set = self.manager.get_sample(); saved_stats = self.parent_main.app_db.get_all_puzzle_stats() if self.parent_main else {}
-        full_set = full_set.with_columns(pl.Series("status", [saved_stats.get(str(pid), "pending") for pid in full_set["PuzzleId"]]))
-        if self.filter_status != "all": full_set = full_set.filter(pl.col("status") == self.filter_status)
-        self.puzzle_df = full_set; self.loaded_count = 0; self.list_view.clear(); self.load_more_puzzles(); self.update_dashboard()
-        if self.puzzle_df.height > 0: self.load_puzzle_by_index(0)
+        target_elo = self.slider_elo.value()
+        # El progreso se une dentro de la consulta del PuzzleManager (filtro por estado y columna 'status')
+        if self.parent_main: self.manager.set_progress(self.parent_main.app_db.get_puzzle_stats_frame())
+        status = None if self.filter_status == "all" else self.filter_status
+        self.manager.apply_filters(min_rating=target_elo-100, max_rating=target_elo+100, theme=" ".join(self.filter_themes), opening=self.filter_opening, status=status)
+        self.total_count = self.manager.count(); self.puzzle_df = None; self.loaded_count = 0; self.list_view.clear(); self.load_more_puzzles(); self.update_dashboard()
+        if self.loaded_count > 0: self.load_puzzle_by_index(0)
 
     def on_status_filter_clicked(self):
         s = self.sender()
@@ -257,10 +314,18 @@ class PuzzleBrowserWidget(QWidget):
         if self.parent_main: self.parent_main.app_db.set_config("puzzle_slider_elo", val)
         self.filter_timer.start(300)
 
-    def load_db(self, path): self.manager = PuzzleManager(path); self.apply_filters()
+    def load_db(self, path):
+        try: self.manager = PuzzleManager(path)
+        except Exception as e: logger.error(f"Puzzles: no se pudo abrir {path}: {e}"); return
+        self.refill_queue(); self.set_openings(self.manager.openings)
+        if self.manager.themes: self.theme_selector.set_themes({t: THEME_MAP.get(t, t) for t in self.manager.themes}); self.filter_themes = self.theme_selector.selected_themes
+        self.apply_filters()
     def load_more_puzzles(self):
-        if self.puzzle_df is None: return
-        s = self.loaded_count; e = min(s + self.batch_size, self.puzzle_df.height)
+        if not self.manager or self.loaded_count >= self.total_count: return
+        # Solo se lee la página siguiente de la vista filtrada (los row groups de ese rango de dificultad), ya con su 'status'
+        page = self.manager.get_page(self.loaded_count, self.batch_size)
+        self.puzzle_df = page if self.puzzle_df is None else pl.concat([self.puzzle_df, page])
+        s = self.loaded_count; e = s + page.height
         for i in range(s, e):
             row = self.puzzle_df.row(i, named=True); it = QListWidgetItem(); it.setSizeHint(QSize(0, 35)); it.setData(Qt.UserRole, row); self.list_view.addItem(it); self.list_view.setItemWidget(it, PuzzleListItemWidget(row, row.get("status", "pending"), self))
         self.loaded_count = e
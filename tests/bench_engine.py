@@ -0,0 +1,106 @@
+"""
+Benchmark de la fontanería de motores con el motor UCI falso (tests/fake_uci_engine.py).
+
+Recorre los workers reales (escaneo del árbol, análisis completo y análisis en vivo) y separa el
+tiempo de búsqueda, que el motor falso anota por cada 'go', del coste propio de la aplicación:
+arranque de procesos, protocolo UCI, pool, planificador, señales y caché.
+
+    python -m tests.bench_engine --latency 0.001 --repeat 3
+"""
+import os
+import time
+import logging
+import argparse
+import tempfile
+import threading
+import chess
+from PySide6.QtCore import Qt
+from src.core.engine_pool import EnginePool
+from src.core.engine_manager import EngineManager
+from src.core.engine_scheduler import EngineScheduler
+from src.core.engine_worker import EngineWorker, TreeScannerWorker, FullAnalysisWorker
+from tests.fake_uci_engine import engine_command, read_log
+
+GAME = "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5a4 g8f6 e1g1 f8e7 f1e1 b7b5 a4b3 d7d6 c2c3 e8g8 h2h3 c6b8 d2d4 b8d7 b1d2 c8b7 b3c2 f8e8 d2f1 e7f8 f1g3 g7g6 a2a4 c7c5 d4d5 c5c4 c1g5 h7h6 g5e3 d7c5 d1d2 h6h5 e1f1 a8c8".split()
+
+class Bench:
+    def __init__(self, latency, depth, engines):
+        self.latency = latency; self.depth = depth; self.engines = engines
+        self.log = tempfile.NamedTemporaryFile(prefix="fake_uci_", suffix=".log", delete=False).name
+        self.engine = engine_command(latency=latency, log=self.log, max_depth=depth)
+        self.rows = []
+
+    def measure(self, name, fn, parallel=1):
+        open(self.log, "w").close()
+        start = time.perf_counter(); units = fn(); wall = time.perf_counter() - start
+        searches = read_log(self.log); search = sum(s for s, _ in searches)
+        # Con motores en paralelo la búsqueda suma el tiempo de varios procesos a la vez
+        overhead = max(wall - search / parallel, 0.0)
+        self.rows.append((name, wall, len(searches), search, overhead, units))
+
+    def tree_scan(self, pool, multipv):
+        moves = [m.uci() for m in chess.Board().legal_moves]
+        worker = TreeScannerWorker(self.engine, chess.STARTING_FEN, moves, depth=self.depth, pool=pool, multipv=multipv, time_per_move=10, scheduler=EngineScheduler())
+        results = []; worker.eval_ready.connect(lambda u, s: results.append(u))
+        worker.run()
+        return len(results)
+
+    def full_analysis(self, pool, engines):
+        moves = [chess.Move.from_uci(u) for u in GAME]
+        worker = FullAnalysisWorker(moves, depth=self.depth, engine_path=self.engine, pool=pool, engines=engines, scheduler=EngineScheduler())
+        results = []; worker.analysis_result.connect(lambda i, v: results.append(i), Qt.DirectConnection)
+        worker.run()
+        return len(results)
+
+    def live(self, manager, positions=20):
+        """Latencia desde update_position() hasta el primer fotograma de la posición nueva"""
+        worker = EngineWorker(engine_path=self.engine, depth_limit=self.depth, manager=manager, fps=0, scheduler=EngineScheduler())
+        arrived = threading.Event(); target = {}
+        def on_info(eval_str, best, mainline):
+            if best in target.get("moves", ()): arrived.set()
+        worker.info_updated.connect(on_info, Qt.DirectConnection)
+        board = chess.Board(); latencies = []
+        worker.update_position(board.fen()); worker.start()
+        for uci in GAME[:positions]:
+            board.push_uci(uci); arrived.clear()
+            target["moves"] = {m.uci() for m in board.legal_moves}
+            t0 = time.perf_counter(); worker.update_position(board.fen())
+            if arrived.wait(10): latencies.append(time.perf_counter() - t0)
+        worker.stop(); worker.wait(10)
+        self.live_latency = sorted(latencies)
+        return len(latencies)
+
+    def run(self, repeat):
+        for i in range(repeat):
+            tag = "frío" if i == 0 else "caliente"
+            pool = EnginePool(max_idle=max(self.engines, 1)) if i == 0 else self.pool
+            self.pool = pool
+            self.measure(f"árbol MultiPV ({tag})", lambda: self.tree_scan(pool, 8))
+            self.measure(f"árbol por jugada ({tag})", lambda: self.tree_scan(pool, 1))
+            self.measure(f"análisis 1 motor ({tag})", lambda: self.full_analysis(pool, 1))
+            self.measure(f"análisis {self.engines} motores ({tag})", lambda: self.full_analysis(pool, self.engines), parallel=self.engines)
+        manager = EngineManager()
+        try: self.measure("en vivo", lambda: self.live(manager))
+        finally: manager.shutdown(); self.pool.shutdown(); os.unlink(self.log)
+
+    def report(self):
+        print(f"Motor falso: {self.latency * 1000:.1f} ms por iteración, profundidad {self.depth}")
+        print(f"{'escenario':<28}{'total':>10}{'búsquedas':>11}{'búsqueda':>10}{'overhead':>10}{'por go':>10}{'unid.':>7}")
+        for name, wall, n, search, overhead, units in self.rows:
+            print(f"{name:<28}{wall * 1000:>8.1f}ms{n:>11}{search * 1000:>8.1f}ms{overhead * 1000:>8.1f}ms{overhead / max(n, 1) * 1000:>8.2f}ms{units:>7}")
+        lat = getattr(self, "live_latency", [])
+        if lat: print(f"en vivo, cambio de posición -> primer fotograma: p50 {lat[len(lat) // 2] * 1000:.1f} ms, p95 {lat[int(len(lat) * 0.95) - 1] * 1000:.1f} ms, máx {lat[-1] * 1000:.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la fontanería de motores con un motor UCI falso")
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos por iteración de profundidad del motor falso")
+    parser.add_argument("--depth", type=int, default=8, help="Profundidad de cada búsqueda")
+    parser.add_argument("--engines", type=int, default=min(4, os.cpu_count() or 1), help="Motores del análisis en paralelo")
+    parser.add_argument("--repeat", type=int, default=2, help="Rondas (la primera incluye el arranque de procesos)")
+    args = parser.parse_args(argv)
+    logging.getLogger("chess.engine").setLevel(logging.WARNING)
+    bench = Bench(args.latency, args.depth, args.engines)
+    bench.run(args.repeat); bench.report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Motor UCI falso y programable para tests y benchmarks de la fontanería de motores.
+
+Habla UCI por stdin/stdout como Stockfish, pero la 'búsqueda' es sintética: cada iteración de
+profundidad tarda --latency segundos y la evaluación es una función fija de la posición, así que
+el tiempo de búsqueda es conocido y todo lo que mida de más un benchmark es coste de la aplicación.
+
+    python tests/fake_uci_engine.py --latency 0.002 --max-depth 30 --log /tmp/fake.log
+
+Con --log, cada búsqueda añade una línea 'go <segundos> <profundidad>' al fichero.
+"""
+import sys
+import time
+import queue
+import argparse
+import threading
+import chess
+import chess.polyglot
+
+def engine_command(**options):
+    """Comando para lanzar este motor desde el EnginePool/EngineManager: engine_command(latency=0.01, log=ruta)"""
+    cmd = [sys.executable, __file__]
+    for key, value in options.items():
+        if value is True: cmd.append(f"--{key.replace('_', '-')}")
+        elif value is not None and value is not False: cmd += [f"--{key.replace('_', '-')}", str(value)]
+    return cmd
+
+PIECE_CP = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+MATED = -100000
+
+def position_score(board, fixed=None, material=False):
+    """
+    Evaluación sintética en cp desde el bando al que le toca: fija, derivada del hash de la posición o,
+    con material=True, balance de material más un ruido pequeño del hash. Un mate se ve siempre (MATED).
+    """
+    if board.is_checkmate(): return MATED
+    if fixed is not None: return fixed
+    if material:
+        balance = sum(PIECE_CP[p.piece_type] * (1 if p.color == board.turn else -1) for p in board.piece_map().values())
+        return balance + chess.polyglot.zobrist_hash(board) % 21 - 10
+    return chess.polyglot.zobrist_hash(board) % 201 - 100
+
+class FakeEngine:
+    def __init__(self, args, out=sys.stdout):
+        self.args = args
+        self.out = out
+        self.board = chess.Board()
+        self.multipv = 1
+        self.lines = queue.Queue()
+
+    def send(self, text):
+        self.out.write(text + "\n"); self.out.flush()
+
+    def serve(self, stream=sys.stdin):
+        threading.Thread(target=lambda: [self.lines.put(l.strip()) for l in stream] + [self.lines.put("quit")], daemon=True).start()
+        while True:
+            cmd = self.lines.get()
+            if cmd == "uci":
+                if self.args.startup: time.sleep(self.args.startup)
+                self.send("id name FakeUCI\nid author fa-chess tests")
+                self.send("option name Hash type spin default 16 min 1 max 65536\noption name Threads type spin default 1 min 1 max 512\noption name MultiPV type spin default 1 min 1 max 256")
+                self.send("uciok")
+            elif cmd == "isready": self.send("readyok")
+            elif cmd.startswith("setoption name MultiPV value"): self.multipv = int(cmd.split()[-1])
+            elif cmd.startswith("position"): self.set_position(cmd.split())
+            elif cmd.startswith("go"): self.go(cmd.split())
+            elif cmd == "quit": return
+
+    def set_position(self, parts):
+        if parts[1] == "startpos": self.board = chess.Board(); rest = parts[2:]
+        else: self.board = chess.Board(" ".join(parts[2:8])); rest = parts[8:]
+        for uci in rest[1:] if rest and rest[0] == "moves" else []: self.board.push_uci(uci)
+
+    def go(self, parts):
+        def arg(name, cast=int):
+            return cast(parts[parts.index(name) + 1]) if name in parts else None
+        depth_limit, movetime, infinite = arg("depth"), arg("movetime"), "infinite" in parts
+        searchmoves = []
+        if "searchmoves" in parts:
+            for token in parts[parts.index("searchmoves") + 1:]:
+                if token in ("depth", "movetime", "nodes", "infinite", "wtime", "btime"): break
+                searchmoves.append(chess.Move.from_uci(token))
+        moves = searchmoves or list(self.board.legal_moves)
+        if not moves:
+            self.send("info depth 0 score " + ("mate 0" if self.board.is_checkmate() else "cp 0")); self.send("bestmove (none)"); return
+        # Orden fijo: la mejor jugada es la que deja peor al rival
+        ranked = sorted(moves, key=lambda m: self.child_score(m))
+        start = time.monotonic(); depth = 0; stopped = False
+        max_depth = depth_limit or self.args.max_depth
+        while depth < max_depth and not stopped:
+            if self.args.latency: time.sleep(self.args.latency)
+            depth += 1
+            elapsed = time.monotonic() - start; nodes = depth * 1000
+            for k, move in enumerate(ranked[:self.multipv], 1):
+                child = self.child_score(move)
+                score = "mate 1" if child == MATED else f"cp {-child + self.args.drift * depth}"
+                self.send(f"info depth {depth} seldepth {depth} multipv {k} score {score} nodes {nodes} nps {int(nodes / max(elapsed, 1e-3))} time {int(elapsed * 1000)} pv {move.uci()}")
+            if movetime is not None and (time.monotonic() - start) * 1000 >= movetime: break
+            # 'go infinite' no termina hasta recibir 'stop' (o hasta --max-depth si no llega)
+            while not self.lines.empty():
+                if self.lines.queue[0] == "stop": self.lines.get(); stopped = True; break
+                if self.lines.queue[0] != "isready": break
+                self.lines.get(); self.send("readyok")
+            if infinite and depth >= max_depth and not stopped:
+                while self.lines.get() != "stop": pass
+                stopped = True
+        elapsed = time.monotonic() - start
+        if self.args.log:
+            with open(self.args.log, "a") as f: f.write(f"go {elapsed:.6f} {depth}\n")
+        self.send(f"bestmove {ranked[0].uci()}")
+
+    def child_score(self, move):
+        self.board.push(move)
+        try: return position_score(self.board, self.args.score, self.args.material)
+        finally: self.board.pop()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Motor UCI falso para tests y benchmarks")
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos por iteración de profundidad")
+    parser.add_argument("--max-depth", type=int, default=20, help="Profundidad máxima sin 'go depth'")
+    parser.add_argument("--score", type=int, default=None, help="Evaluación fija en cp (por defecto, derivada de la posición)")
+    parser.add_argument("--material", action="store_true", help="Evaluar por material (con ruido pequeño) en lugar del hash")
+    parser.add_argument("--drift", type=int, default=0, help="Cp que cambia la evaluación por cada ply de profundidad")
+    parser.add_argument("--startup", type=float, default=0.0, help="Segundos de arranque antes de 'uciok'")
+    parser.add_argument("--log", default=None, help="Fichero donde anotar cada búsqueda")
+    return parser.parse_args(argv)
+
+def read_log(path):
+    """Búsquedas anotadas con --log: lista de (segundos, profundidad)"""
+    try:
+        with open(path) as f: return [(float(p[1]), int(p[2])) for p in (line.split() for line in f) if p and p[0] == "go"]
+    except FileNotFoundError: return []
+
+if __name__ == "__main__":
+    FakeEngine(parse_args()).serve()
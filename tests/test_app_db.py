@@ -23,6 +23,15 @@ def test_app_db_puzzle_stats(app_db):
     app_db.save_puzzle_status("p1", "success")
     stats = app_db.get_all_puzzle_stats()
     assert stats["p1"] == "success"
+    assert app_db.get_puzzle_summary() == {"total": 1, "success": 1, "fail": 0}
+    app_db.save_puzzle_status("p2", "fail"); app_db.save_puzzle_status("p1", "fail")
+    frame = app_db.get_puzzle_stats_frame()
+    assert frame.schema == {"PuzzleId": pl.String, "status": pl.String} and dict(frame.iter_rows()) == {"p1": "fail", "p2": "fail"}
+    # Entre guardados el progreso no se vuelve a leer de SQLite
+    assert app_db.get_puzzle_stats_frame() is frame
+    app_db.save_puzzle_status("p3", "success")
+    assert dict(app_db.get_puzzle_stats_frame().iter_rows()) == {"p1": "fail", "p2": "fail", "p3": "success"}
+    assert app_db.get_puzzle_summary() == {"total": 3, "success": 1, "fail": 2}
 
 def test_app_db_tactical_elo(app_db):
     app_db.set_tactical_elo(1500)
@@ -54,3 +63,66 @@ def test_app_db_error_handling(tmp_path):
     manager.save_opening_stats("path", "hash", pl.DataFrame(), None)
     res, ev = manager.get_opening_stats("path", "hash")
     assert res is None
+
+def test_app_db_fingerprint_invalidation(app_db, tmp_path):
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    df = pl.DataFrame({"uci": ["e2e4"], "c": [1]})
+    app_db.save_opening_stats(db_path, "h1", df, 0.3)
+    assert app_db.get_opening_stats(db_path, "h1")[0] is not None
+    
+    # Reescribir la base (como tras un append) invalida la caché
+    pl.DataFrame({"id": [1, 2]}).write_parquet(db_path)
+    res, ev = app_db.get_opening_stats(db_path, "h1")
+    assert res is None and ev is None
+
+def test_app_db_purge_stale(app_db, tmp_path):
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    app_db.save_opening_stats(db_path, "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    pl.DataFrame({"id": [1, 2, 3]}).write_parquet(db_path)
+    assert app_db.purge_stale_opening_stats(db_path) == 1
+
+def test_app_db_cache_bundle_roundtrip(app_db, tmp_path):
+    server_path = str(tmp_path / "server" / "base.parquet")
+    os.makedirs(os.path.dirname(server_path))
+    pl.DataFrame({"id": [1, 2]}).write_parquet(server_path)
+    app_db.save_opening_stats(server_path, 123, pl.DataFrame({"uci": ["e2e4"], "c": [2]}), 0.25)
+    bundle = str(tmp_path / "bundle.parquet")
+    # Una entrada antigua sin huella no viaja en el bundle
+    with app_db.get_connection() as conn:
+        conn.execute("INSERT INTO opening_cache (db_path, pos_hash, stats_json) VALUES (?, '456', '[]')", (server_path,))
+    assert app_db.export_opening_cache(server_path, bundle) == 1
+    assert pl.read_parquet(bundle)["pos_hash"].to_list() == [123]
+    
+    # Otra máquina: misma base copiada en otra ruta
+    laptop_path = str(tmp_path / "laptop.parquet")
+    import shutil; shutil.copy(server_path, laptop_path)
+    laptop_db = AppDBManager(str(tmp_path / "laptop.db"))
+    assert laptop_db.import_opening_cache(bundle, laptop_path) == 1
+    df, ev = laptop_db.get_opening_stats(laptop_path, 123)
+    assert df["c"][0] == 2 and ev == 0.25
+    
+    # Una base distinta no acepta el bundle
+    other_path = str(tmp_path / "other.parquet")
+    pl.DataFrame({"id": [7]}).write_parquet(other_path)
+    assert laptop_db.import_opening_cache(bundle, other_path) == 0
+
+def test_app_db_engine_evals(app_db):
+    import chess
+    import chess.engine
+    board = chess.Board(); board.push_uci("e2e4")
+    assert app_db.get_engine_eval(board) is None
+    info = {"score": chess.engine.PovScore(chess.engine.Cp(-30), chess.BLACK), "depth": 18, "pv": [chess.Move.from_uci("c7c5")], "nodes": 1000}
+    app_db.save_engine_eval(board, info)
+    cached = app_db.get_engine_eval(board, min_depth=18)
+    assert cached["score"].white() == chess.engine.Cp(30) and cached["pv"] == info["pv"] and cached["nodes"] == 1000
+    assert app_db.get_engine_eval(board, min_depth=20) is None
+    # Una búsqueda menos profunda no pisa a la guardada; una más profunda sí
+    app_db.save_engine_eval(board, {**info, "depth": 10, "score": chess.engine.PovScore(chess.engine.Mate(3), chess.WHITE)})
+    assert app_db.get_engine_eval(board)["depth"] == 18
+    app_db.save_engine_eval(board, {**info, "depth": 22, "score": chess.engine.PovScore(chess.engine.Mate(3), chess.WHITE)})
+    assert app_db.get_engine_eval(board)["score"].white() == chess.engine.Mate(3)
+    # El EPD protege frente a colisiones de la clave Zobrist
+    with app_db.get_connection() as conn: conn.execute("UPDATE engine_evals SET epd = 'otra'")
+    assert app_db.get_engine_eval(board) is None
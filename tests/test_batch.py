@@ -0,0 +1,97 @@
+import os
+import pytest
+from unittest.mock import MagicMock
+import chess
+import chess.engine
+import polars as pl
+from src.core.batch import annotate_database, GameAnnotator
+
+def _mock_pool(fail_after=None):
+    engine = MagicMock(); calls = []
+    def analyse(board, limit):
+        calls.append(board.fen())
+        if fail_after is not None and len(calls) > fail_after: raise chess.engine.EngineTerminatedError("crash")
+        # Las blancas regalan 3 peones en su segunda jugada
+        return {"score": chess.engine.PovScore(chess.engine.Cp(-300 if len(board.move_stack) >= 3 else 20), chess.WHITE), "depth": 1}
+    engine.analyse.side_effect = analyse
+    pool = MagicMock(); pool.lease.return_value.__enter__.return_value = engine
+    return pool, calls
+
+@pytest.fixture
+def games(tmp_path):
+    path = tmp_path / "games.parquet"
+    pl.DataFrame({"id": [1, 2, 3], "full_line": ["e2e4 e7e5 d1h5", "d2d4 d7d5", "f2f3 e7e5 g2g4 d8h4"]}).write_parquet(path)
+    return path
+
+def test_game_annotator_stats():
+    pool, _ = _mock_pool()
+    row = GameAnnotator("sf", depth=1, pool=pool).annotate(7, "e2e4 e7e5 d1h5")
+    assert row["id"] == 7 and row["evals"] == [20, 20, 20, -300]
+    assert row["w_blunders"] == 1 and row["b_blunders"] == 0 and row["w_acpl"] == 160
+
+def test_annotate_database_resumes(games, tmp_path):
+    out = str(tmp_path / "evals.parquet")
+    # Primera ejecución: el motor cae en el segundo lote; el primero queda guardado como parte
+    pool, calls = _mock_pool(fail_after=4)
+    with pytest.raises(chess.engine.EngineTerminatedError):
+        annotate_database(str(games), out, "sf", depth=1, workers=1, batch_size=1, pool=pool)
+    assert os.path.exists(out + ".parts/part_000000.parquet") and not os.path.exists(out)
+
+    pool, calls = _mock_pool()
+    assert annotate_database(str(games), out, "sf", depth=1, workers=2, batch_size=1, pool=pool) == 3
+    assert len(calls) == 3 + 4 # solo se analizan las partidas 2 y 3; el mate final no pasa por el motor
+    df = pl.read_parquet(out).sort("id")
+    assert df["id"].to_list() == [1, 2, 3] and df.schema["evals"] == pl.List(pl.Int16)
+    assert df["evals"][2].to_list()[-1] == -2000 and not os.path.exists(out + ".parts")
+
+def test_annotate_database_rejects_foreign_parts(games, tmp_path):
+    out = str(tmp_path / "evals.parquet"); os.makedirs(out + ".parts")
+    with open(out + ".parts/manifest.json", "w") as f: f.write('{"source": "otra", "depth": 1, "batch_size": 1}')
+    with pytest.raises(ValueError):
+        annotate_database(str(games), out, "sf", depth=1, batch_size=1, pool=_mock_pool()[0])
+
+def test_puzzle_verifier_checks_uniqueness_and_rates(tmp_path):
+    from src.core.batch import PuzzleVerifier
+    from src.core.engine_pool import EnginePool
+    from tests.fake_uci_engine import engine_command
+    pool = EnginePool()
+    try:
+        verifier = PuzzleVerifier(engine_command(material=True), depth=4, pool=pool)
+        base = {"PuzzleId": "x", "Rating": 1500, "Popularity": 0, "OpeningTags": ""}
+        mate = verifier.verify({**base, "FEN": "r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 3 3", "Moves": "g8f6 h5f7", "Themes": "mate mateIn1"})
+        assert mate["Moves"] == "g8f6 h5f7" and mate["Themes"] == "mate mateIn1 oneMove" and 400 <= mate["Rating"] <= 3000
+        hanging = verifier.verify({**base, "FEN": "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2", "Moves": "d8g5 f3g5", "Themes": "hangingPiece"})
+        assert hanging["Moves"] == "d8g5 f3g5" and hanging["Themes"] == "crushing hangingPiece oneMove"
+        # La jugada de la partida no es la del motor: se descarta
+        assert verifier.verify({**base, "FEN": "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2", "Moves": "d8g5 f3e5", "Themes": "hangingPiece"}) is None
+        # Sin ventaja decisiva ni jugada única (evaluación plana) tampoco hay puzzle
+        flat = PuzzleVerifier(engine_command(score=0), depth=2, pool=pool)
+        assert flat.verify({**base, "FEN": "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2", "Moves": "d8g5 f3g5", "Themes": "hangingPiece"}) is None
+    finally: pool.shutdown()
+
+def test_verify_puzzles_resumes_and_writes_lichess_schema(tmp_path):
+    from src.core.batch import verify_puzzles
+    from src.core.engine_pool import EnginePool
+    from src.core.puzzle_generator import generate_puzzles
+    from src.core.puzzle_manager import PuzzleManager
+    from tests.fake_uci_engine import engine_command, read_log
+    lines = ["e2e4 e7e5 f1c4 b8c6 d1h5 g8f6 h5f7", "e2e4 e7e5 g1f3 d8g5 f3g5 f8e7", "e2e4 e7e5 g1f3 d8g5 f3e5"] * 3
+    db = str(tmp_path / "games.parquet"); pl.DataFrame({"id": list(range(9)), "full_line": lines, "result": ["1-0"] * 9}).write_parquet(db)
+    candidates = str(tmp_path / "candidates.parquet"); assert generate_puzzles(db, candidates, workers=1) == 6
+    out = str(tmp_path / "verified.parquet"); log = str(tmp_path / "engine.log"); pool = EnginePool()
+    engine = engine_command(material=True, log=log)
+    def crash(done, total):
+        if done >= 4: raise KeyboardInterrupt
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            verify_puzzles(candidates, out, engine, depth=3, workers=1, batch_size=2, pool=pool, progress_callback=crash)
+        first_run = len(read_log(log))
+        assert len(os.listdir(out + ".parts")) == 3 and not os.path.exists(out)
+        assert verify_puzzles(candidates, out, engine, depth=3, workers=2, batch_size=2, pool=pool) == 6
+    finally: pool.shutdown()
+    # Solo se analiza el último lote pendiente
+    assert len(read_log(log)) - first_run < first_run
+    manager = PuzzleManager(out)
+    assert manager.is_sorted and "oneMove" in manager.themes and not os.path.exists(out + ".parts")
+    df = pl.read_parquet(out)
+    assert df.columns[:7] == ["PuzzleId", "FEN", "Moves", "Rating", "Popularity", "Themes", "OpeningTags"] and "ThemeMask0" in df.columns
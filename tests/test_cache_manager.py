@@ -0,0 +1,73 @@
+import pytest
+import polars as pl
+from src.core.app_db import AppDBManager
+from src.core.cache_manager import CacheManager
+
+@pytest.fixture
+def app_db(tmp_path):
+    return AppDBManager(str(tmp_path / "cache.db"))
+
+def test_cache_manager_stats(app_db, tmp_path):
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    app_db.save_opening_stats(db_path, "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    app_db.get_opening_stats(db_path, "h1")
+    app_db.get_opening_stats(db_path, "h2")
+    
+    st = CacheManager(app_db).get_stats()
+    assert st["entries"] == 1 and st["databases"] == 1
+    assert st["hits"] == 1 and st["misses"] == 1
+    assert st["hit_rate"] == 0.5
+    assert st["file_bytes"] > 0
+
+def test_cache_manager_orphans(app_db, tmp_path):
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    app_db.save_opening_stats(db_path, "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    app_db.save_opening_stats(str(tmp_path / "borrada.parquet"), "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    
+    assert CacheManager(app_db).remove_orphans() == 1
+    assert app_db.get_opening_stats(db_path, "h1")[0] is not None
+
+def test_cache_manager_lru_budget(app_db, tmp_path):
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    big = pl.DataFrame({"uci": ["e2e4"] * 20000, "c": list(range(20000))})
+    for i in range(4): app_db.save_opening_stats(db_path, f"h{i}", big)
+    app_db.get_opening_stats(db_path, "h0") # h0 pasa a ser la más reciente
+    
+    manager = CacheManager(app_db, budget_mb=1)
+    assert manager.enforce_budget() > 0
+    assert app_db.get_opening_stats(db_path, "h0")[0] is not None
+    assert app_db.get_opening_stats(db_path, "h1")[0] is None
+    assert manager.get_stats()["cache_bytes"] <= 1024 * 1024
+    
+    manager.compact()
+    with app_db.get_connection() as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+def test_settings_maintenance_runs_in_background(app_db, tmp_path):
+    from PySide6.QtWidgets import QApplication, QWidget
+    from src.ui.settings_dialog import SettingsDialog
+    app = QApplication.instance() or QApplication([])
+    app_db.save_opening_stats(str(tmp_path / "borrada.parquet"), "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    manager = CacheManager(app_db, budget_mb=512); window = QWidget()
+    dialog = SettingsDialog({"color_light": "#eee", "color_dark": "#888", "cache_budget_mb": 512}, window, cache_manager=manager)
+    dialog.spin_cache_budget.setValue(64); dialog.run_cache_maintenance()
+    worker = dialog.maintenance_worker
+    assert not dialog.btn_maintenance.isEnabled() and worker.parent() is window and worker.wait(10000)
+    app.processEvents(); dialog.reject()
+    # La pasada usa el presupuesto del diálogo, pero cancelar no lo deja configurado
+    assert worker.budget_mb == 64 and manager.budget_mb == 512 and manager.get_stats()["entries"] == 0
+    assert dialog.btn_maintenance.isEnabled()
+
+def test_cache_counters_from_many_threads(app_db, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    db_path = str(tmp_path / "base.parquet")
+    pl.DataFrame({"id": [1]}).write_parquet(db_path)
+    app_db.save_opening_stats(db_path, "h1", pl.DataFrame({"uci": ["e2e4"], "c": [1]}))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: app_db.get_opening_stats(db_path, "h1" if i % 2 else "h2"), range(200)))
+    assert app_db.get_cache_counters() == (100, 100)
+    st = CacheManager(app_db).get_stats()
+    assert st["hits"] == 100 and st["misses"] == 100
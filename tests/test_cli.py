@@ -29,3 +29,23 @@ def test_cli_not_found():
         with pytest.raises(SystemExit) as e:
             main()
         assert e.value.code == 1
+
+def test_cli_export_cache(tmp_path):
+    input_file = tmp_path / "base.parquet"
+    input_file.touch()
+    output_file = tmp_path / "bundle.parquet"
+    
+    with patch('src.core.app_db.AppDBManager') as mock_db:
+        with patch('sys.argv', ['fa-chess-cli', str(input_file), str(output_file), '--export-cache', '--app-db', str(tmp_path / "app.db")]):
+            main()
+            mock_db.return_value.export_opening_cache.assert_called_once_with(str(input_file), str(output_file))
+
+def test_cli_book(tmp_path):
+    input_file = tmp_path / "base.parquet"
+    input_file.touch()
+    output_file = tmp_path / "book.bin"
+    
+    with patch('src.cli.build_polyglot_book', return_value=10) as mock_book:
+        with patch('sys.argv', ['fa-chess-cli', str(input_file), str(output_file), '--book', '--book-ply', '12', '--book-min', '3']):
+            main()
+            mock_book.assert_called_once_with(str(input_file), str(output_file), max_ply=12, min_count=3)
@@ -46,3 +46,33 @@ def test_convert_pgn_to_parquet(tmp_path):
     df = pl.read_parquet(parquet_path)
     assert df.height == 1
     assert df["white"][0] == "W"
+
+def test_build_polyglot_book(tmp_path):
+    import io
+    import chess
+    import chess.pgn
+    import chess.polyglot
+    from src.converter import build_polyglot_book
+    games = [("1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. O-O", "1-0"), ("1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. O-O", "1/2-1/2"),
+             ("1. e4 c5", "0-1"), ("1. d4 d5", "1-0"), ("1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. Ng5", "0-1")]
+    rows = [extract_game_data(i, chess.pgn.read_game(io.StringIO(f'[Result "{r}"]\n\n{m} {r}'))) for i, (m, r) in enumerate(games)]
+    parquet_path = tmp_path / "games.parquet"; book_path = tmp_path / "book.bin"
+    pl.DataFrame(rows, schema=GAME_SCHEMA).write_parquet(parquet_path)
+    
+    # run_rows diminuto para forzar varios tramos y varios rangos de fusión
+    n = build_polyglot_book(str(parquet_path), str(book_path), max_ply=7, min_count=1, batch_size=2, run_rows=8)
+    assert n > 0 and os.path.getsize(book_path) == n * 16
+    
+    with chess.polyglot.open_reader(str(book_path)) as reader:
+        root = {e.move.uci(): e.weight for e in reader.find_all(chess.Board(), minimum_weight=0)}
+        # Blancas: e4 -> 1 victoria + 1 tablas + 0 = 3; d4 -> 1 victoria = 2
+        assert root == {"e2e4": 3, "d2d4": 2}
+        board = chess.Board()
+        for san in ["e4", "e5", "Nf3", "Nc6", "Bc4", "Nf6"]: board.push_san(san)
+        moves = {e.move: e.weight for e in reader.find_all(board, minimum_weight=0)}
+        assert moves[chess.Move.from_uci("e1g1")] == 3 and moves[chess.Move.from_uci("f3g5")] == 0
+    
+    # Con min_count se descartan las jugadas poco frecuentes
+    build_polyglot_book(str(parquet_path), str(book_path), max_ply=7, min_count=2)
+    with chess.polyglot.open_reader(str(book_path)) as reader:
+        assert [e.move.uci() for e in reader.find_all(chess.Board(), minimum_weight=0)] == ["e2e4"]
@@ -81,3 +81,41 @@ def test_db_manager_delete_db_file(db_manager):
     db_manager.delete_database_from_disk("to_delete.parquet")
     assert not os.path.exists(path)
     assert "to_delete.parquet" not in db_manager.dbs
+
+def test_db_manager_edits_keep_plan_constant(db_manager, tmp_path):
+    path = str(tmp_path / "edits.parquet")
+    rows = [{"id": i, "white": f"W{i}", "black": "B", "w_elo": 0, "b_elo": 0, "result": "*", "date": "D", "event": "E", "site": "S", "line": "", "full_line": "", "fens": []} for i in range(10)]
+    pl.DataFrame(rows, schema=GAME_SCHEMA).write_parquet(path)
+    name = db_manager.load_parquet(path); db_manager.set_readonly(name, False)
+
+    def edit(first, last):
+        for i in range(first, last):
+            db_manager.add_game(name, dict(rows[0], id=100 + i, white=f"N{i}"))
+            db_manager.delete_game(name, 100 + i - 1 if i % 2 else i % 10)
+
+    edit(0, 4); plan = db_manager.get_current_view().explain(optimized=False).count("\n")
+    edit(4, 300)
+    # Cientos de ediciones no añaden nodos al plan: solo crecen el búfer y el conjunto de borrados
+    assert db_manager.get_current_view().explain(optimized=False).count("\n") == plan
+    expected = set(range(10)) - {0, 2, 4, 6, 8} | {100 + i for i in range(300) if i % 2}
+    assert db_manager.get_active_count() == len(expected)
+    assert db_manager.get_game_by_id(name, 101)["white"] == "N1" and db_manager.get_game_by_id(name, 102) is None
+
+    db_manager.sort_active_db("id", True); db_manager.sort_active_db("id", False)
+    assert db_manager.get_active_df()["id"][0] == 1
+    db_manager.filter_db({"white": "N"}); db_manager.delete_filtered_games()
+    assert db_manager.get_active_count() == 5 and db_manager.appended[name].is_empty()
+
+    assert db_manager.save_active_db() and not db_manager.appended and not db_manager.deleted
+    assert pl.read_parquet(path)["id"].to_list() == [1, 3, 5, 7, 9]
+
+def test_db_manager_readd_after_delete_replaces_disk_row(db_manager, tmp_path):
+    path = str(tmp_path / "readd.parquet")
+    row = {"id": 1, "white": "Viejo", "black": "B", "w_elo": 0, "b_elo": 0, "result": "*", "date": "D", "event": "E", "site": "S", "line": "", "full_line": "", "fens": []}
+    pl.DataFrame([row, dict(row, id=2)], schema=GAME_SCHEMA).write_parquet(path)
+    name = db_manager.load_parquet(path)
+    db_manager.delete_game(name, 1); db_manager.add_game(name, dict(row, white="Nuevo"))
+    # Solo queda la partida añadida, no vuelve la del disco
+    assert db_manager.get_active_count() == 2 and db_manager.get_game_by_id(name, 1)["white"] == "Nuevo"
+    db_manager.delete_game(name, 1)
+    assert db_manager.get_active_count() == 1 and db_manager.get_game_by_id(name, 1) is None
@@ -0,0 +1,90 @@
+import time
+import chess
+from PySide6.QtCore import Qt
+from src.core.engine_pool import EnginePool
+from src.core.engine_scheduler import EngineScheduler
+from src.core.engine_worker import TreeScannerWorker, FullAnalysisWorker
+from src.core.workers import RefutationWorker
+from tests.fake_uci_engine import engine_command, position_score, read_log
+
+def test_tree_scanner_against_fake_engine(tmp_path):
+    log = str(tmp_path / "engine.log"); pool = EnginePool()
+    moves = [m.uci() for m in chess.Board().legal_moves]
+    worker = TreeScannerWorker(engine_command(log=log), chess.STARTING_FEN, moves, depth=6, pool=pool, multipv=8, scheduler=EngineScheduler(2))
+    results = {}; worker.eval_ready.connect(lambda u, s: results.__setitem__(u, s))
+    try: worker.run()
+    finally: pool.shutdown()
+    # 20 jugadas en lotes MultiPV de 8: tres búsquedas desde la posición padre
+    assert set(results) == set(moves) and len(read_log(log)) == 3
+    board = chess.Board(); board.push_uci("e2e4")
+    assert results["e2e4"] == f"{position_score(board) * (1 if board.turn else -1) / 100:+.2f}"
+
+def test_full_analysis_against_fake_engine(tmp_path):
+    log = str(tmp_path / "engine.log"); pool = EnginePool()
+    moves = [chess.Move.from_uci(u) for u in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5"]]
+    worker = FullAnalysisWorker(moves, depth=4, engine_path=engine_command(log=log), pool=pool, engines=2, scheduler=EngineScheduler(2))
+    results = {}
+    worker.analysis_result.connect(lambda idx, val: results.__setitem__(idx, val), Qt.DirectConnection)
+    try: worker.run()
+    finally: pool.shutdown()
+    board = chess.Board(); expected = {}
+    for i in range(len(moves) + 1):
+        # Evaluación del blanco: la del mejor hijo vista desde el bando que mueve
+        best = min(position_score(_child(board, m)) for m in board.legal_moves)
+        expected[i] = -best if board.turn == chess.WHITE else best
+        if i < len(moves): board.push(moves[i])
+    assert results == expected
+    assert [depth for _, depth in read_log(log)] == [4] * 6 and pool.spawned <= 2
+
+def test_refutation_against_fake_engine():
+    pool = EnginePool()
+    board = chess.Board(); board.push_uci("f2f3")
+    worker = RefutationWorker(engine_command(score=0), board.fen(), pool=pool, scheduler=EngineScheduler(1))
+    results = []; worker.finished.connect(lambda uci, msg: results.append((uci, msg)))
+    try: worker.run()
+    finally: pool.shutdown()
+    assert results and chess.Move.from_uci(results[0][0]) in board.legal_moves
+
+def _child(board, move):
+    child = board.copy(stack=False); child.push(move)
+    return child
+
+def test_bench_harness_runs():
+    from tests.bench_engine import Bench
+    bench = Bench(latency=0.0, depth=2, engines=2)
+    bench.run(repeat=1)
+    rows = {name: (n, units) for name, _, n, _, _, units in bench.rows}
+    assert rows["árbol MultiPV (frío)"] == (3, 20) and rows["análisis 2 motores (frío)"] == (41, 41)
+    assert len(bench.live_latency) == 20
+
+def test_full_analysis_time_budget_deepens_swings(tmp_path):
+    log = str(tmp_path / "engine.log"); pool = EnginePool()
+    moves = [chess.Move.from_uci(u) for u in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5", "a7a6", "b5a4", "g8f6"]]
+    worker = FullAnalysisWorker(moves, engine_path=engine_command(log=log, latency=0.002, max_depth=60), pool=pool, engines=1, scheduler=EngineScheduler(1),
+                                time_budget=1.0, min_depth=2, depth_step=2)
+    passes = []
+    worker.pass_finished.connect(lambda n, evals: passes.append((n, evals)), Qt.DirectConnection)
+    t0 = time.monotonic()
+    try: worker.run()
+    finally: pool.shutdown()
+    assert time.monotonic() - t0 < 2.0
+    # Primera pasada: todas las posiciones a profundidad mínima; después solo las de mayor oscilación, cada vez más hondo
+    searches = read_log(log)
+    assert [d for _, d in searches[:9]] == [2] * 9 and len(passes) >= 3
+    assert [n for n, _ in passes] == list(range(1, len(passes) + 1)) and all(len(e) == 9 for _, e in passes)
+    assert max(d for _, d in searches) >= 6 and len(searches) < 9 * len(passes)
+
+def test_full_analysis_time_budget_keeps_deeper_eval():
+    moves = [chess.Move.from_uci(u) for u in ["e2e4", "e7e5"]]
+    worker = FullAnalysisWorker(moves, engine_path="sf", pool=EnginePool(), engines=1, scheduler=EngineScheduler(1), time_budget=5.0, min_depth=6)
+    # Segunda pasada: la re-búsqueda de la posición 0 se corta a profundidad 3 y la de la 1 llega más hondo
+    rounds = iter([[(0, 40, 6), (1, -10, 6), (2, 15, 6)], [(0, 300, 3), (1, 25, 8)]])
+    def chunks(*args):
+        result = next(rounds, None)
+        if result is None: worker.running = False; return []
+        return result
+    passes = []
+    worker.pass_finished.connect(lambda n, evals: passes.append(evals), Qt.DirectConnection)
+    worker._run_chunks = chunks
+    worker.run()
+    assert passes[:2] == [[40, -10, 15], [40, 25, 15]]
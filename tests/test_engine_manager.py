@@ -0,0 +1,125 @@
+import time
+import threading
+import pytest
+import chess
+from PySide6.QtCore import Qt
+from src.core.engine_manager import EngineManager
+from src.core.engine_worker import EngineWorker
+from tests.fake_uci_engine import engine_command
+
+@pytest.fixture
+def fake_engine():
+    return engine_command(score=0, drift=1, max_depth=10000)
+
+@pytest.fixture
+def manager():
+    m = EngineManager(max_idle=2)
+    yield m
+    m.shutdown()
+
+def test_manager_reuses_engine(manager, fake_engine):
+    async def job():
+        async with manager.lease(fake_engine, {"Hash": 32}) as engine:
+            info = await engine.analyse(chess.Board(), chess.engine.Limit(depth=3))
+        return engine, info["depth"]
+    first, depth = manager.submit(job()).result(10)
+    second, _ = manager.submit(job()).result(10)
+    assert first is second and depth == 3 and manager.spawned == 1 and manager.idle_count(fake_engine) == 1
+
+def test_manager_and_pool_share_engines(manager, fake_engine):
+    # Un worker bloqueante y el análisis en vivo se prestan el mismo proceso, que corre en el bucle del gestor
+    with manager.pool.lease(fake_engine, {"Hash": 32}) as simple:
+        assert simple.analyse(chess.Board(), chess.engine.Limit(depth=2))["depth"] == 2
+    async def job():
+        async with manager.lease(fake_engine, {"Hash": 32}) as engine: return engine
+    assert manager.submit(job()).result(10) is simple.protocol and simple.protocol.loop is manager.loop
+    assert manager.spawned == 1 and manager.idle_count(fake_engine) == 1
+    assert not any(t.name.startswith("SimpleEngine") for t in threading.enumerate())
+
+def test_engine_worker_coalesces_updates(manager, fake_engine):
+    worker = EngineWorker(engine_path=fake_engine, depth_limit=100, manager=manager, fps=10, multipv=2)
+    frames, lines, done = [], [], threading.Event()
+    # Las señales salen del hilo del bucle asyncio: conexión directa para recogerlas sin bucle de eventos
+    worker.info_updated.connect(lambda e, b, m: (frames.append(e), e.startswith("d:100") and done.set()), Qt.DirectConnection)
+    worker.lines_updated.connect(lines.append, Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    assert done.wait(10)
+    worker.stop(); assert worker.wait(10) and not worker.isRunning()
+    # 200 infos llegan de golpe: muy pocos fotogramas y el último con la búsqueda completa
+    assert len(frames) < 10 and frames[-1].startswith("d:100 |") and frames[-1].endswith("| +1.00")
+    assert len(lines[-1]) == 2 and lines[-1][0][1] != lines[-1][1][1]
+
+def test_engine_worker_preempts_on_new_position(manager, fake_engine):
+    worker = EngineWorker(engine_path=fake_engine, depth_limit=0, manager=manager, fps=0)
+    board = chess.Board(); board.push_uci("e2e4"); expected = next(iter(board.legal_moves)).uci()
+    started = threading.Event(); switched = threading.Event()
+    def on_info(eval_str, best, mainline):
+        started.set()
+        if best == expected: switched.set()
+    worker.info_updated.connect(on_info, Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    assert started.wait(10)
+    t0 = time.monotonic(); worker.update_position(board.fen())
+    # La búsqueda infinita se corta en el acto y la nueva posición produce líneas enseguida
+    assert switched.wait(10) and time.monotonic() - t0 < 2
+    worker.stop(); assert worker.wait(10)
+    assert manager.idle_count(fake_engine) == 1
+
+def test_engine_worker_releases_threads_while_idle(manager):
+    from src.core.engine_scheduler import EngineScheduler
+    scheduler = EngineScheduler(1)
+    worker = EngineWorker(engine_path=engine_command(score=0, max_depth=10000), depth_limit=5, manager=manager, fps=0, scheduler=scheduler)
+    done = threading.Event(); busy = []
+    def on_info(e, b, m):
+        busy.append(scheduler.stats()["running"])
+        if e.startswith("d:5"): done.set()
+    worker.info_updated.connect(on_info, Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    assert done.wait(10)
+    # Alcanzado el límite de profundidad el trabajo espera la siguiente posición sin ocupar el presupuesto
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["running"] and time.monotonic() < deadline: time.sleep(0.01)
+    assert busy[0] == 1 and scheduler.stats()["running"] == 0 and worker.isRunning()
+    worker.stop(); assert worker.wait(10)
+
+def test_engine_worker_keeps_sqlite_off_the_loop_thread(manager, tmp_path):
+    from src.core.app_db import AppDBManager
+    app_db = AppDBManager(str(tmp_path / "app.db")); threads = []
+    class SpyDB:
+        def get_engine_eval(self, board, min_depth=0): threads.append(threading.current_thread().name); return app_db.get_engine_eval(board, min_depth)
+        def save_engine_eval(self, board, info): threads.append(threading.current_thread().name); app_db.save_engine_eval(board, info)
+    worker = EngineWorker(engine_path=engine_command(score=0, max_depth=10000), depth_limit=4, manager=manager, fps=0, app_db=SpyDB())
+    done = threading.Event(); worker.info_updated.connect(lambda e, b, m: e.startswith("d:4") and done.set(), Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    assert done.wait(10)
+    deadline = time.monotonic() + 5
+    while len(threads) < 2 and time.monotonic() < deadline: time.sleep(0.01)
+    worker.stop(); assert worker.wait(10)
+    # Consulta y guardado de la caché fuera del hilo del bucle asyncio
+    assert len(threads) == 2 and "EngineManager" not in threads and app_db.get_engine_eval(chess.Board(), 4)
+
+def test_engine_worker_flushes_pending_frame_without_new_info(manager):
+    # Búsqueda infinita: las 5 profundidades llegan de golpe y el motor se queda esperando 'stop'
+    worker = EngineWorker(engine_path=engine_command(score=0, max_depth=5), depth_limit=0, manager=manager, fps=4)
+    frames = []; done = threading.Event()
+    worker.info_updated.connect(lambda e, b, m: (frames.append(e), e.startswith("d:5") and done.set()), Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    # La última profundidad sale al acabar el fotograma (0.25 s) aunque no llegue otra info ni se pare la búsqueda
+    assert done.wait(3) and worker.isRunning() and len(frames) == 2
+    worker.stop(); assert worker.wait(10)
+
+def test_engine_worker_leaves_a_thread_for_queued_jobs(manager):
+    from src.core.engine_scheduler import EngineScheduler, TREE_SCAN
+    scheduler = EngineScheduler(2)
+    worker = EngineWorker(engine_path=engine_command(score=0, max_depth=10000, latency=0.01), threads=2, depth_limit=0, manager=manager, fps=0, scheduler=scheduler)
+    started = threading.Event(); worker.info_updated.connect(lambda e, b, m: started.set(), Qt.DirectConnection)
+    worker.update_position(chess.STARTING_FEN); worker.start()
+    assert started.wait(10) and scheduler.stats()["threads"] == 2
+    # La búsqueda infinita ocupa todo el presupuesto: el escaneo del árbol entra igualmente y el vivo sigue con un hilo
+    deadline = time.monotonic() + 5
+    ticket = scheduler.acquire(TREE_SCAN, 1, "árbol", abort=lambda: time.monotonic() > deadline)
+    assert ticket is not None
+    time.sleep(0.1)
+    assert scheduler.stats() == {"running": 2, "waiting": 0, "threads": 2, "budget": 2} and worker.isRunning()
+    scheduler.release(ticket)
+    worker.stop(); assert worker.wait(10)
@@ -0,0 +1,76 @@
+import pytest
+from unittest.mock import MagicMock, patch
+import chess.engine
+from src.core.engine_pool import EnginePool, get_engine_pool
+
+def _mock_engine(alive=True):
+    engine = MagicMock()
+    engine.returncode.done.return_value = not alive
+    return engine
+
+@pytest.fixture
+def pool():
+    p = EnginePool(max_idle=2)
+    with patch.object(EnginePool, "_reset", return_value=True) as reset:
+        p.reset_mock = reset
+        yield p
+
+def test_lease_reuses_process(pool):
+    engine = _mock_engine()
+    with patch("src.core.engine_pool.EnginePool._spawn", return_value=engine) as popen:
+        with pool.lease("sf", {"Hash": 16}) as e1: pass
+        with pool.lease("sf", {"Hash": 16}) as e2: pass
+        assert e1 is e2 and popen.call_count == 1
+    # Opciones solo se envían cuando cambian; el motor se reinicia en cada devolución
+    engine.configure.assert_called_once_with({"Hash": 16})
+    assert pool.reset_mock.call_count == 2 and pool.idle_count("sf") == 1 and not engine.quit.called
+
+def test_dead_engine_is_respawned(pool):
+    first, second = _mock_engine(), _mock_engine()
+    with patch("src.core.engine_pool.EnginePool._spawn", side_effect=[first, second]) as popen:
+        with pool.lease("sf"): pass
+        first.returncode.done.return_value = True # el proceso muere estando libre
+        with pool.lease("sf") as e: assert e is second
+        assert popen.call_count == 2
+
+def test_engine_error_discards_engine(pool):
+    engine = _mock_engine()
+    with patch("src.core.engine_pool.EnginePool._spawn", return_value=engine):
+        with pytest.raises(chess.engine.EngineTerminatedError):
+            with pool.lease("sf"): raise chess.engine.EngineTerminatedError("crash")
+    assert pool.idle_count() == 0 and engine.quit.called
+
+def test_pool_bounds_idle_and_shutdown(pool):
+    engines = [_mock_engine() for _ in range(3)]
+    with patch("src.core.engine_pool.EnginePool._spawn", side_effect=engines):
+        with pool.lease("sf"), pool.lease("sf"), pool.lease("sf"): pass
+    assert pool.idle_count() == 2 and sum(e.quit.called for e in engines) == 1
+    pool.shutdown()
+    assert pool.idle_count() == 0 and all(e.quit.called for e in engines)
+
+def test_shared_pool_singleton():
+    assert get_engine_pool() is get_engine_pool()
+
+def test_lease_prefers_engine_with_same_options(pool):
+    pool.max_idle = 4
+    small, large = _mock_engine(), _mock_engine()
+    with patch("src.core.engine_pool.EnginePool._spawn", side_effect=[small, large]):
+        with pool.lease("sf", {"Threads": 1, "Hash": 16}), pool.lease("sf", {"Threads": 4, "Hash": 256}): pass
+        # Se alternan trabajos con distinto Hash: cada uno vuelve a su motor y no se reconfigura nada
+        for _ in range(3):
+            with pool.lease("sf", {"Threads": 1, "Hash": 16}) as e: assert e is small
+            with pool.lease("sf", {"Threads": 4, "Hash": 256}) as e: assert e is large
+    small.configure.assert_called_once_with({"Threads": 1, "Hash": 16})
+    large.configure.assert_called_once_with({"Threads": 4, "Hash": 256})
+
+def test_max_idle_follows_thread_budget(pool):
+    from src.core.engine_scheduler import get_engine_scheduler
+    assert get_engine_pool().max_idle == get_engine_scheduler().budget
+    pool.set_max_idle(6)
+    engines = [_mock_engine() for _ in range(6)]
+    with patch("src.core.engine_pool.EnginePool._spawn", side_effect=engines):
+        with pool.lease("sf"), pool.lease("sf"), pool.lease("sf"), pool.lease("sf"), pool.lease("sf"), pool.lease("sf"): pass
+    # Con 6 hilos de presupuesto los 6 motores de un análisis en paralelo quedan libres para el siguiente tramo
+    assert pool.idle_count() == 6 and not any(e.quit.called for e in engines)
+    pool.set_max_idle(2)
+    assert pool.idle_count() == 2 and sum(e.quit.called for e in engines) == 4
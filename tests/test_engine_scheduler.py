@@ -0,0 +1,75 @@
+import time
+import threading
+from src.core.engine_scheduler import EngineScheduler, INTERACTIVE, REFUTATION, TREE_SCAN, BATCH
+
+def _acquire_in_thread(scheduler, priority, order, **kwargs):
+    def run():
+        ticket = scheduler.acquire(priority, **kwargs); order.append(priority)
+        if ticket: time.sleep(0.02); scheduler.release(ticket)
+    t = threading.Thread(target=run); t.start()
+    return t
+
+def _wait_waiting(scheduler, n):
+    deadline = time.monotonic() + 5
+    while scheduler.stats()["waiting"] < n and time.monotonic() < deadline: time.sleep(0.005)
+
+def test_queue_is_served_by_priority():
+    scheduler = EngineScheduler(thread_budget=1)
+    held = scheduler.acquire(BATCH)
+    order = []
+    threads = [_acquire_in_thread(scheduler, BATCH, order)]; _wait_waiting(scheduler, 1)
+    threads.append(_acquire_in_thread(scheduler, TREE_SCAN, order)); _wait_waiting(scheduler, 2)
+    threads.append(_acquire_in_thread(scheduler, REFUTATION, order)); _wait_waiting(scheduler, 3)
+    scheduler.release(held)
+    for t in threads: t.join(5)
+    assert order == [REFUTATION, TREE_SCAN, BATCH]
+    assert scheduler.stats() == {"running": 0, "waiting": 0, "threads": 0, "budget": 1}
+
+def test_checkpoint_yields_and_resumes():
+    scheduler = EngineScheduler(thread_budget=1)
+    batch = scheduler.acquire(BATCH)
+    assert scheduler.checkpoint(batch) # nadie espera: sigue sin ceder
+    order = []
+    t = _acquire_in_thread(scheduler, REFUTATION, order); _wait_waiting(scheduler, 1)
+    # La refutación pasa delante y el lote continúa cuando termina
+    assert scheduler.should_yield(batch) and scheduler.checkpoint(batch)
+    t.join(5)
+    assert order == [REFUTATION] and scheduler.stats()["running"] == 1
+    scheduler.release(batch)
+
+def test_interactive_never_waits_and_oversubscription_yields():
+    scheduler = EngineScheduler(thread_budget=4)
+    batch = scheduler.acquire(BATCH, threads=4)
+    live = scheduler.acquire(INTERACTIVE, threads=8)
+    # Sin esperar, pero con otro trabajo en marcha el análisis en vivo se queda con budget-1 hilos
+    assert live.threads == 3 and scheduler.stats()["threads"] == 7
+    assert scheduler.should_yield(batch) and not scheduler.should_yield(live)
+    # El lote cede y no recupera el turno mientras el análisis en vivo ocupe el presupuesto
+    polls = []
+    assert scheduler.checkpoint(batch, abort=lambda: polls.append(1) or len(polls) > 3) is False
+    scheduler.release(batch)
+    scheduler.release(live)
+    assert scheduler.stats()["threads"] == 0
+
+def test_interactive_shrinks_for_queued_jobs():
+    scheduler = EngineScheduler(thread_budget=4)
+    shrunk = threading.Event()
+    live = scheduler.acquire(INTERACTIVE, threads=4, on_shrink=shrunk.set)
+    assert live.threads == 4 and scheduler.should_yield(live) is False
+    order = []
+    t = _acquire_in_thread(scheduler, TREE_SCAN, order); _wait_waiting(scheduler, 1)
+    # El árbol no cabe: se avisa al análisis en vivo, que pide otro turno y ya sale con un hilo menos
+    assert shrunk.wait(5) and order == []
+    scheduler.release(live); live = scheduler.acquire(INTERACTIVE, threads=4)
+    t.join(5)
+    assert order == [TREE_SCAN] and live.threads == 3
+    scheduler.release(live)
+    assert scheduler.stats()["threads"] == 0
+
+def test_acquire_can_be_aborted_and_reports_queue():
+    scheduler = EngineScheduler(thread_budget=1)
+    events = []; scheduler.queue_changed.connect(lambda r, w, t: events.append((r, w, t)))
+    held = scheduler.acquire(TREE_SCAN)
+    assert scheduler.acquire(BATCH, abort=lambda: True) is None
+    scheduler.release(held)
+    assert (1, 1, 1) in events and events[-1] == (0, 0, 0)
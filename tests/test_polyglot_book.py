@@ -0,0 +1,36 @@
+import chess
+import chess.polyglot
+from src.core.polyglot_book import encode_move, is_castling, to_book_uci
+
+def _hashes(board, uci):
+    key = chess.polyglot.zobrist_hash(board); board.push_uci(uci)
+    return key, chess.polyglot.zobrist_hash(board)
+
+def test_encode_move():
+    assert encode_move("e2e4") == (4 | 3 << 3 | 4 << 6 | 1 << 9)
+    assert encode_move("a7a8q") >> 12 == 4
+
+def test_castling_detected_from_zobrist_delta():
+    key, child = _hashes(chess.Board("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1"), "e1g1")
+    assert is_castling("e1g1", key, child) and to_book_uci("e1g1", key, child) == "e1h1"
+    key, child = _hashes(chess.Board("r3k2r/8/8/8/8/8/8/R3K2R b Kkq - 0 1"), "e8c8")
+    assert to_book_uci("e8c8", key, child) == "e8a8"
+    # Una dama en e1 que va a g1 no es un enroque
+    key, child = _hashes(chess.Board("4k3/8/8/8/8/8/7K/4Q3 w - - 0 1"), "e1g1")
+    assert not is_castling("e1g1", key, child)
+
+def test_polyglot_book_stats(tmp_path):
+    import polars as pl
+    from src.core.polyglot_book import PolyglotBook, write_entries
+    key = chess.polyglot.zobrist_hash(chess.Board())
+    df = pl.DataFrame({"key": [key, key], "uci": ["e2e4", "d2d4"], "child": [None, None], "weight": [30, 10]}, schema={"key": pl.UInt64, "uci": pl.String, "child": pl.UInt64, "weight": pl.UInt16})
+    path = tmp_path / "book.bin"
+    with open(path, "wb") as f: write_entries(f, df)
+    
+    book = PolyglotBook(str(path))
+    assert book.name == "book" and len(book) == 2
+    stats = book.get_stats(chess.Board())
+    assert stats["uci"].to_list() == ["e2e4", "d2d4"] and stats["pct"].to_list() == [75.0, 25.0]
+    board = chess.Board(); board.push_uci("e2e4")
+    assert book.get_stats(board).is_empty()
+    book.close()
@@ -0,0 +1,48 @@
+import chess
+import polars as pl
+from src.core.puzzle_generator import find_tactics, generate_puzzles
+from src.core.puzzle_manager import PuzzleManager
+
+SCHOLAR = "e2e4 e7e5 f1c4 b8c6 d1h5 g8f6 h5f7"
+HANGING_QUEEN = "e2e4 e7e5 g1f3 d8g5 f3g5 f8e7"
+QUEEN_TRADE = "e2e4 d7d5 e4d5 d8d5 b1c3 d5d2 d1d2"
+
+def _play(puzzle):
+    board = chess.Board(puzzle["FEN"])
+    for uci in puzzle["Moves"].split(): board.push_uci(uci)
+    return board
+
+def test_find_tactics_mate_and_material():
+    mate = find_tactics(1, SCHOLAR, "1-0")
+    assert [(p["PuzzleId"], p["Moves"], p["Themes"]) for p in mate] == [("gen_1_6", "g8f6 h5f7", "mate mateIn1")]
+    assert _play(mate[0]).is_checkmate()
+    # Sin resultado decisivo no se busca el mate
+    assert find_tactics(1, SCHOLAR, "*") == []
+    material = find_tactics(2, HANGING_QUEEN, "1-0")
+    assert [(p["Moves"], p["Themes"]) for p in material] == [("d8g5 f3g5", "hangingPiece")]
+    assert _play(material[0]).piece_at(chess.G5) == chess.Piece(chess.KNIGHT, chess.WHITE)
+    # Recuperar la dama en la misma casilla es un cambio, no un puzzle
+    assert find_tactics(3, QUEEN_TRADE, "1-0") == []
+
+def test_generate_puzzles_streams_batches_to_parquet(tmp_path):
+    lines = [SCHOLAR, HANGING_QUEEN, QUEEN_TRADE, "", "e2e4 zz"] * 40
+    db = str(tmp_path / "games.parquet")
+    pl.DataFrame({"id": list(range(len(lines))), "full_line": lines, "result": ["1-0"] * len(lines)}).write_parquet(db, row_group_size=16)
+    outputs = {}
+    for workers in (1, 2):
+        out = str(tmp_path / f"puzzles_{workers}.parquet"); seen = []
+        assert generate_puzzles(db, out, workers=workers, batch_size=16, progress_callback=lambda d, t: seen.append((d, t))) == 80
+        assert seen[-1] == (200, 200) and len(seen) == 13
+        outputs[workers] = pl.read_parquet(out).sort("PuzzleId")
+    assert outputs[1].equals(outputs[2])
+    assert outputs[1].schema["Rating"] == pl.Int32 and set(outputs[1]["Themes"]) == {"mate mateIn1", "hangingPiece"}
+    # El fichero se abre como cualquier base de puzzles
+    manager = PuzzleManager(str(tmp_path / "puzzles_2.parquet")).apply_filters(theme="mate")
+    assert manager.count() == 40 and manager.get_random_puzzle()["solution"] == ["h5f7"]
+    assert generate_puzzles(db, str(tmp_path / "few.parquet"), workers=1, max_games=3) == 2
+
+def test_generate_puzzles_without_tactics_writes_nothing(tmp_path):
+    db = str(tmp_path / "games.parquet")
+    pl.DataFrame({"id": [0], "full_line": [QUEEN_TRADE], "result": ["1-0"]}).write_parquet(db)
+    assert generate_puzzles(db, str(tmp_path / "none.parquet"), workers=1) == 0
+    assert not (tmp_path / "none.parquet").exists()
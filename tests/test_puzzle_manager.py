@@ -43,3 +43,135 @@ def test_puzzle_manager_random(puzzle_manager):
     p = puzzle_manager.get_random_puzzle()
     assert p is not None
     assert p["id"] in ["p1", "p2"]
+
+@pytest.fixture
+def sorted_puzzles(tmp_path):
+    from src.converter import convert_lichess_puzzles
+    import random as rnd
+    rng = rnd.Random(7); themes = ["fork", "pin mate", "mate", "endgame fork"]
+    rows = [{"PuzzleId": f"p{i}", "FEN": "fen", "Moves": "e2e4 e7e5", "Rating": rng.randint(600, 2600), "Popularity": 90, "Themes": themes[i % 4], "OpeningTags": ""} for i in range(200)]
+    csv = tmp_path / "puzzles.csv"; pl.DataFrame(rows).write_csv(csv)
+    out = str(tmp_path / "puzzles.parquet")
+    convert_lichess_puzzles(str(csv), out, row_group_size=16)
+    return out, pl.DataFrame(rows)
+
+def test_converted_puzzles_are_sorted_by_rating(sorted_puzzles):
+    path, _ = sorted_puzzles
+    manager = PuzzleManager(path)
+    assert manager.is_sorted and len(manager.row_groups) > 10
+    ratings = pl.read_parquet(path)["Rating"]
+    assert ratings.is_sorted()
+
+def test_puzzle_manager_pages_only_read_rating_range(sorted_puzzles):
+    path, rows = sorted_puzzles
+    manager = PuzzleManager(path)
+    read = []; original = manager.pf.read_row_group
+    manager.pf.read_row_group = lambda i, columns=None: read.append(i) or original(i, columns=columns)
+    manager.apply_filters(min_rating=1200, max_rating=1400)
+    expected = rows.filter(pl.col("Rating").is_between(1200, 1400)).sort("Rating")
+    assert manager.count() == expected.height
+    page = manager.get_page(5, 10)
+    assert page["Rating"].to_list() == expected["Rating"][5:15].to_list()
+    assert set(read) <= set(manager._groups) and len(manager._groups) < len(manager.row_groups) / 2
+    # Con temas y estado el recuento y las páginas siguen saliendo de los mismos row groups
+    manager.set_progress(pl.DataFrame({"PuzzleId": ["p0"], "status": ["fail"]}))
+    manager.apply_filters(min_rating=600, max_rating=2600, theme="fork", status="pending")
+    expected = rows.filter(pl.col("Themes").str.contains("fork") & (pl.col("PuzzleId") != "p0")).sort("Rating")
+    assert manager.count() == expected.height
+    assert manager.get_page(0, 1000)["Rating"].to_list() == expected["Rating"].to_list()
+    manager.apply_filters(status="success")
+    assert manager.count() == 0 and manager.get_page(0, 10).is_empty()
+
+def test_puzzle_progress_is_joined_in_query(sorted_puzzles):
+    path, rows = sorted_puzzles
+    progress = pl.DataFrame({"PuzzleId": ["p1", "p2", "p3", "nope"], "status": ["success", "fail", "success", "fail"]})
+    expected = dict(zip(rows["PuzzleId"], rows["Rating"]))
+    unsorted = path.replace(".parquet", "_old.parquet"); rows.write_parquet(unsorted)
+    for file, sorted_file in ((path, True), (unsorted, False)):
+        manager = PuzzleManager(file).set_progress(progress)
+        assert manager.is_sorted == sorted_file
+        manager.apply_filters(status="success")
+        page = manager.get_page(0, 10)
+        assert manager.count() == 2 and set(page["PuzzleId"]) == {"p1", "p3"} and set(page["status"]) == {"success"}
+        assert page["Rating"].is_sorted() and manager.get_random_puzzle()["id"] in ("p1", "p3")
+        assert manager.apply_filters(status="fail").get_page(0, 10)["PuzzleId"].to_list() == ["p2"]
+        # Sin filtro de estado cada fila lleva el suyo; las no intentadas salen como pendientes
+        page = manager.apply_filters().get_page(0, 500)
+        statuses = dict(zip(page["PuzzleId"], page["status"]))
+        assert statuses["p1"] == "success" and statuses["p2"] == "fail" and statuses["p0"] == "pending"
+        assert dict(zip(page["PuzzleId"], page["Rating"])) == expected
+        assert manager.apply_filters(status="pending").count() == rows.height - 3
+
+def test_theme_bitmask_filter(sorted_puzzles):
+    path, rows = sorted_puzzles
+    manager = PuzzleManager(path)
+    assert manager.themes == ["endgame", "fork", "mate", "pin"]
+    assert pl.read_parquet_schema(path)["ThemeMask0"] == pl.UInt64
+    # Varios temas: bits de la columna de máscara, sin tocar el texto de 'Themes'
+    manager.apply_filters(theme="endgame fork")
+    assert set(manager._filter_columns()) == {"Rating", "ThemeMask0"}
+    expected = rows.filter(pl.col("Themes") == "endgame fork")
+    assert manager.count() == expected.height and set(manager.get_page(0, 500)["PuzzleId"]) == set(expected["PuzzleId"])
+    assert manager.apply_filters(theme="mate").count() == rows.filter(pl.col("Themes").str.contains("mate")).height
+    # Misma semántica que el filtro por texto: subcadena e insensible a mayúsculas
+    for word in ["FORK", "end", "at", "pin Mate"]:
+        expected = rows.filter(pl.all_horizontal(pl.col("Themes").str.contains(f"(?i){w}") for w in word.split()))
+        assert manager.apply_filters(theme=word).count() == expected.height > 0
+        assert "Themes" not in manager._filter_columns()
+    assert manager.apply_filters(theme="zugzwang").count() == 0
+
+def test_random_puzzle_is_uniform_over_filtered_set(sorted_puzzles):
+    import random as rnd
+    path, rows = sorted_puzzles
+    manager = PuzzleManager(path).apply_filters(min_rating=1000, max_rating=2200)
+    candidates = set(rows.filter(pl.col("Rating").is_between(1000, 2200))["PuzzleId"])
+    rng = rnd.Random(1); seen = [manager.get_random_puzzle(rng=rng)["id"] for _ in range(1000)]
+    # Todo el rango es alcanzable, no solo los más fáciles, y ningún puzzle sale muy por encima de lo esperado
+    assert set(seen) <= candidates and len(set(seen)) > 0.9 * len(candidates)
+    assert max(seen.count(p) for p in set(seen)) < 6 * 1000 / len(candidates)
+    hardest = rows.filter(pl.col("PuzzleId").is_in(list(candidates))).sort("Rating")["PuzzleId"][-10:].to_list()
+    assert set(hardest) & set(seen)
+
+def test_random_puzzle_weighted_by_popularity(tmp_path):
+    from src.converter import convert_lichess_puzzles
+    import random as rnd
+    rows = [{"PuzzleId": f"p{i}", "FEN": "fen", "Moves": "e2e4 e7e5", "Rating": 1000 + i, "Popularity": 100 if i == 0 else -100, "Themes": "fork", "OpeningTags": ""} for i in range(20)]
+    csv = tmp_path / "p.csv"; pl.DataFrame(rows).write_csv(csv); out = str(tmp_path / "p.parquet")
+    convert_lichess_puzzles(str(csv), out, row_group_size=4)
+    manager = PuzzleManager(out); rng = rnd.Random(3)
+    seen = [manager.get_random_puzzle(weighted=True, rng=rng)["id"] for _ in range(400)]
+    # p0 pesa 201 frente a 1 de cada uno de los otros 19
+    assert seen.count("p0") > 300
+    assert manager.apply_filters(min_rating=5000).get_random_puzzle() is None
+
+def test_opening_family_filter_uses_index(tmp_path):
+    from src.converter import convert_lichess_puzzles
+    import random as rnd
+    rng = rnd.Random(11)
+    tags = ["Sicilian_Defense Sicilian_Defense_Najdorf_Variation", "Sicilian_Defense", "French_Defense French_Defense_Winawer_Variation", ""]
+    # La francesa solo aparece en los puzzles fáciles
+    rows = [{"PuzzleId": f"p{i}", "FEN": "fen", "Moves": "e2e4 e7e5", "Rating": (r := rng.randint(600, 2600)), "Popularity": 90, "Themes": "fork",
+             "OpeningTags": tags[i % 4] if r < 1200 or i % 4 != 2 else ""} for i in range(300)]
+    csv = tmp_path / "p.csv"; pl.DataFrame(rows).write_csv(csv); out = str(tmp_path / "p.parquet")
+    convert_lichess_puzzles(str(csv), out, row_group_size=16)
+    df = pl.DataFrame(rows)
+    manager = PuzzleManager(out)
+    assert list(manager.openings) == ["Sicilian_Defense", "French_Defense"]
+    assert manager.openings["French_Defense"] == df.filter(pl.col("OpeningTags").str.starts_with("French")).height
+    read = []; original = manager.pf.read_row_group
+    manager.pf.read_row_group = lambda i, columns=None: read.append((i, tuple(columns or ()))) or original(i, columns=columns)
+    manager.apply_filters(opening="French_Defense")
+    expected = df.filter(pl.col("OpeningTags").str.starts_with("French")).sort("Rating")
+    # El recuento sale del índice: solo se lee la columna de familias, y las páginas solo de los grupos con francesas
+    assert manager.count() == expected.height and {cols for _, cols in read} == {("OpeningFamily",)}
+    assert manager.get_page(0, 500)["PuzzleId"].to_list() == expected["PuzzleId"].to_list()
+    assert len(manager._groups) < len(manager.row_groups) / 2
+    # Rango parcial combinado con la familia, una variante (texto) y una familia desconocida
+    manager.apply_filters(min_rating=1000, max_rating=2000, opening="Sicilian_Defense")
+    assert manager.count() == df.filter(pl.col("OpeningTags").str.starts_with("Sicilian") & pl.col("Rating").is_between(1000, 2000)).height
+    assert manager.apply_filters(opening="Sicilian_Defense_Najdorf_Variation").count() == df.filter(pl.col("OpeningTags").str.contains("Najdorf")).height
+    assert manager.apply_filters(opening="Nimzo-Larsen_Attack").count() == 0
+    manager.openings = {"Sicilian_Defense": 10, "Sicilian_Defense_Accelerated": 1, "Queens_Gambit": 30, "Queens_Gambit_Declined": 5}
+    assert manager.family_for_opening("B90: Sicilian: Najdorf") == "Sicilian_Defense" == manager.family_for_opening("B20: Sicilian Defence")
+    assert manager.family_for_opening("D30: Queen's Gambit Declined: Vienna") == "Queens_Gambit_Declined"
+    assert manager.family_for_opening("Posición Inicial") is None
@@ -0,0 +1,65 @@
+import time
+import random
+import pytest
+import polars as pl
+from src.core.app_db import AppDBManager
+from src.core.puzzle_scheduler import PuzzleScheduler, glicko2_update, next_review, RELEARN_INTERVAL
+
+@pytest.fixture
+def training(tmp_path):
+    from src.converter import convert_lichess_puzzles
+    rng = random.Random(5); themes = ["fork", "pin", "mate", "endgame"]
+    rows = [{"PuzzleId": f"p{i}", "FEN": "fen", "Moves": "e2e4 e7e5", "Rating": rng.randint(800, 2200), "Popularity": 90, "Themes": themes[i % 4], "OpeningTags": ""} for i in range(400)]
+    csv = tmp_path / "puzzles.csv"; pl.DataFrame(rows).write_csv(csv)
+    out = str(tmp_path / "puzzles.parquet"); convert_lichess_puzzles(str(csv), out, row_group_size=32)
+    app_db = AppDBManager(str(tmp_path / "app.db")); app_db.set_tactical_elo(1500)
+    return app_db, out, pl.DataFrame(rows)
+
+def test_glicko2_matches_reference_example():
+    # Ejemplo del artículo de Glickman: 1500/200/0.06 contra tres rivales
+    r, rd, vol = glicko2_update(1500, 200, 0.06, [(1400, 30, 1), (1550, 100, 0), (1700, 300, 0)])
+    assert round(r, 1) == 1464.1 and round(rd, 1) == 151.5 and abs(vol - 0.05999) < 1e-4
+
+def test_review_intervals_grow_and_reset_on_fail():
+    now = 1000.0
+    review = next_review(None, 1.0, now)
+    assert review["interval"] == 1.0 and review["due"] == now + 86400
+    review = next_review(review, 1.0, now); review = next_review(review, 1.0, now)
+    assert review["reps"] == 3 and review["interval"] > 3.0
+    hinted = next_review(review, 0.7, now)
+    assert hinted["interval"] < next_review(review, 1.0, now)["interval"]
+    failed = next_review(review, 0.0, now)
+    assert failed["interval"] == RELEARN_INTERVAL and failed["reps"] == 0 and failed["lapses"] == 1 and failed["ease"] < review["ease"]
+
+def test_queue_targets_rating_and_weak_themes(training):
+    app_db, path, rows = training
+    for _ in range(30): app_db.update_theme_stats(["mate"], failed=True); app_db.update_theme_stats(["fork"], failed=False)
+    scheduler = PuzzleScheduler(app_db, queue_size=60, rng=random.Random(2))
+    queue = scheduler.build_queue(path, app_db.get_puzzle_stats_frame())
+    ratings = {p["id"]: p["rating"] for p in queue}
+    window = min(max(scheduler.rating["rd"], 100), 300)
+    assert len(queue) == 60 and len(ratings) == 60
+    assert all(abs(r - 1500) <= window for r in ratings.values())
+    themes = [p["themes"] for p in queue]
+    assert themes.count("mate") > 2 * themes.count("fork")
+    # La cola se guarda en fa-chess.db y la recupera un scheduler nuevo
+    scheduler.set_queue(queue)
+    assert [p["id"] for p in PuzzleScheduler(app_db).queue] == [p["id"] for p in queue]
+
+def test_pop_serves_due_reviews_first_and_records_results(training):
+    app_db, path, _ = training
+    scheduler = PuzzleScheduler(app_db, queue_size=20, rng=random.Random(1))
+    scheduler.set_queue(scheduler.build_queue(path, app_db.get_puzzle_stats_frame()))
+    first = scheduler.pop()
+    assert first and len(scheduler.queue) == 19 and len(app_db.get_puzzle_queue()) == 19 and not scheduler.needs_refill()
+    before = scheduler.rating["rating"]
+    assert scheduler.record(first, 0.0) < before and app_db.get_theme_stats()[first["themes"]] == (1, 1)
+    # El fallo vuelve en 10 minutos y entonces pasa por delante de la cola
+    assert scheduler.pop()["id"] != first["id"]
+    with app_db.get_connection() as conn: conn.execute("UPDATE puzzle_reviews SET due = ?", (time.time() - 1,))
+    assert scheduler.pop()["id"] == first["id"]
+    # Mientras no tenga resultado no se vuelve a servir
+    assert scheduler.pop()["id"] != first["id"]
+    after_fail = scheduler.rating["rating"]
+    assert scheduler.record(first, 1.0) > after_fail and app_db.get_tactical_elo() == round(scheduler.rating["rating"])
+    assert app_db.get_puzzle_review(first["id"])["due"] > time.time() + 3600
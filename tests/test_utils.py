@@ -41,3 +41,12 @@ def test_get_material_diff_complex():
     assert diff[chess.BLACK]['score'] == 1
     assert diff[chess.BLACK]['diffs'][chess.ROOK] == 2
     assert diff[chess.WHITE]['diffs'][chess.QUEEN] == 1
+
+def test_compute_game_stats():
+    from src.core.utils import compute_game_stats
+    # 1.e4 (0) ... las negras pierden 2.50 en su jugada y las blancas 0.50 en la siguiente
+    stats = compute_game_stats([20, 20, 270, 220], 3)
+    assert stats["black"]["blunders"] == 1 and stats["black"]["acpl"] == 250
+    assert stats["white"]["inaccuracies"] == 1 and stats["white"]["acpl"] == 25
+    assert stats["white"]["accuracy"] > stats["black"]["accuracy"]
+    assert compute_game_stats([20], 3) is None
@@ -21,3 +21,17 @@ def test_game_info_header(qapp):
     data = {"white": "P1", "black": "P2", "w_elo": 2000, "b_elo": 1900, "result": "1-0", "event": "E", "date": "D", "site": "S"}
     gh.update_info(data)
     assert "P1" in gh.label.text()
+
+def test_opening_tree_book_mode(qapp):
+    import polars as pl
+    from src.ui.widgets.opening_tree_table import OpeningTreeTable
+    tree = OpeningTreeTable()
+    df = pl.DataFrame({"uci": ["e2e4", "d2d4"], "weight": [30, 10], "pct": [75.0, 25.0]})
+    tree.update_book(df, chess.Board(), "Inicial", next_move_uci="d2d4")
+    assert tree.table.rowCount() == 2 and tree.table.item(0, 1).text() == "e4" and tree.table.item(0, 5).text() == "75.0%"
+    assert tree.table.horizontalHeaderItem(5).text() == "Peso %" and tree.table.horizontalHeaderItem(3).text() == "Peso"
+    tree.update_book(df.clear(), chess.Board(), "Inicial")
+    assert tree.stack.currentIndex() == 2 and tree.label_insufficient.text() == "Fuera de libro"
+    # Al volver a las estadísticas de la base, la columna vuelve a ser la tasa de victorias
+    tree.update_tree(pl.DataFrame({"uci": ["e2e4"], "c": [4], "w": [2], "d": [1], "b": [1], "avg_w_elo": [2000.0], "avg_b_elo": [1900.0]}), chess.Board(), "Inicial")
+    assert tree.table.horizontalHeaderItem(5).text() == "Win %" and tree.table.item(0, 5).text() == "62.5%"
@@ -1,8 +1,10 @@
 import pytest
 from unittest.mock import MagicMock, patch
 import chess
+import chess.engine
 import polars as pl
 import os
+from PySide6.QtCore import Qt
 from src.core.workers import StatsWorker, RefutationWorker, PGNWorker, PGNAppendWorker, CachePopulatorWorker
 from src.core.engine_worker import EngineWorker, TreeScannerWorker, FullAnalysisWorker
 
@@ -32,47 +34,151 @@ def test_pgn_append_worker():
         worker.run()
         assert mock_concat.called
 
-def test_cache_populator_worker():
+def _games_frame(lines, result="1-0"):
+    rows = []
+    for line in lines:
+        board = chess.Board(); hashes = [chess.polyglot.zobrist_hash(board)]
+        for uci in line.split(): board.push_uci(uci); hashes.append(chess.polyglot.zobrist_hash(board))
+        rows.append({"full_line": line, "fens": hashes, "result": result, "w_elo": 2000, "b_elo": 1900})
+    return pl.DataFrame(rows, schema_overrides={"fens": pl.List(pl.UInt64)})
+
+def test_cache_populator_worker(tmp_path):
+    from src.core.app_db import AppDBManager
+    app_db = AppDBManager(str(tmp_path / "app.db"))
+    ref = tmp_path / "ref.parquet"
+    _games_frame(["e2e4 e7e5 g1f3", "e2e4 e7e5 f1c4", "e2e4 c7c5", "d2d4 d7d5"]).write_parquet(ref)
     mock_db = MagicMock()
-    mock_app_db = MagicMock()
-    mock_db.get_reference_path.return_value = "ref.p"
-    mock_view = MagicMock()
-    mock_view.select.return_value.collect.return_value.item.return_value = 10
-    mock_db.get_reference_view.return_value = mock_view
-    mock_app_db.get_opening_stats.return_value = (None, None)
+    mock_db.get_reference_path.return_value = str(ref)
+    mock_db.get_reference_view.return_value = pl.scan_parquet(ref)
     
-    worker = CachePopulatorWorker(mock_db, mock_app_db, min_games=100)
-    with patch.object(CachePopulatorWorker, '_calculate_stats_sync') as mock_calc:
-        mock_calc.return_value = pl.DataFrame(schema={"uci": pl.String, "c": pl.Int64})
-        worker.running = True
-        
-        # Parchear deque en collections ya que el import es interno en el worker
-        with patch('collections.deque') as mock_deque:
-            mock_q = MagicMock()
-            mock_q.__bool__.side_effect = [True, False]
-            mock_q.popleft.return_value = chess.Board()
-            mock_deque.return_value = mock_q
-            
-            worker.run()
-            assert mock_calc.called
+    worker = CachePopulatorWorker(mock_db, app_db, min_games=2, max_depth=5)
+    done = []; worker.finished.connect(done.append)
+    worker.run()
+    # Inicial, 1.e4 (3 partidas) y 1.e4 e5 (2 partidas); 1.d4 no llega al umbral
+    assert done == [3]
+    stats, _ = app_db.get_opening_stats(str(ref), chess.polyglot.zobrist_hash(chess.Board()))
+    assert dict(zip(stats["uci"], stats["c"])) == {"e2e4": 3, "d2d4": 1}
+    board = chess.Board(); board.push_uci("e2e4"); board.push_uci("e7e5")
+    stats, _ = app_db.get_opening_stats(str(ref), chess.polyglot.zobrist_hash(board))
+    assert sorted(stats["uci"].to_list()) == ["f1c4", "g1f3"] and stats["w"].sum() == 2
+    
+    # Segunda pasada: todo está ya en caché
+    worker.run()
+    assert done[-1] == 0
 
 def test_tree_scanner_worker():
-    with patch('chess.engine.SimpleEngine.popen_uci') as mock_popen:
+    from src.core.engine_pool import EnginePool
+    pool = EnginePool()
+    with patch('src.core.engine_pool.EnginePool._spawn') as mock_popen, patch.object(EnginePool, '_reset', return_value=True):
         mock_engine = MagicMock()
+        mock_engine.returncode.done.return_value = False
         mock_popen.return_value = mock_engine
         mock_score = MagicMock()
         mock_score.white.return_value.is_mate.return_value = False
         mock_score.white.return_value.score.return_value = 100
         mock_engine.analyse.return_value = {"score": mock_score}
-        worker = TreeScannerWorker("sf", chess.STARTING_FEN, ["e2e4"])
+        worker = TreeScannerWorker("sf", chess.STARTING_FEN, ["e2e4"], pool=pool, multipv=1)
         worker.run()
-        assert mock_engine.quit.called
+        # El motor vuelve al pool en lugar de cerrarse
+        assert mock_engine.analyse.called and not mock_engine.quit.called
+        assert pool.idle_count("sf") == 1
+
+def test_tree_scanner_multipv():
+    from src.core.engine_pool import EnginePool
+    moves = [chess.Move.from_uci(u) for u in ["e2e4", "d2d4", "g1f3"]]
+    def info(move, cp): return {"pv": [move], "score": chess.engine.PovScore(chess.engine.Cp(cp), chess.WHITE)}
+    mock_engine = MagicMock()
+    mock_engine.returncode.done.return_value = False
+    # Primer lote: top-2 de las tres jugadas; segundo lote: la restante, restringida con searchmoves
+    mock_engine.analyse.side_effect = [[info(moves[0], 30), info(moves[1], 25)], [info(moves[2], 10)]]
+    with patch('src.core.engine_pool.EnginePool._spawn', return_value=mock_engine), patch.object(EnginePool, '_reset', return_value=True):
+        worker = TreeScannerWorker("sf", chess.STARTING_FEN, ["e2e4", "d2d4", "g1f3", "e2e5"], pool=EnginePool(), multipv=2)
+        results = []; worker.eval_ready.connect(lambda u, s: results.append((u, s)))
+        worker.run()
+    assert results == [("e2e4", "+0.30"), ("d2d4", "+0.25"), ("g1f3", "+0.10")]
+    first, second = mock_engine.analyse.call_args_list
+    assert first.kwargs["multipv"] == 2 and first.kwargs["root_moves"] == moves
+    assert second.kwargs["multipv"] == 1 and second.kwargs["root_moves"] == [moves[2]]
 
 def test_full_analysis_worker():
-    with patch('chess.engine.SimpleEngine.popen_uci') as mock_popen:
+    with patch('src.core.engine_pool.EnginePool._spawn') as mock_popen:
         mock_engine = MagicMock()
         mock_popen.return_value = mock_engine
         mock_engine.analyse.return_value = {"score": MagicMock()}
-        worker = FullAnalysisWorker([chess.Move.from_uci("e2e4")], depth=10)
+        from src.core.engine_pool import EnginePool
+        worker = FullAnalysisWorker([chess.Move.from_uci("e2e4")], depth=10, pool=EnginePool())
         worker.run()
         assert mock_engine.analyse.called
+
+def test_full_analysis_worker_parallel():
+    from src.core.engine_pool import EnginePool
+    engines = []
+    def spawn(*args, **kwargs):
+        e = MagicMock(); e.returncode.done.return_value = False
+        e.analyse.side_effect = lambda board, limit: {"score": chess.engine.PovScore(chess.engine.Cp(len(board.move_stack)), chess.WHITE)}
+        engines.append(e); return e
+    moves = [chess.Move.from_uci(u) for u in ["e2e4", "e7e5", "g1f3", "b8c6", "f1b5"]]
+    with patch('src.core.engine_pool.EnginePool._spawn', side_effect=spawn), patch.object(EnginePool, '_reset', return_value=True):
+        worker = FullAnalysisWorker(moves, depth=10, pool=EnginePool(), engines=3)
+        results = {}; progress = []
+        # Las señales salen de los hilos del ThreadPoolExecutor: conexión directa para recogerlas sin bucle de eventos
+        worker.analysis_result.connect(lambda idx, val: results.__setitem__(idx, val), Qt.DirectConnection)
+        worker.progress.connect(lambda done, total: progress.append((done, total)), Qt.DirectConnection)
+        worker.run()
+    # 6 posiciones repartidas en 3 tramos (un motor del pool puede reutilizarse si otro tramo ya acabó)
+    assert 1 <= len(engines) <= 3 and sum(e.analyse.call_count for e in engines) == 6
+    assert results == {i: i for i in range(6)}
+    assert sorted(progress)[-1] == (6, 6)
+
+def test_tree_scanner_uses_eval_cache(tmp_path):
+    from src.core.app_db import AppDBManager
+    app_db = AppDBManager(str(tmp_path / "app.db"))
+    board = chess.Board(); board.push_uci("e2e4")
+    app_db.save_engine_eval(board, {"score": chess.engine.PovScore(chess.engine.Cp(35), chess.WHITE), "depth": 20, "pv": []})
+    pool = MagicMock()
+    worker = TreeScannerWorker("sf", chess.STARTING_FEN, ["e2e4"], depth=12, pool=pool, app_db=app_db)
+    results = []; worker.eval_ready.connect(lambda u, s: results.append((u, s)))
+    worker.run()
+    # Todo estaba en caché: no se pide ningún motor al pool
+    assert results == [("e2e4", "+0.35")] and not pool.lease.called
+
+def test_cache_populator_matches_stats_worker_on_transpositions(tmp_path):
+    from src.core.app_db import AppDBManager
+    app_db = AppDBManager(str(tmp_path / "app.db"))
+    ref = tmp_path / "ref.parquet"
+    # 1.e3 e6 2.e4 e5 llega en el ply 4 a la posición de 1.e4 e5 (ply 2)
+    _games_frame(["e2e4 e7e5 g1f3", "e2e4 e7e5 g1f3 b8c6", "e2e3 e7e6 e3e4 e6e5 f1c4", "d2d4 d7d5"]).write_parquet(ref)
+    mock_db = MagicMock()
+    mock_db.get_reference_path.return_value = str(ref)
+    mock_db.get_reference_view.return_value = pl.scan_parquet(ref)
+    worker = CachePopulatorWorker(mock_db, app_db, min_games=1, max_depth=6)
+    worker.run()
+    stats_worker = StatsWorker(mock_db, "", True)
+    cols = ["uci", "c", "w", "d", "b", "avg_w_elo", "avg_b_elo"]
+    for pos_hash in app_db.get_cached_positions(str(ref)):
+        cached, _ = app_db.get_opening_stats(str(ref), pos_hash)
+        expected = stats_worker._build_stats_query(pl.scan_parquet(ref), int(pos_hash)).collect()
+        assert cached.select(cols).sort("uci").equals(expected.select(cols).sort("uci").cast(dict(cached.select(cols).schema)))
+    board = chess.Board(); board.push_uci("e2e4"); board.push_uci("e7e5")
+    stats, _ = app_db.get_opening_stats(str(ref), chess.polyglot.zobrist_hash(board))
+    assert dict(zip(stats["uci"], stats["c"])) == {"g1f3": 2, "f1c4": 1}
+
+def test_tree_scanner_recounts_mate_for_child(tmp_path):
+    from src.core.app_db import AppDBManager
+    app_db = AppDBManager(str(tmp_path / "app.db"))
+    worker = TreeScannerWorker("sf", chess.STARTING_FEN, [], app_db=app_db)
+    pv = [chess.Move.from_uci(u) for u in ["e2e4", "e7e5", "g1f3"]]
+    def saved(parent, mate, pov):
+        worker._save_child(parent, {"score": chess.engine.PovScore(chess.engine.Mate(mate), pov), "depth": 10, "pv": pv if parent.turn else pv[1:]})
+        child = parent.copy(); child.push(pv[0] if parent.turn else pv[1])
+        cached = app_db.get_engine_eval(child)
+        return cached["score"].white().mate() if cached else None
+    start = chess.Board(); after_e4 = chess.Board(); after_e4.push(pv[0])
+    # Mueve quien da mate: una jugada menos; mueve quien lo recibe: misma distancia
+    assert saved(start, 3, chess.WHITE) == 2
+    assert saved(after_e4, 2, chess.BLACK) == -1
+    app_db = worker.app_db = AppDBManager(str(tmp_path / "app2.db"))
+    assert saved(start, -2, chess.WHITE) == -2
+    # Mate en 1 desde el padre: el hijo ya está mateado y no se guarda
+    app_db = worker.app_db = AppDBManager(str(tmp_path / "app3.db"))
+    assert saved(start, 1, chess.WHITE) is None